@@ -0,0 +1,425 @@
+import argparse
+import functools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.data.create_data import SIZE_UNITS, parse_size
+from src.utils.metrics import peak_memory_mb
+
+REGION = "eu-west-2"
+INPUT_BUCKET = "bench-input-bucket"
+PROCESSED_BUCKET = "bench-processed-bucket"
+INVOCATION_BUCKET = "bench-invocation-bucket"
+PII_FIELDS = ["Name", "Email Address", "Sex", "DOB"]
+
+SEED = 0
+BASE_ROWS = 10000
+DEFAULT_SIZES = "1MB,10MB"
+DEFAULT_COLUMNS = "8"
+DEFAULT_DATA_DIR = os.path.join(ROOT, "benchmarks", ".data")
+DEFAULT_OUTPUT = "bench_results.json"
+
+TARGETS = {
+    "obfuscate_pii:pandas": ("obfuscate_pii", {"engine": "pandas"}),
+    "obfuscate_pii:splice": ("obfuscate_pii", {"engine": "splice"}),
+    "obfuscate_pii:pyarrow": ("obfuscate_pii", {"engine": "pyarrow"}),
+    "obfuscate_pii:csv": ("obfuscate_pii", {"engine": "csv"}),
+    "obfuscate_pii:auto": ("obfuscate_pii", {"engine": "auto"}),
+    "handler:memory": ("handler", {}),
+    "handler:stream": ("handler", {"mode": "stream"}),
+}
+# Parallel mode is not benchmarked: its worker processes create their own S3
+# clients, which moto in the parent process cannot intercept.
+DEFAULT_TARGETS = ",".join(TARGETS)
+
+
+def format_size(size):
+    for unit in ("GB", "MB", "KB"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+@functools.lru_cache(maxsize=None)
+def base_dataframe(columns, base_rows=BASE_ROWS):
+    """
+    Generates the block of rows every dataset is built from, widened or narrowed
+    to the requested number of columns. Extra columns repeat the generated ones.
+    """
+    from src.data.create_data import generate_data
+
+    df = generate_data(base_rows, seed=SEED)
+    generated = list(df.columns)
+    for index in range(len(generated), columns):
+        df[f"Extra {index + 1}"] = df[generated[index % len(generated)]]
+    return df.iloc[:, :columns]
+
+
+def build_dataset(size, columns, data_dir=DEFAULT_DATA_DIR, base_rows=BASE_ROWS):
+    """
+    Writes a CSV dataset of roughly `size` bytes, reusing it if it already exists.
+
+    The rows generated by create_data are repeated until the size is reached, with
+    the "User ID" column renumbered, so any size can be produced in seconds and the
+    same arguments always produce the same file.
+
+    Parameters:
+    size (int): The approximate size of the dataset in bytes.
+    columns (int): The number of columns.
+    data_dir (str): The directory the datasets are cached in.
+    base_rows (int): The number of distinct rows generated with Faker.
+
+    Returns:
+    dict: The dataset's "name", "path", "rows", "columns" and "bytes".
+    """
+    name = f"{format_size(size)}_{columns}cols"
+    path = os.path.join(data_dir, f"{name}.csv")
+    meta_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return json.load(f)
+
+    os.makedirs(data_dir, exist_ok=True)
+    base = base_dataframe(columns, base_rows).copy()
+    row_bytes = len(base.to_csv(index=False, header=False)) / len(base)
+    rows = max(1, math.ceil(size / row_bytes))
+
+    first_ids = base["User ID"].copy() if "User ID" in base else None
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            block = base.iloc[: rows - written]
+            if first_ids is not None:
+                block = block.assign(
+                    **{"User ID": first_ids.iloc[: len(block)] + written}
+                )
+            block.to_csv(f, index=False, header=written == 0)
+            written += len(block)
+
+    dataset = {
+        "name": name,
+        "path": path,
+        "rows": rows,
+        "columns": columns,
+        "bytes": os.path.getsize(path),
+    }
+    with open(meta_path, "w") as f:
+        json.dump(dataset, f)
+    return dataset
+
+
+def stage_seconds(collector):
+    """
+    Returns the seconds the pipeline recorded in each stage of a metrics collector,
+    so the benchmark times exactly what the handler reports to CloudWatch.
+
+    Parameters:
+    collector (src.utils.metrics.InvocationMetrics): The collector of the run.
+
+    Returns:
+    dict: The seconds of every stage, 0.0 for those the run did not reach.
+    """
+    from src.utils.metrics import STAGES
+
+    return {stage: collector.durations.get(stage, 0.0) for stage in STAGES}
+
+
+def setup_buckets(s3, dataset):
+    """
+    Creates the pipeline's buckets and Terraform state in moto and uploads the dataset.
+    """
+    from src.utils.tf_state import tf_state_bucket, tf_state_key
+
+    for bucket in (INPUT_BUCKET, PROCESSED_BUCKET, INVOCATION_BUCKET, tf_state_bucket):
+        s3.create_bucket(
+            Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": REGION}
+        )
+    s3.put_object(
+        Bucket=tf_state_bucket,
+        Key=tf_state_key,
+        Body=json.dumps(
+            {
+                "outputs": {
+                    "gdpr_input_bucket": {"value": INPUT_BUCKET},
+                    "gdpr_processed_bucket": {"value": PROCESSED_BUCKET},
+                    "gdpr_invocation_bucket": {"value": INVOCATION_BUCKET},
+                }
+            }
+        ),
+    )
+    with open(dataset["path"], "rb") as f:
+        s3.upload_fileobj(f, INPUT_BUCKET, os.path.basename(dataset["path"]))
+
+
+def run_case(dataset, target):
+    """
+    Runs one target once against one dataset in moto and measures it.
+
+    Parameters:
+    dataset (dict): The dataset, as returned by build_dataset.
+    target (str): One of the names in TARGETS.
+
+    Returns:
+    dict: The run's "seconds", "mb_per_s", "rows_per_s", "peak_rss_mb",
+          "baseline_rss_mb", "stages" and "ok".
+    """
+    for name, value in (
+        ("AWS_ACCESS_KEY_ID", "testing"),
+        ("AWS_SECRET_ACCESS_KEY", "testing"),
+        ("AWS_DEFAULT_REGION", REGION),
+    ):
+        os.environ.setdefault(name, value)
+
+    import boto3
+    from moto import mock_aws
+
+    function_name, options = TARGETS[target]
+    key = os.path.basename(dataset["path"])
+    pii_fields = [field for field in PII_FIELDS if field in base_columns(dataset)]
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name=REGION)
+        setup_buckets(s3, dataset)
+
+        from src.utils import metrics, processing2
+
+        if function_name == "handler":
+            s3.put_object(
+                Bucket=INVOCATION_BUCKET,
+                Key="invocation.json",
+                Body=json.dumps(
+                    dict(
+                        options,
+                        bucket_name=INPUT_BUCKET,
+                        s3_file_path=key,
+                        pii_fields=pii_fields,
+                    )
+                ),
+            )
+
+        baseline_rss = peak_memory_mb()
+        collector = metrics.start_invocation()
+        start = time.perf_counter()
+        if function_name == "handler":
+            response = processing2.handler({}, None)
+            ok = response["statusCode"] == 200
+            # The handler records into a collector of its own.
+            collector = metrics.current()
+        else:
+            ok = (
+                processing2.obfuscate_pii(INPUT_BUCKET, key, pii_fields, **options)
+                is not None
+            )
+        seconds = time.perf_counter() - start
+        stages = stage_seconds(collector)
+
+    megabytes = dataset["bytes"] / 1024**2
+    return {
+        "ok": ok,
+        "seconds": seconds,
+        "mb_per_s": megabytes / seconds,
+        "rows_per_s": dataset["rows"] / seconds,
+        "peak_rss_mb": peak_memory_mb(),
+        "baseline_rss_mb": baseline_rss,
+        "stages": dict(stages, other=max(0.0, seconds - sum(stages.values()))),
+    }
+
+
+def base_columns(dataset):
+    with open(dataset["path"], newline="") as f:
+        return f.readline().rstrip("\r\n").split(",")
+
+
+def summarise(dataset, target, runs):
+    """
+    Combines the repeated runs of one case, keeping the run with the median time.
+    """
+    median = sorted(runs, key=lambda run: run["seconds"])[(len(runs) - 1) // 2]
+    return {
+        "dataset": {key: value for key, value in dataset.items() if key != "path"},
+        "target": target,
+        "ok": all(run["ok"] for run in runs),
+        "repeat": len(runs),
+        "seconds": median["seconds"],
+        "seconds_min": min(run["seconds"] for run in runs),
+        "seconds_stdev": statistics.pstdev(run["seconds"] for run in runs),
+        "mb_per_s": median["mb_per_s"],
+        "rows_per_s": median["rows_per_s"],
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "baseline_rss_mb": median["baseline_rss_mb"],
+        "stages": median["stages"],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=ROOT,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, columns, targets, repeat=1, data_dir=DEFAULT_DATA_DIR):
+    """
+    Runs every target against every dataset, each run in a fresh process so that
+    peak memory is measured per run and no state is shared between runs.
+
+    Parameters:
+    sizes (list): The dataset sizes in bytes.
+    columns (list): The column counts.
+    targets (list): The names of the targets to run.
+    repeat (int): The number of runs of each case.
+    data_dir (str): The directory the datasets are cached in.
+
+    Returns:
+    dict: The "meta" data of the benchmark run and the "results" of each case.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        for column_count in columns:
+            dataset = build_dataset(size, column_count, data_dir)
+            for target in targets:
+                runs = []
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(1, mp_context=context) as executor:
+                        runs.append(executor.submit(run_case, dataset, target).result())
+                result = summarise(dataset, target, runs)
+                print(
+                    f"{dataset['name']:>16} {target:<22} {result['seconds']:8.3f}s "
+                    f"{result['mb_per_s']:8.2f} MB/s {result['rows_per_s']:12.0f} rows/s "
+                    f"{result['peak_rss_mb']:8.1f} MB peak"
+                    + ("" if result["ok"] else "  FAILED")
+                )
+                results.append(result)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare_results(baseline, current):
+    """
+    Compares two benchmark result files case by case.
+
+    Parameters:
+    baseline (dict): The results of the earlier run.
+    current (dict): The results of the later run.
+
+    Returns:
+    list: For each case present in both, its "dataset", "target", the "baseline"
+          and "current" seconds and the "change" in time as a fraction.
+    """
+    earlier = {
+        (result["dataset"]["name"], result["target"]): result
+        for result in baseline["results"]
+    }
+    comparison = []
+    for result in current["results"]:
+        case = (result["dataset"]["name"], result["target"])
+        if case not in earlier:
+            continue
+        before = earlier[case]["seconds"]
+        comparison.append(
+            {
+                "dataset": case[0],
+                "target": case[1],
+                "baseline": before,
+                "current": result["seconds"],
+                "change": (result["seconds"] - before) / before,
+            }
+        )
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark obfuscate_pii and the Lambda handler against moto."
+    )
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help=f"Comma-separated dataset sizes, such as 1MB,100MB,2GB (default {DEFAULT_SIZES}).",
+    )
+    parser.add_argument(
+        "--columns",
+        default=DEFAULT_COLUMNS,
+        help=f"Comma-separated column counts (default {DEFAULT_COLUMNS}).",
+    )
+    parser.add_argument(
+        "--targets",
+        default=DEFAULT_TARGETS,
+        help=f"Comma-separated targets to run (default {DEFAULT_TARGETS}).",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each case.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="The results file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="Compare two results files instead of running the benchmarks.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        for row in compare_results(baseline, current):
+            print(
+                f"{row['dataset']:>16} {row['target']:<22} {row['baseline']:8.3f}s "
+                f"-> {row['current']:8.3f}s {row['change']:+8.1%}"
+            )
+        return
+
+    targets = args.targets.split(",")
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        raise SystemExit(f"Unknown targets: {', '.join(unknown)}")
+
+    report = run_benchmarks(
+        [parse_size(size) for size in args.sizes.split(",")],
+        [int(columns) for columns in args.columns.split(",")],
+        targets,
+        args.repeat,
+        args.data_dir,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,450 @@
-import pandas as pd
-import numpy as np
-from faker import Faker
+import argparse
+import csv
+import io
+import math
 import os
+import secrets
+import time
+from collections import deque
+from datetime import date, timedelta
+from functools import lru_cache
 
-data_directory = "src/data"
-os.makedirs(data_directory, exist_ok=True)
+import numpy as np
 
-data_file_name = "dummy_data_large.csv"
-data_file_path = os.path.join(data_directory, data_file_name)
+from src.data.paths import data_file_path
 
-fake = Faker()
 num_entries = 12000  # this will make file over 1MB
 
-data = {
-    "User ID": [i + 1001 for i in range(num_entries)],
-    "Name": [fake.name() for _ in range(num_entries)],
-    "Graduation Date": [
-        fake.date_between(start_date="-5y", end_date="today")
-        for _ in range(num_entries)
-    ],
-    "Email Address": [fake.email() for _ in range(num_entries)],
-    "Course": [fake.word() + " Studies" for _ in range(num_entries)],
-    "Town": [fake.city() for _ in range(num_entries)],
-    "Sex": [np.random.choice(["Male", "Female"]) for _ in range(num_entries)],
-    "DOB": [
-        fake.date_of_birth(minimum_age=18, maximum_age=30) for _ in range(num_entries)
-    ],
+DEFAULT_CHUNK_ROWS = 100_000
+# Rows are drawn from one random stream per block of BLOCK_ROWS, and chunks are
+# whole blocks, so the output does not depend on how the rows are chunked.
+BLOCK_ROWS = 10_000
+DEFAULT_POOL_SIZE = 2000
+SAMPLE_ROWS = 10_000
+FIRST_USER_ID = 1001
+# Dates are generated relative to a fixed day, so a seed always produces the
+# same file, whenever it is run.
+REFERENCE_DATE = date(2024, 9, 1)
+SIZE_UNITS = {"KB": 1024, "MB": 1024**2, "GB": 1024**3, "B": 1}
+# Pool values with these characters would need quoting in a CSV file.
+CSV_SPECIAL_CHARACTERS = (",", '"', "\n", "\r")
+
+DEFAULT_SCHEMA = (
+    ("User ID", "id"),
+    ("Name", "name"),
+    ("Graduation Date", "date"),
+    ("Email Address", "email"),
+    ("Course", "course"),
+    ("Town", "town"),
+    ("Sex", "sex"),
+    ("DOB", "dob"),
+)
+
+
+def parse_size(text):
+    """
+    Parses a size such as "512KB", "10MB" or "2GB" into a number of bytes.
+
+    Parameters:
+    text (str): The size, with an optional B, KB, MB or GB suffix (powers of 1024).
+
+    Returns:
+    int: The size in bytes.
+
+    Raises:
+    ValueError: If the size cannot be parsed.
+    """
+    text = text.strip().upper()
+    for unit in ("KB", "MB", "GB", "B"):
+        if text.endswith(unit):
+            return int(float(text[: -len(unit)]) * SIZE_UNITS[unit])
+    return int(text)
+
+
+def _date_range(start, end):
+    days = np.arange(
+        np.datetime64(start, "D"), np.datetime64(end, "D") + 1, dtype="datetime64[D]"
+    )
+    return days.astype(str).astype(object)
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+@lru_cache(maxsize=4)
+def build_pools(seed, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Samples the vocabulary every column is built from.
+
+    Faker is only called `pool_size` times per pool. The rows are then made by
+    indexing into the pools with NumPy, so generating a row costs a few array
+    lookups instead of several Faker calls. Values that would need quoting in a
+    CSV file are left out of the pools.
+
+    Parameters:
+    seed (int): Seeds Faker, so the same pools are sampled every time.
+    pool_size (int): The number of values sampled for each pool.
+
+    Returns:
+    dict: An object array of distinct strings for each pool.
+    """
+    from faker import Faker
+
+    fake = Faker()
+    fake.seed_instance(seed)
+
+    def sample(method, suffix=""):
+        values = {method() + suffix for _ in range(pool_size)}
+        values = [
+            value
+            for value in sorted(values)
+            if not any(char in value for char in CSV_SPECIAL_CHARACTERS)
+        ]
+        return np.array(values, dtype=object)
+
+    return {
+        "first_name": sample(fake.first_name),
+        "last_name": sample(fake.last_name),
+        "user_name": sample(fake.user_name),
+        "domain": sample(fake.free_email_domain),
+        "town": sample(fake.city),
+        "word": sample(fake.word),
+        "course": sample(fake.word, " Studies"),
+        "sex": np.array(["Male", "Female"], dtype=object),
+        "number": np.array([""] + [str(n) for n in range(100)], dtype=object),
+        "digits": np.array([f"{n:03d}" for n in range(1000)], dtype=object),
+        "letter": np.array(list("ABCEGHJKLMNPRSTWXYZ"), dtype=object),
+        "date": _date_range(_years_before(REFERENCE_DATE, 5), REFERENCE_DATE),
+        "dob": _date_range(
+            _years_before(REFERENCE_DATE, 31) + timedelta(days=1),
+            _years_before(REFERENCE_DATE, 18),
+        ),
+    }
+
+
+def _pick(pools, rng, pool, rows):
+    values = pools[pool]
+    return values[rng.integers(0, len(values), rows)]
+
+
+def _ids(pools, rng, start, rows):
+    return np.arange(start + FIRST_USER_ID, start + FIRST_USER_ID + rows)
+
+
+def _integers(pools, rng, start, rows):
+    return rng.integers(0, 1_000_000, rows)
+
+
+def _names(pools, rng, start, rows):
+    return (
+        _pick(pools, rng, "first_name", rows)
+        + " "
+        + _pick(pools, rng, "last_name", rows)
+    )
+
+
+def _emails(pools, rng, start, rows):
+    return (
+        _pick(pools, rng, "user_name", rows)
+        + _pick(pools, rng, "number", rows)
+        + "@"
+        + _pick(pools, rng, "domain", rows)
+    )
+
+
+def _phones(pools, rng, start, rows):
+    return (
+        "07"
+        + _pick(pools, rng, "digits", rows)
+        + _pick(pools, rng, "digits", rows)
+        + _pick(pools, rng, "digits", rows)
+    )
+
+
+def _national_ids(pools, rng, start, rows):
+    return (
+        _pick(pools, rng, "letter", rows)
+        + _pick(pools, rng, "letter", rows)
+        + _pick(pools, rng, "digits", rows)
+        + _pick(pools, rng, "digits", rows)
+        + np.array(["A", "B", "C", "D"], dtype=object)[rng.integers(0, 4, rows)]
+    )
+
+
+def _from_pool(pool):
+    def generate(pools, rng, start, rows):
+        return _pick(pools, rng, pool, rows)
+
+    return generate
+
+
+GENERATORS = {
+    "id": _ids,
+    "integer": _integers,
+    "name": _names,
+    "first_name": _from_pool("first_name"),
+    "last_name": _from_pool("last_name"),
+    "email": _emails,
+    "phone": _phones,
+    "national_id": _national_ids,
+    "date": _from_pool("date"),
+    "dob": _from_pool("dob"),
+    "sex": _from_pool("sex"),
+    "course": _from_pool("course"),
+    "town": _from_pool("town"),
+    "word": _from_pool("word"),
 }
 
-df = pd.DataFrame(data)
 
-df.to_csv(data_file_path, index=False)
+def parse_schema(text):
+    """
+    Parses a column schema such as "User ID:id,Name:name,Email:email".
+
+    Each column is a name and a type from GENERATORS, separated by a colon. A
+    column without a type is named after its type, so "id,name,email" also works.
+
+    Parameters:
+    text (str): The comma-separated columns.
+
+    Returns:
+    tuple: (column_name, column_type) pairs.
+
+    Raises:
+    ValueError: If a column has an unknown type.
+    """
+    schema = []
+    for column in text.split(","):
+        name, _, column_type = column.partition(":")
+        name, column_type = name.strip(), (column_type or name).strip()
+        if column_type not in GENERATORS:
+            raise ValueError(
+                f"Unknown column type: {column_type}. "
+                f"Choose from {', '.join(GENERATORS)}."
+            )
+        schema.append((name, column_type))
+    return tuple(schema)
+
+
+def generate_columns(schema, seed, start, rows, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Generates the values of a run of rows, one column at a time.
+
+    Each block of BLOCK_ROWS rows is drawn from its own random stream, derived
+    from the seed and the block's index, so the rows are the same however they
+    are split between chunks or processes.
+
+    Parameters:
+    schema (tuple): (column_name, column_type) pairs.
+    seed (int): The seed of the data set.
+    start (int): The index of the first row, a multiple of BLOCK_ROWS.
+    rows (int): The number of rows.
+    pool_size (int): The size of the vocabulary pools.
+
+    Returns:
+    dict: An array of values for each column name.
+    """
+    pools = build_pools(seed, pool_size)
+    blocks = []
+    for block_start in range(start, start + rows, BLOCK_ROWS):
+        block_rows = min(BLOCK_ROWS, start + rows - block_start)
+        rng = np.random.default_rng([seed, block_start // BLOCK_ROWS])
+        blocks.append(
+            [
+                GENERATORS[column_type](pools, rng, block_start, block_rows)
+                for _, column_type in schema
+            ]
+        )
+    if not blocks:
+        return {name: np.array([], dtype=object) for name, _ in schema}
+    return {
+        name: np.concatenate([block[index] for block in blocks])
+        for index, (name, _) in enumerate(schema)
+    }
+
+
+def generate_chunk(schema, seed, start, rows, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Generates a block of rows as CSV text, without a header.
+
+    Returns:
+    bytes: The rows, each ending with a newline.
+    """
+    columns = generate_columns(schema, seed, start, rows, pool_size)
+    text = [
+        values.astype(str) if values.dtype != object else values
+        for values in columns.values()
+    ]
+    lines = "\n".join(map(",".join, zip(*text)))
+    return (lines + "\n").encode("utf-8") if rows else b""
+
+
+def csv_header(schema):
+    """Returns the header line of a schema's CSV file, quoting names as needed."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(name for name, _ in schema)
+    return buffer.getvalue().encode("utf-8")
+
+
+def estimate_rows(size, schema, seed, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Estimates the number of rows of a CSV file of about `size` bytes from the
+    average size of a sample of rows.
+    """
+    sample = generate_chunk(schema, seed, 0, SAMPLE_ROWS, pool_size)
+    row_bytes = len(sample) / SAMPLE_ROWS
+    return max(1, math.ceil((size - len(csv_header(schema))) / row_bytes))
+
+
+def _generate_chunk_args(args):
+    return generate_chunk(*args)
+
+
+def write_csv(
+    path,
+    rows=None,
+    size=None,
+    schema=DEFAULT_SCHEMA,
+    seed=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    processes=1,
+    pool_size=DEFAULT_POOL_SIZE,
+):
+    """
+    Writes a synthetic CSV file, streaming it to disk one chunk of rows at a time.
+
+    With several processes, chunks are generated concurrently and written in
+    order, with at most two chunks per process waiting to be written. The file
+    is the same for a given seed whatever the number of processes or chunk size.
+
+    Parameters:
+    path (str): The path of the CSV file.
+    rows (int): The number of rows. Defaults to `num_entries` unless `size` is given.
+    size (int): The approximate size of the file in bytes, used if `rows` is None.
+    schema (tuple): (column_name, column_type) pairs. Defaults to DEFAULT_SCHEMA.
+    seed (int): Makes the file reproducible. A random seed is used if None.
+    chunk_rows (int): The number of rows generated and written at a time, rounded
+                      up to a multiple of BLOCK_ROWS.
+    processes (int): The number of processes generating chunks.
+    pool_size (int): The number of distinct values sampled for each text pool.
+
+    Returns:
+    dict: The file's "path", "rows", "bytes", "seed" and the "seconds" taken.
+    """
+    started = time.perf_counter()
+    seed = secrets.randbits(32) if seed is None else seed
+    if rows is None:
+        rows = estimate_rows(size, schema, seed, pool_size) if size else num_entries
+    chunk_rows = max(1, math.ceil(chunk_rows / BLOCK_ROWS)) * BLOCK_ROWS
+    chunks = [
+        (schema, seed, start, min(chunk_rows, rows - start), pool_size)
+        for start in range(0, rows, chunk_rows)
+    ]
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(csv_header(schema))
+        if processes > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    if len(pending) >= 2 * processes:
+                        f.write(pending.popleft().result())
+                    pending.append(executor.submit(_generate_chunk_args, chunk))
+                while pending:
+                    f.write(pending.popleft().result())
+        else:
+            for chunk in chunks:
+                f.write(generate_chunk(*chunk))
+
+    return {
+        "path": path,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "seed": seed,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def generate_data(num_entries, seed=None):
+    """
+    Generates a DataFrame of fake student records.
+
+    Parameters:
+    num_entries (int): The number of rows to generate.
+    seed (int): Makes the same data be generated every time.
+
+    Returns:
+    pandas.DataFrame: The generated records.
+    """
+    import pandas as pd
+
+    seed = secrets.randbits(32) if seed is None else seed
+    return pd.DataFrame(generate_columns(DEFAULT_SCHEMA, seed, 0, num_entries))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic CSV file of fake personal records."
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--rows", type=int, help=f"The number of rows (default {num_entries})."
+    )
+    target.add_argument(
+        "--size",
+        type=parse_size,
+        help="The approximate file size, such as 512KB, 100MB or 2GB.",
+    )
+    parser.add_argument("--seed", type=int, help="Makes the file reproducible.")
+    parser.add_argument(
+        "--schema",
+        type=parse_schema,
+        default=DEFAULT_SCHEMA,
+        help="Comma-separated columns as name:type, such as 'Name:name,Email:email'. "
+        f"Types: {', '.join(GENERATORS)}.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help=f"The rows generated at a time (default {DEFAULT_CHUNK_ROWS}).",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="The number of processes generating rows (default 1).",
+    )
+    parser.add_argument("--output", default=data_file_path, help="The CSV file.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = write_csv(
+        args.output,
+        rows=args.rows,
+        size=args.size,
+        schema=args.schema,
+        seed=args.seed,
+        chunk_rows=args.chunk_rows,
+        processes=args.processes,
+    )
+    megabytes = result["bytes"] / SIZE_UNITS["MB"]
+    print(
+        f"Data saved to {result['path']}: {result['rows']} rows, {megabytes:.1f} MB "
+        f"in {result['seconds']:.2f}s ({megabytes / result['seconds']:.1f} MB/s, "
+        f"seed {result['seed']})"
+    )
+
 
-print(f"Data saved to {data_file_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+data_directory = "src/data"
+
+data_file_name = "dummy_data_large.csv"
+data_file_path = os.path.join(data_directory, data_file_name)
@@ -0,0 +1,287 @@
+import bz2
+import io
+import os
+import zlib
+
+MAGIC_BYTES = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+OUTPUT_EXTENSIONS = {"gzip": ".gz", "bz2": ".bz2", "zstd": ".zst"}
+COMPRESSIONS = tuple(OUTPUT_EXTENSIONS)
+HEAD_BYTES = max(len(magic) for magic in MAGIC_BYTES.values())
+DEFAULT_READ_SIZE = 1024 * 1024
+
+
+def detect_compression(path, head=None):
+    """
+    Detects compressed input from its file extension or its leading magic bytes.
+
+    Parameters:
+    path (str): The file name or S3 key of the input.
+    head (bytes): The first bytes of the input, if already available.
+
+    Returns:
+    str: "gzip", "bz2" or "zstd", or None if the input is not compressed.
+    """
+    compression = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if compression:
+        return compression
+    for compression, magic in MAGIC_BYTES.items():
+        if head and head.startswith(magic):
+            return compression
+    return None
+
+
+def strip_compression_extension(path):
+    """
+    Removes a compression extension from a file name: "data.csv.gz" becomes "data.csv".
+
+    Parameters:
+    path (str): The file name or S3 key.
+
+    Returns:
+    str: The name of the file once decompressed.
+    """
+    root, extension = os.path.splitext(path)
+    return root if extension.lower() in EXTENSIONS else path
+
+
+def resolve_compression(compression):
+    """
+    Validates an output compression from the invocation JSON.
+
+    Parameters:
+    compression (str): "gzip", "bz2", "zstd", "none" or None.
+
+    Returns:
+    str: The compression, or None for uncompressed output.
+
+    Raises:
+    ValueError: If the compression is unknown, or is "zstd" and the zstandard
+                package is not installed.
+    """
+    if compression in (None, "none"):
+        return None
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    if compression == "zstd":
+        _import_zstandard()
+    return compression
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError(
+            "zstd compression needs the zstandard package, which is not installed."
+        ) from None
+    return zstandard
+
+
+class PrefixedReader:
+    """
+    File-like wrapper that replays bytes already read from the start of a stream,
+    so its magic bytes can be inspected without seeking.
+
+    Parameters:
+    head (bytes): The bytes already read.
+    stream (file-like): The rest of the stream.
+    """
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    @property
+    def closed(self):
+        return getattr(self.stream, "closed", False)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b""
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(DEFAULT_READ_SIZE), b"")
+
+
+def open_decompressed(stream, path):
+    """
+    Wraps a binary stream so that compressed input is decoded as it is read.
+
+    Only a small block of compressed and decompressed data is held at a time, so
+    the file is never inflated in memory as a whole.
+
+    Parameters:
+    stream (file-like): The input stream, such as an S3 response body.
+    path (str): The file name or S3 key of the input.
+
+    Returns:
+    tuple: A readable file-like object of the decompressed data, and the detected
+           compression, or None if the input is not compressed.
+    """
+    head = stream.read(HEAD_BYTES)
+    compression = detect_compression(path, head)
+    reader = decompressing_reader(PrefixedReader(head, stream), compression)
+    return reader, compression
+
+
+def decompressing_reader(stream, compression):
+    """
+    Wraps a binary stream in a reader that decodes it as it is read.
+
+    Parameters:
+    stream (file-like): The compressed stream.
+    compression (str): "gzip", "bz2" or "zstd", or None to return the stream unchanged.
+
+    Returns:
+    file-like: A readable object of the decompressed data.
+    """
+    if compression == "gzip":
+        import gzip
+
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(stream, mode="rb")
+    if compression == "zstd":
+        zstandard = _import_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(
+            stream, read_across_frames=True
+        )
+    return stream
+
+
+def iter_read(stream, size=DEFAULT_READ_SIZE):
+    """
+    Reads a stream in blocks.
+
+    Parameters:
+    stream (file-like): The stream to read.
+    size (int): The number of bytes to read at a time.
+
+    Yields:
+    bytes: The blocks of the stream, up to `size` bytes each.
+    """
+    while True:
+        block = stream.read(size)
+        if not block:
+            return
+        yield block
+
+
+def _compressor(compression):
+    if compression == "gzip":
+        # wbits of 16 plus the window size writes a gzip header and trailer.
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Compressor()
+    if compression == "zstd":
+        return _import_zstandard().ZstdCompressor().compressobj()
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def iter_compressed(chunks, compression):
+    """
+    Compresses a stream of chunks as they are produced.
+
+    Parameters:
+    chunks (iterable): The uncompressed data, as bytes.
+    compression (str): "gzip", "bz2" or "zstd", or None to pass the chunks through.
+
+    Yields:
+    bytes: The compressed data. Chunks that the compressor buffers yield nothing,
+           so the output may have fewer chunks than the input.
+    """
+    if compression is None:
+        yield from chunks
+        return
+    compressor = _compressor(compression)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def compress_bytes(data, compression):
+    """
+    Compresses data held in memory.
+
+    Parameters:
+    data (bytes): The uncompressed data.
+    compression (str): "gzip", "bz2" or "zstd", or None to return the data unchanged.
+
+    Returns:
+    bytes: The compressed data.
+    """
+    return b"".join(iter_compressed([data], compression))
+
+
+def decompress_bytes(data, compression):
+    """
+    Decompresses data held in memory, including files of several concatenated
+    gzip members, bz2 streams or zstd frames.
+
+    Parameters:
+    data (bytes): The compressed data.
+    compression (str): "gzip", "bz2" or "zstd", or None to return the data unchanged.
+
+    Returns:
+    bytes: The decompressed data.
+    """
+    if compression is None:
+        return data
+    return decompressing_reader(io.BytesIO(data), compression).read()
+
+
+def _decompressor(compression):
+    if compression == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Decompressor()
+    if compression == "zstd":
+        return _import_zstandard().ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def decompress_prefix(data, compression):
+    """
+    Decompresses as much as possible of the start of a compressed stream, such as
+    the first bytes of a file downloaded with a ranged GET.
+
+    Parameters:
+    data (bytes): The start of the compressed data. It may end anywhere.
+    compression (str): "gzip", "bz2" or "zstd", or None to return the data unchanged.
+
+    Returns:
+    bytes: The data that the downloaded bytes decode to.
+    """
+    if compression is None:
+        return data
+    blocks = []
+    while data:
+        decompressor = _decompressor(compression)
+        blocks.append(decompressor.decompress(data))
+        data = getattr(decompressor, "unused_data", b"")
+        if not getattr(decompressor, "eof", False):
+            break
+    return b"".join(blocks)
@@ -1,36 +1,27 @@
 import json
 import os
-import boto3
-from src.utils.processing2 import tf_state_bucket, tf_state_key
+from src.utils.s3_client import LazyClient
+from src.utils.tf_state import (
+    get_bucket_names_from_tf_state,
+    tf_state_bucket,
+    tf_state_key,
+)
 
 pii_fields = ["Name", "Email Address", "Sex", "DOB"]
 
-s3 = boto3.client("s3")
+s3 = LazyClient("s3")
 
 
-def get_bucket_names_from_tf_state(bucket_name, object_key):
-    """Retrieves bucket names from the Terraform state file."""
-    try:
-        response = s3.get_object(Bucket=bucket_name, Key=object_key)
-        data = json.loads(response["Body"].read().decode("utf-8"))
-
-        input_bucket_name = data["outputs"]["gdpr_input_bucket"]["value"]
-        processed_bucket_name = data["outputs"]["gdpr_processed_bucket"]["value"]
-        invocation_bucket_name = data["outputs"]["gdpr_invocation_bucket"]["value"]
-
-        return input_bucket_name, processed_bucket_name, invocation_bucket_name
-    except Exception as e:
-        print(f"Failed to retrieve bucket names: {e}")
-        return None, None, None
-
-
-def create_json_file(bucket_name, s3_file_path, pii_fields):
-    """Creates JSON structure and saves it locally."""
+def create_json_file(bucket_name, s3_file_path, pii_fields, auto_detect=False):
+    """Creates JSON structure and saves it locally. With auto_detect, columns that
+    look like PII are masked as well as pii_fields."""
     json_data = {
         "bucket_name": bucket_name,
         "s3_file_path": s3_file_path,
         "pii_fields": pii_fields,
     }
+    if auto_detect:
+        json_data["auto_detect"] = True
 
     local_json_path = (
         f"src/data/{os.path.basename(s3_file_path).replace('.csv', '.json')}"
@@ -81,7 +72,7 @@ def main():
 
         if s3_file_path:
             local_json_path = create_json_file(
-                input_bucket_name, s3_file_path, pii_fields
+                input_bucket_name, s3_file_path, pii_fields, auto_detect=True
             )
             if local_json_path:
                 upload_json_to_s3(local_json_path, invocation_bucket_name)
@@ -0,0 +1,415 @@
+import codecs
+import csv
+import io
+import logging
+from itertools import islice
+
+from src.utils.compression import PrefixedReader
+from src.utils.csv_splice import HEADER_PROBE_BYTES, parse_header
+from src.utils.masking import MASK, read_dtypes
+
+logger = logging.getLogger()
+
+FRAME_ENGINES = ("pandas", "pyarrow")
+DEFAULT_BLOCK_BYTES = 8 * 1024 * 1024
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def header_columns(data):
+    """
+    Parses the column names from the start of a CSV file.
+
+    Parameters:
+    data (bytes): The start of the CSV file, including at least its header line.
+
+    Returns:
+    list: The column names, or an empty list if the data is empty.
+    """
+    end = data.find(b"\n")
+    return parse_header(data if end < 0 else data[:end]) if data else []
+
+
+def peek_header(stream):
+    """
+    Reads the header line of a CSV stream without consuming it.
+
+    Parameters:
+    stream (file-like): The binary input stream.
+
+    Returns:
+    tuple: The column names, and a stream that replays the header before the
+           rest of the input.
+    """
+    head = b""
+    while b"\n" not in head:
+        block = stream.read(HEADER_PROBE_BYTES)
+        if not block:
+            break
+        head += block
+    return header_columns(head), PrefixedReader(head, stream)
+
+
+def _arrow_options(columns, quoted=True):
+    """
+    Returns the pyarrow CSV options that read every column as text, with empty
+    fields as nulls as pandas reads them. Quoted fields may contain line breaks
+    unless `quoted` is False, which lets Arrow split the input faster.
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    read_options = pa_csv.ReadOptions()
+    parse_options = pa_csv.ParseOptions(newlines_in_values=quoted)
+    convert_options = pa_csv.ConvertOptions(
+        column_types={column: pa.string() for column in columns},
+        strings_can_be_null=True,
+        null_values=[""],
+    )
+    return read_options, parse_options, convert_options
+
+
+def _to_frame(table):
+    """
+    Converts an Arrow table to a DataFrame whose string columns stay Arrow arrays,
+    without creating a Python object per value.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+def read_csv_frame(data, plan, engine="pandas"):
+    """
+    Parses a whole CSV file held in memory into a DataFrame.
+
+    The "pandas" engine uses the pandas C parser and infers the type of each
+    column, so a value such as "007" is written back as "7". The "pyarrow" engine
+    reads every column as text with the Arrow CSV reader, so each value is
+    written back as it was read.
+
+    Parameters:
+    data (bytes): The CSV file.
+    plan (dict): The masking plan, from build_masking_plan.
+    engine (str): "pandas" or "pyarrow".
+
+    Returns:
+    pandas.DataFrame: The parsed CSV.
+    """
+    if engine == "pyarrow":
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        read_options, parse_options, convert_options = _arrow_options(
+            header_columns(data), quoted=b'"' in data
+        )
+        table = pa_csv.read_csv(
+            pa.BufferReader(data),
+            read_options=read_options,
+            parse_options=parse_options,
+            convert_options=convert_options,
+        )
+        return _to_frame(table)
+
+    import pandas as pd
+
+    return pd.read_csv(io.BytesIO(data), dtype=read_dtypes(plan))
+
+
+def _record_end(block):
+    """
+    Returns the offset just past the last complete record of a block that starts
+    at a record boundary, or 0 if it holds none.
+
+    A newline ends a record when an even number of quotes precede it in the block.
+    The quotes are counted in C rather than line by line.
+    """
+    end = block.rfind(b"\n")
+    quotes = block.count(b'"', 0, end) if end >= 0 else 0
+    while end >= 0 and quotes % 2:
+        previous = block.rfind(b"\n", 0, end)
+        quotes -= block.count(b'"', previous + 1, end)
+        end = previous
+    return end + 1
+
+
+def iter_record_blocks(stream, block_size=DEFAULT_BLOCK_BYTES):
+    """
+    Reads a CSV stream in blocks of at least `block_size` bytes that end at record
+    boundaries, so each block can be parsed on its own.
+
+    Parameters:
+    stream (file-like): The binary input stream.
+    block_size (int): The number of bytes read before a block is cut.
+
+    Yields:
+    bytes: The blocks, in order. The first starts with the header, and the last
+           may lack a final line break.
+    """
+    carry = b""
+    while True:
+        parts = [carry]
+        size = len(carry)
+        # A record longer than a block grows the block until it is complete.
+        target = block_size if size < block_size else size + block_size
+        while size < target:
+            data = stream.read(target - size)
+            if not data:
+                break
+            parts.append(data)
+            size += len(data)
+        block = b"".join(parts)
+        if size == len(carry):
+            break
+        end = _record_end(block)
+        carry = block[end:]
+        if end:
+            yield block[:end]
+    if carry:
+        yield carry
+
+
+def read_arrow_block(block, columns, header=False):
+    """
+    Parses a block of whole CSV records into a DataFrame with the pyarrow engine.
+
+    Parameters:
+    block (bytes): The records, from iter_record_blocks.
+    columns (list): The column names, from the file's header.
+    header (bool): Whether the block starts with the header line.
+
+    Returns:
+    pandas.DataFrame: The parsed records.
+
+    Raises:
+    pyarrow.ArrowInvalid: If the Arrow reader rejects the block, for example
+                          because a row has the wrong number of fields. It is a
+                          ValueError.
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    read_options, parse_options, convert_options = _arrow_options(
+        columns, quoted=b'"' in block
+    )
+    read_options.column_names = columns
+    read_options.skip_rows = 1 if header else 0
+    table = pa_csv.read_csv(
+        pa.BufferReader(block),
+        read_options=read_options,
+        parse_options=parse_options,
+        convert_options=convert_options,
+    )
+    return _to_frame(table)
+
+
+def iter_csv_frames(
+    stream,
+    plan,
+    engine="pandas",
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    block_size=DEFAULT_BLOCK_BYTES,
+):
+    """
+    Parses a CSV stream into DataFrames, one chunk at a time.
+
+    The "pandas" engine parses chunks of `chunk_rows` rows. The "pyarrow" engine
+    parses the blocks of iter_record_blocks, as the Arrow reader cannot count
+    rows before it parses them.
+
+    Parameters:
+    stream (file-like): A binary stream of CSV data, such as an S3 response body.
+    plan (dict): The masking plan, from build_masking_plan.
+    engine (str): "pandas" or "pyarrow".
+    chunk_rows (int): The number of rows in each chunk of the "pandas" engine.
+    block_size (int): The number of bytes in each chunk of the "pyarrow" engine.
+
+    Yields:
+    pandas.DataFrame: The parsed chunks, in order.
+    """
+    if engine == "pyarrow":
+        columns, stream = peek_header(stream)
+        if not columns:
+            return
+        for number, block in enumerate(iter_record_blocks(stream, block_size)):
+            yield read_arrow_block(block, columns, header=number == 0)
+        return
+
+    import pandas as pd
+
+    yield from pd.read_csv(stream, chunksize=chunk_rows, dtype=read_dtypes(plan))
+
+
+def _quote_needed(values):
+    """
+    Quotes the values of an Arrow string array that contain a comma, a quote or
+    a line break, as csv.QUOTE_MINIMAL does, and writes nulls as empty fields.
+    """
+    import pyarrow.compute as pc
+
+    quoted = pc.binary_join_element_wise(
+        '"', pc.replace_substring(values, '"', '""'), '"', ""
+    )
+    needs_quotes = pc.match_substring_regex(values, '[",\r\n]')
+    return pc.fill_null(pc.if_else(needs_quotes, quoted, values), "")
+
+
+def _write_arrow_csv(table, header):
+    """
+    Writes an Arrow table of text columns as CSV without quoting any value,
+    falling back to quoting the values that need it with Arrow compute kernels.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+
+    table = table.cast(pa.schema([(name, pa.string()) for name in table.column_names]))
+    parts = []
+    if header:
+        # The Arrow writer quotes every column name, so the header is written here.
+        names = _quote_needed(pa.array(table.column_names, pa.string()))
+        parts.append(",".join(names.to_pylist()).encode("utf-8") + b"\n")
+    if not table.num_rows:
+        return b"".join(parts)
+
+    output = io.BytesIO()
+    try:
+        # Much faster, but rejects any value that would need quoting.
+        pa_csv.write_csv(
+            table,
+            output,
+            pa_csv.WriteOptions(include_header=False, quoting_style="none"),
+        )
+        parts.append(output.getvalue())
+    except pa.ArrowInvalid:
+        columns = [_quote_needed(column) for column in table.columns]
+        lines = pc.binary_join_element_wise(*columns, ",")
+        lines = pc.binary_join_element_wise(lines, "", "\n")
+        parts.extend(_string_data(chunk) for chunk in lines.chunks)
+    return b"".join(parts)
+
+
+def _string_data(array):
+    """
+    Returns the concatenated values of an Arrow string array without converting
+    them to Python strings.
+    """
+    import pyarrow as pa
+
+    _, offsets, data = array.buffers()
+    offsets = pa.Array.from_buffers(
+        pa.int32(), len(array) + 1, [None, offsets], offset=array.offset
+    )
+    start, end = offsets[0].as_py(), offsets[-1].as_py()
+    return data.slice(start, end - start).to_pybytes()
+
+
+def frame_to_csv(df, engine="pandas", header=True):
+    """
+    Serialises a masked DataFrame as CSV bytes.
+
+    Frames read by the "pyarrow" engine hold only text, so they are written with
+    the Arrow CSV writer rather than DataFrame.to_csv, which formats each value
+    in Python.
+
+    Parameters:
+    df (pandas.DataFrame): The masked data.
+    engine (str): The engine that read the data, "pandas" or "pyarrow".
+    header (bool): Whether to write the header line.
+
+    Returns:
+    bytes: The CSV data, with "\n" line endings.
+    """
+    if engine == "pyarrow":
+        import pyarrow as pa
+
+        return _write_arrow_csv(pa.Table.from_pandas(df, preserve_index=False), header)
+    return df.to_csv(index=False, header=header).encode("utf-8")
+
+
+def iter_text_lines(chunks):
+    """
+    Decodes a stream of UTF-8 byte chunks into lines, each with its line ending.
+
+    Only "\n" ends a line, so other Unicode line breaks inside a field are kept.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    carry = ""
+    for chunk in chunks:
+        lines = (carry + decoder.decode(chunk)).split("\n")
+        carry = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    carry += decoder.decode(b"", final=True)
+    if carry:
+        yield carry
+
+
+def _mask_rows(rows, pii_fields, replacement):
+    """
+    Yields the header of a csv.reader and then each of its rows with the PII
+    columns replaced.
+    """
+    header = next(rows, None)
+    if header is None:
+        return
+    for pii_field in pii_fields:
+        if pii_field in header:
+            logger.info(f"Obfuscating field: {pii_field}")
+        else:
+            logger.warning(f"Field '{pii_field}' not found in CSV header.")
+    indexes = [index for index, column in enumerate(header) if column in pii_fields]
+    yield header
+    for row in rows:
+        for index in indexes:
+            if index < len(row):
+                row[index] = replacement
+        yield row
+
+
+def iter_masked_rows(
+    lines, pii_fields, chunk_rows=DEFAULT_CHUNK_ROWS, replacement=MASK
+):
+    """
+    Masks the PII columns of a CSV document with the standard library csv module.
+
+    Each record is parsed into a list of fields and written back with minimal
+    quoting, as pandas writes it, but every value is kept as text. It needs
+    nothing beyond the standard library and supports only redaction.
+
+    Parameters:
+    lines (iterable): The lines of the CSV document as strings, such as the
+                      output of iter_text_lines.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    chunk_rows (int): The number of rows written to each yielded block.
+    replacement (str): The value written in place of each PII field.
+
+    Yields:
+    bytes: Blocks of the masked CSV document, in order.
+    """
+    rows = _mask_rows(csv.reader(lines), pii_fields, replacement)
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    while True:
+        writer.writerows(islice(rows, chunk_rows))
+        if not output.tell():
+            return
+        yield output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate()
+
+
+def mask_csv_rows(data, pii_fields, replacement=MASK):
+    """
+    Masks the PII columns of a CSV file held in memory with the csv module.
+
+    Parameters:
+    data (bytes): The CSV file.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    replacement (str): The value written in place of each PII field.
+
+    Returns:
+    bytes: The masked CSV file.
+    """
+    lines = io.StringIO(data.decode("utf-8-sig"), newline="")
+    return b"".join(iter_masked_rows(lines, pii_fields, None, replacement))
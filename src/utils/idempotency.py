@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+
+from src.utils.masking import build_masking_plan, needs_key
+from src.utils.pseudonymise import load_hmac_key, pseudonymise_value
+from src.utils.s3_io import is_not_found
+
+logger = logging.getLogger()
+
+INDEX_PREFIX = "index/"
+INVOCATION_INDEX_PREFIX = "index/invocations/"
+# The invocation settings that change the bytes written for a source object.
+CONFIG_FIELDS = (
+    "mode",
+    "pii_fields",
+    "strategy",
+    "strategies",
+    "engine",
+    "output_compression",
+    "auto_detect",
+    "sample_kb",
+)
+
+
+def normalise_etag(etag):
+    """
+    Strips the quotes S3 puts around ETags in API responses, which S3 event
+    records leave out, so both forms compare equal.
+    """
+    return (etag or "").strip('"')
+
+
+def config_hash(json_content):
+    """
+    Hashes the settings of an invocation JSON that affect the obfuscated output.
+
+    When a field is pseudonymised, a fingerprint of the HMAC key is included, so
+    rotating the key invalidates earlier entries. The key itself is never stored.
+
+    Parameters:
+    json_content (dict): The invocation JSON.
+
+    Returns:
+    str: The hex SHA-256 digest of the settings.
+    """
+    config = {field: json_content.get(field) for field in CONFIG_FIELDS}
+    # The mode picks the engine when none is given, so it is hashed as it is run.
+    config["mode"] = json_content.get("mode", "memory")
+    plan = build_masking_plan(
+        json_content.get("pii_fields", []),
+        json_content.get("strategy", "redact"),
+        json_content.get("strategies"),
+    )
+    if needs_key(plan):
+        config["key"] = pseudonymise_value("idempotency-index", load_hmac_key())[:16]
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def index_key(bucket_name, key, etag, digest, output_key):
+    """
+    Returns the key of the index entry of one processed source object.
+
+    Parameters:
+    bucket_name (str): The bucket of the source object.
+    key (str): The key of the source object.
+    etag (str): The ETag of the source object.
+    digest (str): The config_hash of the invocation.
+    output_key (str): The key the output is written to.
+
+    Returns:
+    str: A key under INDEX_PREFIX in the processed bucket.
+    """
+    identity = "\0".join(
+        [bucket_name, key, normalise_etag(etag), digest, output_key]
+    )
+    return f"{INDEX_PREFIX}{hashlib.sha256(identity.encode('utf-8')).hexdigest()}.json"
+
+
+def invocation_index_key(bucket_name, key, etag):
+    """
+    Returns the key of the index entry of a processed invocation JSON file.
+    """
+    identity = "\0".join([bucket_name, key, normalise_etag(etag)])
+    digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+    return f"{INVOCATION_INDEX_PREFIX}{digest}.json"
+
+
+def _head(s3_client, bucket_name, key):
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=key)
+    except Exception as e:
+        if is_not_found(e):
+            return None
+        raise
+
+
+def find_output(s3_client, processed_bucket_name, entry_key):
+    """
+    Looks up an index entry and checks that the output it records still exists.
+
+    Only HEAD requests are made: one for the entry, whose metadata holds the
+    output's key and size, and one for the output itself.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for the requests.
+    processed_bucket_name (str): The bucket holding the index and the output.
+    entry_key (str): The key of the index entry, from index_key.
+
+    Returns:
+    dict: The output's "output_key" and "bytes_written", or None if the source has
+          not been processed with these settings or its output has been removed.
+    """
+    entry = _head(s3_client, processed_bucket_name, entry_key)
+    if entry is None:
+        return None
+    metadata = entry.get("Metadata", {})
+    output_key = metadata.get("output-key")
+    if not output_key:
+        return None
+    output = _head(s3_client, processed_bucket_name, output_key)
+    if output is None:
+        logger.info(f"Output {output_key} of index entry {entry_key} was removed.")
+        return None
+    return {"output_key": output_key, "bytes_written": output["ContentLength"]}
+
+
+def record_output(s3_client, processed_bucket_name, entry_key, output_key, record):
+    """
+    Writes an index entry once a source object or invocation has been processed.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for the request.
+    processed_bucket_name (str): The bucket holding the index.
+    entry_key (str): The key of the entry, from index_key or invocation_index_key.
+    output_key (str): The key of the output, stored in the entry's metadata.
+    record (dict): Details stored in the entry's body, such as the source's key
+                   and ETag.
+    """
+    body = dict(record, output_key=output_key)
+    body["processed_at"] = datetime.now(timezone.utc).isoformat()
+    s3_client.put_object(
+        Bucket=processed_bucket_name,
+        Key=entry_key,
+        Body=json.dumps(body).encode("utf-8"),
+        ContentType="application/json",
+        Metadata={"output-key": output_key},
+    )
@@ -0,0 +1,309 @@
+import codecs
+import itertools
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger()
+
+JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson")
+JSON_EXTENSIONS = (".json",) + JSON_LINES_EXTENSIONS
+WILDCARD = "*"
+
+_PATH_STEP = re.compile(r"\.?([^.\[\]]+)|\[(\*|-?\d+|'[^']*'|\"[^\"]*\")\]")
+_decoder = json.JSONDecoder()
+
+
+def is_json(path):
+    """
+    Detects JSON or JSON Lines input from its file extension.
+
+    Parameters:
+    path (str): The file name or S3 key of the input.
+
+    Returns:
+    bool: True if the input is a ".json", ".jsonl" or ".ndjson" file.
+    """
+    return os.path.splitext(path)[1].lower() in JSON_EXTENSIONS
+
+
+def parse_field_path(path):
+    """
+    Parses a dotted or JSONPath-style field path into its steps.
+
+    "user.contact.email", "$.user.contact.email", "$['user']['contact']['email']",
+    "orders[*].card" and "orders.0.card" are all accepted.
+
+    Parameters:
+    path (str): The field path.
+
+    Returns:
+    tuple: The object keys (str), list indexes (int) and wildcards ("*") to follow.
+
+    Raises:
+    ValueError: If the path cannot be parsed.
+    """
+    text = path[1:] if path.startswith("$") else path
+    steps = []
+    position = 0
+    while position < len(text):
+        match = _PATH_STEP.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid field path: {path}")
+        name, bracket = match.groups()
+        if name is not None:
+            steps.append(name)
+        elif bracket == WILDCARD:
+            steps.append(WILDCARD)
+        elif bracket[0] in "'\"":
+            steps.append(bracket[1:-1])
+        else:
+            steps.append(int(bracket))
+        position = match.end()
+    if not steps:
+        raise ValueError(f"Invalid field path: {path}")
+    return tuple(steps)
+
+
+def _children(value, step):
+    if step == WILDCARD:
+        if isinstance(value, list):
+            return range(len(value))
+        if isinstance(value, dict):
+            return list(value)
+        return []
+    if isinstance(value, list):
+        try:
+            index = int(step)
+        except ValueError:
+            return []
+        return [index] if -len(value) <= index < len(value) else []
+    if isinstance(value, dict) and step in value:
+        return [step]
+    return []
+
+
+def mask_path(value, steps, replacement):
+    """
+    Replaces every value reached by following a parsed field path.
+
+    Parameters:
+    value (dict or list): The decoded JSON value to mask in place.
+    steps (tuple): The parsed field path.
+    replacement (str): The value written in place of each PII field.
+
+    Returns:
+    int: The number of values replaced.
+    """
+    step, rest = steps[0], steps[1:]
+    replaced = 0
+    for child in _children(value, step):
+        if rest:
+            replaced += mask_path(value[child], rest, replacement)
+        else:
+            value[child] = replacement
+            replaced += 1
+    return replaced
+
+
+def _leaf_markers(field_paths):
+    """
+    Returns the encoded names of the last key in every path. A record that contains
+    none of them cannot hold a PII field, so it can be copied without being parsed.
+    Returns None if some path ends in a wildcard or index and no such check is possible.
+    """
+    markers = set()
+    for steps in field_paths:
+        keys = [step for step in steps if isinstance(step, str) and step != WILDCARD]
+        if not keys or keys[-1] != steps[-1]:
+            return None
+        markers.add(json.dumps(keys[-1]).encode("utf-8"))
+        markers.add(json.dumps(keys[-1], ensure_ascii=False).encode("utf-8"))
+    return markers
+
+
+def _might_contain(raw, markers):
+    if markers is None or b"\\u" in raw:
+        return True
+    return any(marker in raw for marker in markers)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def iter_masked_json_lines(chunks, pii_fields, replacement="***"):
+    """
+    Masks PII fields of a JSON Lines document supplied as a stream of byte chunks.
+
+    Each line is handled on its own, so memory is bounded by the longest line.
+    Lines that contain no PII field name, or in which no path matched, are copied
+    to the output byte for byte; only lines that changed are re-serialised.
+
+    Parameters:
+    chunks (iterable): An iterable of bytes objects making up the document.
+    pii_fields (list): Dotted or JSONPath-style paths of the PII fields to be obfuscated.
+    replacement (str): The value written in place of each PII field.
+
+    Yields:
+    bytes: Blocks of the masked document, in order.
+    """
+    field_paths = [parse_field_path(field) for field in pii_fields]
+    markers = _leaf_markers(field_paths)
+
+    def mask_line(line):
+        if not field_paths or not line.strip() or not _might_contain(line, markers):
+            return line
+        record = json.loads(line)
+        if not sum(mask_path(record, steps, replacement) for steps in field_paths):
+            return line
+        return _dumps(record) + (b"\r" if line.endswith(b"\r") else b"")
+
+    carry = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (carry + chunk).split(b"\n")
+        carry = lines.pop()
+        if lines:
+            yield b"\n".join(mask_line(line) for line in lines) + b"\n"
+    if carry:
+        yield mask_line(carry)
+
+
+def iter_masked_json_array(chunks, pii_fields, replacement="***"):
+    """
+    Masks PII fields of the elements of a top-level JSON array supplied as a stream
+    of byte chunks.
+
+    Elements are decoded one at a time as soon as they are complete, so memory is
+    bounded by the largest element rather than the document. Elements in which no
+    path matched are copied to the output verbatim. Whitespace between elements is
+    not preserved.
+
+    Parameters:
+    chunks (iterable): An iterable of bytes objects making up the document.
+    pii_fields (list): Dotted or JSONPath-style paths of the PII fields to be obfuscated.
+    replacement (str): The value written in place of each PII field.
+
+    Yields:
+    bytes: Blocks of the masked document, in order.
+
+    Raises:
+    ValueError: If the document is not a well-formed JSON array.
+    """
+    field_paths = [parse_field_path(field) for field in pii_fields]
+    markers = _leaf_markers(field_paths)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    whitespace = " \t\r\n"
+
+    text = ""
+    state = "open"
+    elements = 0
+    for chunk in itertools.chain(chunks, [None]):
+        at_end = chunk is None
+        text += decoder.decode(b"" if at_end else chunk, final=at_end)
+
+        output = []
+        position = 0
+        while state != "closed":
+            while position < len(text) and text[position] in whitespace:
+                position += 1
+            if position == len(text):
+                break
+            char = text[position]
+            if state == "open":
+                if char != "[":
+                    raise ValueError("JSON document is not an array.")
+                output.append("[")
+                position += 1
+                state = "first"
+            elif state == "after_value" or (state == "first" and char == "]"):
+                if char == "]":
+                    output.append("]")
+                    position += 1
+                    state = "closed"
+                elif char == ",":
+                    position += 1
+                    state = "value"
+                else:
+                    raise ValueError(f"Expected ',' or ']' in JSON array: {char!r}")
+            else:
+                try:
+                    value, end = _decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    if at_end:
+                        raise
+                    break
+                if end == len(text) and not at_end:
+                    break
+                raw = text[position:end]
+                if (
+                    field_paths
+                    and _might_contain(raw.encode("utf-8"), markers)
+                    and sum(mask_path(value, steps, replacement) for steps in field_paths)
+                ):
+                    raw = _dumps(value).decode("utf-8")
+                output.append("," + raw if elements else raw)
+                elements += 1
+                position = end
+                state = "after_value"
+
+        text = text[position:]
+        if output:
+            yield "".join(output).encode("utf-8")
+
+    if state != "closed":
+        raise ValueError("JSON array is not terminated.")
+
+
+def iter_masked_json(chunks, path, pii_fields, replacement="***"):
+    """
+    Masks PII fields of a JSON or JSON Lines document, choosing the parser by format.
+
+    ".jsonl" and ".ndjson" files, and ".json" files whose first line is a complete
+    JSON object, are treated as JSON Lines. ".json" files starting with "[" are
+    streamed element by element. Any other JSON document is decoded as a whole.
+
+    Parameters:
+    chunks (iterable): An iterable of bytes objects making up the document.
+    path (str): The file name or S3 key of the input, used to detect the format.
+    pii_fields (list): Dotted or JSONPath-style paths of the PII fields to be obfuscated.
+    replacement (str): The value written in place of each PII field.
+
+    Yields:
+    bytes: Blocks of the masked document, in order.
+    """
+    chunks = iter(chunks)
+    if os.path.splitext(path)[1].lower() in JSON_LINES_EXTENSIONS:
+        yield from iter_masked_json_lines(chunks, pii_fields, replacement)
+        return
+
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if head.lstrip() and (b"\n" in head.lstrip() or len(head) > 65536):
+            break
+    chunks = itertools.chain([head], chunks)
+    stripped = head.lstrip().lstrip(codecs.BOM_UTF8).lstrip()
+
+    if stripped.startswith(b"["):
+        yield from iter_masked_json_array(chunks, pii_fields, replacement)
+        return
+
+    first_line = stripped.split(b"\n", 1)[0]
+    try:
+        json.loads(first_line)
+        is_json_lines = b"\n" in stripped
+    except ValueError:
+        is_json_lines = False
+    if is_json_lines:
+        yield from iter_masked_json_lines(chunks, pii_fields, replacement)
+        return
+
+    logger.warning("JSON document is not an array or JSON Lines; decoding it whole.")
+    document = json.loads(b"".join(chunks))
+    for pii_field in pii_fields:
+        mask_path(document, parse_field_path(pii_field), replacement)
+    yield _dumps(document)
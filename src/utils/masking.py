@@ -0,0 +1,234 @@
+import logging
+
+from src.utils.pseudonymise import pseudonymise_column
+
+logger = logging.getLogger()
+
+MASK = "***"
+DEFAULT_STRATEGY = "redact"
+
+STRATEGIES = {}
+
+
+def register_strategy(name):
+    """
+    Registers a masking kernel under a strategy name.
+
+    A kernel takes a whole column as a pandas Series, plus the strategy's options as
+    keyword arguments, and returns the masked column or a scalar to broadcast. It
+    must work on the column as a whole with pandas, NumPy or Arrow compute
+    operations, never row by row.
+
+    Parameters:
+    name (str): The name used for the strategy in the invocation JSON.
+
+    Returns:
+    function: A decorator that registers the kernel and returns it unchanged.
+    """
+
+    def decorator(kernel):
+        STRATEGIES[name] = kernel
+        return kernel
+
+    return decorator
+
+
+def as_arrow_text(values):
+    """
+    Converts a column to an Arrow string array, with missing values as nulls.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    return pa.array(values.astype(pd.StringDtype("pyarrow")))
+
+
+def from_arrow_text(array, values):
+    """
+    Wraps an Arrow string array as a pandas Series aligned with the original column,
+    without converting it to Python objects.
+    """
+    import pandas as pd
+
+    return pd.Series(pd.arrays.ArrowStringArray(array), index=values.index)
+
+
+@register_strategy("redact")
+def redact(values):
+    """Replaces every value with "***"."""
+    return MASK
+
+
+@register_strategy("null")
+def null(values):
+    """Removes every value, leaving an empty field."""
+    return float("nan")
+
+
+@register_strategy("hmac")
+def hmac_pseudonym(values, key, cache=None):
+    """Replaces every value with its keyed HMAC-SHA256 pseudonym."""
+    return pseudonymise_column(values, key, cache)
+
+
+@register_strategy("email_domain")
+def email_domain(values):
+    """Keeps the domain of an email address: "john@example.net" becomes "***@example.net".
+    Values without an "@" are fully masked."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = as_arrow_text(values)
+    empty = pa.scalar("", text.type)
+    # Prefixing an "@" guarantees two parts when splitting at the last one.
+    parts = pc.split_pattern(
+        pc.binary_join_element_wise(pa.scalar("@", text.type), text, empty),
+        "@",
+        max_splits=1,
+        reverse=True,
+    )
+    domain = pc.binary_join_element_wise(
+        pa.scalar(MASK + "@", text.type), pc.list_element(parts, 1), empty
+    )
+    masked = pc.if_else(
+        pc.match_substring(text, "@"), domain, pa.scalar(MASK, text.type)
+    )
+    return from_arrow_text(masked, values)
+
+
+@register_strategy("keep_last")
+def keep_last(values, n=4):
+    """Masks every character but the last `n`: "4111111111111111" becomes "************1111"."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    n = int(n)
+    if n < 0:
+        raise ValueError("keep_last needs a non-negative n.")
+    text = as_arrow_text(values)
+    hidden = pc.max_element_wise(pc.subtract(pc.utf8_length(text), n), 0)
+    masked = pc.binary_join_element_wise(
+        pc.binary_repeat(pa.scalar("*", text.type), hidden),
+        pc.utf8_slice_codeunits(text, -n) if n else pa.scalar("", text.type),
+        pa.scalar("", text.type),
+    )
+    return from_arrow_text(masked, values)
+
+
+@register_strategy("preserve_length")
+def preserve_length(values):
+    """Replaces every character with "*", keeping the length of each value."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = as_arrow_text(values)
+    masked = pc.binary_repeat(pa.scalar("*", text.type), pc.utf8_length(text))
+    return from_arrow_text(masked, values)
+
+
+@register_strategy("year")
+def year(values):
+    """Keeps only the year of a date: "1990-05-12" becomes "1990". Values that are
+    not dates are fully masked.
+
+    Dates are read as ISO 8601 only. Other formats, such as "12/05/1990", are
+    masked rather than guessed, as they may be day-first or month-first. Times
+    with an offset are converted to UTC, so a column mixing offsets still parses."""
+    import pandas as pd
+
+    dates = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True)
+    years = dates.dt.year.astype("Int64").astype(pd.StringDtype("pyarrow"))
+    return years.where(dates.notna() | values.isna(), MASK)
+
+
+def parse_strategy(spec):
+    """
+    Parses the strategy of one field from the invocation JSON.
+
+    Parameters:
+    spec (str or dict): A strategy name, such as "email_domain", or a dictionary
+                        with a "name" and the strategy's options, such as
+                        {"name": "keep_last", "n": 4}.
+
+    Returns:
+    tuple: The strategy name and a dictionary of its options.
+
+    Raises:
+    ValueError: If the strategy is unknown.
+    """
+    if isinstance(spec, dict):
+        options = dict(spec)
+        name = options.pop("name", None)
+    else:
+        name, options = spec, {}
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {name}")
+    return name, options
+
+
+def build_masking_plan(pii_fields, strategy=DEFAULT_STRATEGY, strategies=None):
+    """
+    Decides which strategy masks each PII field.
+
+    Parameters:
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    strategy (str or dict): The strategy of every field without its own entry.
+    strategies (dict): Per-field strategies, keyed by column name.
+
+    Returns:
+    dict: The (name, options) tuple of each PII field, in the order of pii_fields.
+
+    Raises:
+    ValueError: If a strategy is unknown.
+    """
+    strategies = strategies or {}
+    for field in strategies:
+        if field not in pii_fields:
+            logger.warning(f"Strategy given for '{field}', which is not a PII field.")
+    return {
+        field: parse_strategy(strategies.get(field, strategy)) for field in pii_fields
+    }
+
+
+def is_redact_only(plan):
+    """
+    Returns True if every field of a masking plan is replaced with the constant "***",
+    which the byte-level engines can do without parsing values.
+    """
+    return all(name == "redact" for name, _ in plan.values())
+
+
+def needs_key(plan):
+    """
+    Returns True if some field of a masking plan is pseudonymised and needs the HMAC key.
+    """
+    return any(name == "hmac" for name, _ in plan.values())
+
+
+def read_dtypes(plan):
+    """
+    Returns the dtype argument for pd.read_csv. Fields whose strategy looks at the
+    value are read as text, so they are masked as written in the file rather than
+    as the type pandas would infer.
+    """
+    text_fields = {field: str for field, (name, _) in plan.items() if name != "redact"}
+    return text_fields or None
+
+
+def mask_dataframe(df, plan, key=None, caches=None):
+    """
+    Masks the PII columns of a DataFrame in place, one column kernel per field.
+
+    Parameters:
+    df (pandas.DataFrame): The data to mask.
+    plan (dict): The masking plan from build_masking_plan.
+    key (bytes): The HMAC key, required by the hmac strategy.
+    caches (dict): Per-column pseudonym caches shared between chunks of one file.
+    """
+    for field, (name, options) in plan.items():
+        if field not in df.columns:
+            continue
+        if name == "hmac":
+            cache = None if caches is None else caches.setdefault(field, {})
+            options = dict(options, key=key, cache=cache)
+        df[field] = STRATEGIES[name](df[field], **options)
@@ -0,0 +1,315 @@
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = "GDPRObfuscator"
+SERVICE = "gdpr-obfuscator"
+
+STAGES = (
+    "state_lookup",
+    "key_discovery",
+    "detect",
+    "download",
+    "parse",
+    "mask",
+    "serialise",
+    "upload",
+    "cleanup",
+)
+
+COUNTER_UNITS = {
+    "BytesIn": "Bytes",
+    "BytesOut": "Bytes",
+    "Rows": "Count",
+    "Records": "Count",
+    "FailedRecords": "Count",
+    "SkippedFiles": "Count",
+}
+
+
+def peak_memory_mb():
+    """
+    Returns the peak resident set size of the process in MiB. On Lambda this is the
+    peak of the execution environment, which may span several warm invocations.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _metric_name(stage):
+    return "".join(part.title() for part in stage.split("_")) + "Duration"
+
+
+class InvocationMetrics:
+    """
+    Collects per-stage durations and counters for one handler invocation.
+
+    Stages may nest, for example a download inside a parse of a streamed body.
+    Each stage is only charged for its own time; the time of any stage nested
+    inside it is subtracted, so the stage durations add up to the time spent in
+    instrumented code. Stages and counters may be recorded from several threads.
+
+    Properties set while a thread is processing a file, inside for_file, belong
+    to that file, so files processed together do not overwrite each other's.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counters = {}
+        self.properties = {}
+        self.files = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a block of code as part of a stage.
+
+        Parameters:
+        name (str): One of STAGES.
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.durations[name] = self.durations.get(name, 0.0) + elapsed - nested
+
+    def timed_iter(self, name, iterable):
+        """
+        Charges the time spent producing each item of an iterable to a stage.
+
+        Parameters:
+        name (str): One of STAGES.
+        iterable (iterable): The items to time, such as the chunks of an S3 body.
+
+        Yields:
+        object: The items of the iterable, unchanged.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def timed_stream(self, stream):
+        """
+        Wraps a binary stream so its reads are charged to the download stage and
+        counted as BytesIn, for bodies that a parser reads directly.
+
+        Parameters:
+        stream (file-like): The stream to read, such as an S3 response body.
+
+        Returns:
+        TimedStream: A file-like object with the stream's read method.
+        """
+        return TimedStream(stream, self)
+
+    def count(self, name, value):
+        """
+        Adds to a counter, such as "BytesIn", "BytesOut" or "Rows".
+
+        Parameters:
+        name (str): The counter's name.
+        value (int): The amount to add.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def for_file(self, key):
+        """
+        Records the properties set by this thread inside the block as those of
+        one file.
+
+        Parameters:
+        key (str): The file's S3 key.
+        """
+        previous = getattr(self._local, "file", None)
+        self._local.file = key
+        with self._lock:
+            self.files.setdefault(key, {})
+        try:
+            yield
+        finally:
+            self._local.file = previous
+
+    def set_property(self, name, value):
+        """
+        Attaches a value to the metrics line that is searchable in the logs but
+        not published as a metric, such as the processing mode. Inside for_file
+        the value is attached to the file being processed.
+        """
+        file = getattr(self._local, "file", None)
+        with self._lock:
+            if file is None:
+                self.properties[name] = value
+            else:
+                self.files[file][name] = value
+
+    def _file_properties(self):
+        """
+        Returns the properties of the processed files: a "Files" list with each
+        file's own, and each property that every file shares with its value.
+        """
+        if not self.files:
+            return {}
+        files = list(self.files.values())
+        shared = {
+            name: value
+            for name, value in files[0].items()
+            if all(name in other and other[name] == value for other in files[1:])
+        }
+        return {
+            **shared,
+            "Files": [{"File": key, **values} for key, values in self.files.items()],
+        }
+
+    def to_emf(self):
+        """
+        Formats the metrics in CloudWatch embedded metric format.
+
+        Returns:
+        dict: The log record. CloudWatch extracts every metric named in its
+              "_aws" block; the other keys stay searchable in Logs Insights.
+        """
+        total = time.perf_counter() - self.started
+        values = {
+            _metric_name(stage): round(seconds * 1000, 3)
+            for stage, seconds in self.durations.items()
+        }
+        values["TotalDuration"] = round(total * 1000, 3)
+        units = {name: "Milliseconds" for name in values}
+
+        for name, value in self.counters.items():
+            values[name] = value
+            units[name] = COUNTER_UNITS.get(name, "Count")
+
+        if total > 0 and self.counters.get("BytesIn"):
+            values["Throughput"] = round(self.counters["BytesIn"] / 1024**2 / total, 3)
+            units["Throughput"] = "Megabytes/Second"
+
+        values["PeakMemory"] = round(peak_memory_mb(), 1)
+        units["PeakMemory"] = "Megabytes"
+
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": NAMESPACE,
+                        "Dimensions": [["Service"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit} for name, unit in units.items()
+                        ],
+                    }
+                ],
+            },
+            "Service": SERVICE,
+            **self._file_properties(),
+            **self.properties,
+            **values,
+        }
+
+    def emit(self):
+        """
+        Writes the metrics as a single JSON line to standard output.
+
+        Returns:
+        dict: The emitted record.
+        """
+        record = self.to_emf()
+        # Embedded metrics must be the whole log line, so they are printed rather
+        # than logged, which on Lambda would prefix the level and request ID.
+        print(json.dumps(record, default=str), flush=True)
+        return record
+
+
+class TimedStream:
+    """
+    File-like wrapper that records the time and size of each read of a stream.
+
+    Parameters:
+    stream (file-like): The stream to read.
+    collector (InvocationMetrics): The collector the reads are recorded in.
+    """
+
+    def __init__(self, stream, collector):
+        self.stream = stream
+        self.collector = collector
+
+    def read(self, size=-1):
+        with self.collector.stage("download"):
+            data = self.stream.read(size)
+        self.collector.count("BytesIn", len(data))
+        return data
+
+    def __iter__(self):
+        for line in self.collector.timed_iter("download", self.stream):
+            self.collector.count("BytesIn", len(line))
+            yield line
+
+
+_current = InvocationMetrics()
+
+
+def start_invocation():
+    """
+    Starts collecting metrics for a new invocation.
+
+    Returns:
+    InvocationMetrics: The collector the module-level helpers now record into.
+    """
+    global _current
+    _current = InvocationMetrics()
+    return _current
+
+
+def current():
+    """Returns the collector of the current invocation."""
+    return _current
+
+
+def stage(name):
+    """Times a block of code as part of a stage of the current invocation."""
+    return _current.stage(name)
+
+
+def timed_iter(name, iterable):
+    """Charges the time spent producing each item to a stage of the current invocation."""
+    return _current.timed_iter(name, iterable)
+
+
+def timed_stream(stream):
+    """Charges the reads of a stream to the download stage of the current invocation."""
+    return _current.timed_stream(stream)
+
+
+def count(name, value):
+    """Adds to a counter of the current invocation."""
+    _current.count(name, value)
+
+
+def for_file(key):
+    """Records the properties set inside the block as those of one file."""
+    return _current.for_file(key)
+
+
+def set_property(name, value):
+    """Attaches a property to the current invocation's metrics line."""
+    _current.set_property(name, value)
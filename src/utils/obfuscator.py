@@ -0,0 +1,916 @@
+import argparse
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from src.utils import metrics
+from src.utils.compression import (
+    HEAD_BYTES,
+    OUTPUT_EXTENSIONS,
+    PrefixedReader,
+    compress_bytes,
+    decompress_bytes,
+    detect_compression,
+    iter_compressed,
+    iter_read,
+    open_decompressed,
+    resolve_compression,
+    strip_compression_extension,
+)
+from src.utils.csv_engines import (
+    FRAME_ENGINES,
+    frame_to_csv,
+    header_columns,
+    iter_csv_frames,
+    iter_masked_rows,
+    iter_record_blocks,
+    iter_text_lines,
+    mask_csv_rows,
+    peek_header,
+    read_arrow_block,
+    read_csv_frame,
+)
+from src.utils.csv_splice import (
+    iter_masked_csv,
+    mask_csv_block,
+    mask_csv_bytes,
+    mask_csv_file,
+)
+from src.utils.json_stream import is_json, iter_masked_json
+from src.utils.masking import (
+    build_masking_plan,
+    is_redact_only,
+    mask_dataframe,
+    needs_key,
+    read_dtypes,
+)
+from src.utils.parquet import is_parquet, mask_parquet
+from src.utils.pii_detect import (
+    DEFAULT_SAMPLE_KB,
+    detect_pii_columns,
+    merge_pii_fields,
+    read_file_sample,
+)
+from src.utils.pseudonymise import load_hmac_key
+
+logger = logging.getLogger()
+
+MB = 1024 * 1024
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+ENGINES = ("pandas", "pyarrow", "csv", "splice")
+AUTO_ENGINE = "auto"
+FAST_PATH_MAX_BYTES = 1024 * 1024
+# Crossover points of the "auto" engine, measured with benchmarks/benchmark.py,
+# which runs each case in a fresh process, as a cold Lambda does.
+AUTO_SPLICE_MAX_BYTES = 128 * 1024 * 1024
+AUTO_WIDE_COLUMNS = 32
+DEFAULT_PROCESSES = os.cpu_count() or 2
+
+
+def prepare_masking(pii_fields, strategy="redact", strategies=None, engine="pandas"):
+    """
+    Builds the masking plan of an invocation and loads the HMAC key if it needs one.
+
+    Parameters:
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    strategy (str or dict): The strategy of every field without its own entry.
+    strategies (dict): Per-field strategies, keyed by column name.
+    engine (str): The engine the plan will run on. "auto" picks an engine that
+                  supports the plan.
+
+    Returns:
+    tuple: The masking plan and the HMAC key, or None if no field is pseudonymised.
+
+    Raises:
+    ValueError: If a strategy is unknown, the engine only supports redaction, or
+                no HMAC key is configured.
+    """
+    plan = build_masking_plan(pii_fields, strategy, strategies)
+    if not is_redact_only(plan) and engine not in FRAME_ENGINES + (AUTO_ENGINE,):
+        raise ValueError(
+            "Masking strategies other than redact need the pandas or pyarrow engine."
+        )
+    return plan, load_hmac_key() if needs_key(plan) else None
+
+
+def check_options(
+    pii_fields,
+    engine=None,
+    strategy="redact",
+    strategies=None,
+    output_compression=None,
+):
+    """
+    Validates the settings of an obfuscation before any data is read.
+
+    Parameters:
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    engine (str): One of ENGINES, or "auto" or None to choose with choose_engine.
+    strategy (str or dict): The strategy of every field without its own entry.
+    strategies (dict): Per-field strategies, keyed by column name.
+    output_compression (str): "gzip", "bz2" or "zstd", or None.
+
+    Returns:
+    tuple: The masking plan, the HMAC key or None, and the output compression.
+
+    Raises:
+    ValueError: If the engine, a strategy or the output compression is unknown,
+                or no HMAC key is configured.
+    """
+    if engine is not None and engine not in ENGINES + (AUTO_ENGINE,):
+        raise ValueError(f"Unknown engine: {engine}")
+    plan, key = prepare_masking(pii_fields, strategy, strategies, engine or "pandas")
+    return plan, key, resolve_compression(output_compression)
+
+
+def choose_engine(engine, plan, size=None, columns=None):
+    """
+    Picks the engine of a CSV file when none is configured, or when it is "auto".
+
+    With no engine, CSVs of up to FAST_PATH_MAX_BYTES that are only redacted use
+    "splice", which needs nothing beyond the standard library; everything else,
+    including input of unknown size, uses "pandas".
+
+    "auto" chooses by size and column count instead. In a fresh process, which
+    first imports pandas and pyarrow, Arrow masks a narrow CSV faster than splice
+    does once it is larger than AUTO_SPLICE_MAX_BYTES. It also has a fixed cost
+    for each column, so smaller CSVs and CSVs with more than AUTO_WIDE_COLUMNS
+    columns use "splice". Plans with strategies other than "redact" always use
+    "pyarrow", which keeps the other values as written. Input of unknown size
+    counts as large and input of unknown width as narrow. Data the Arrow reader
+    rejects is masked with fallback_engine instead.
+
+    Parameters:
+    engine (str): The configured engine, "auto", or None.
+    plan (dict): The masking plan from prepare_masking.
+    size (int): The size of the CSV in bytes, or None if it is not known.
+    columns (int): The number of columns of the CSV, or None if it is not known.
+
+    Returns:
+    str: The engine to use.
+    """
+    if engine == AUTO_ENGINE:
+        if not is_redact_only(plan):
+            return "pyarrow"
+        small = size is not None and size <= AUTO_SPLICE_MAX_BYTES
+        wide = columns is not None and columns > AUTO_WIDE_COLUMNS
+        return "splice" if small or wide else "pyarrow"
+    if engine is not None:
+        return engine
+    small = size is not None and size <= FAST_PATH_MAX_BYTES
+    return "splice" if small and is_redact_only(plan) else "pandas"
+
+
+def fallback_engine(plan):
+    """
+    Returns the engine that masks CSV data the Arrow reader rejects, such as rows
+    with more or fewer fields than the header: "splice", which copies such rows
+    as they are, or "pandas" for strategies other than redact.
+
+    Parameters:
+    plan (dict): The masking plan from prepare_masking.
+
+    Returns:
+    str: "splice" or "pandas".
+    """
+    return "splice" if is_redact_only(plan) else "pandas"
+
+
+def compress_output(data, compression):
+    """
+    Compresses obfuscated output held in memory, timed as part of the serialise stage.
+
+    Parameters:
+    data (bytes): The obfuscated data.
+    compression (str): "gzip", "bz2" or "zstd", or None to return the data unchanged.
+
+    Returns:
+    bytes: The data to upload.
+    """
+    if compression is None:
+        return data
+    with metrics.stage("serialise"):
+        return compress_bytes(data, compression)
+
+
+def log_missing_fields(pii_fields, columns):
+    for pii_field in pii_fields:
+        if pii_field in columns:
+            logger.info(f"Obfuscating field: {pii_field}")
+        else:
+            logger.warning(f"Field '{pii_field}' not found in DataFrame columns.")
+
+
+def mask_bytes(
+    data,
+    file_name,
+    pii_fields,
+    plan,
+    key=None,
+    engine=None,
+    output_compression=None,
+    engines=None,
+):
+    """
+    Obfuscates a whole file held in memory.
+
+    This is the core of obfuscate_pii once the file has been downloaded, and of
+    obfuscate for bytes input. Input compressed with gzip, bz2 or zstd is
+    decompressed first. Parquet input is masked with Arrow and returned as
+    Parquet bytes, and JSON and JSON Lines input takes dotted or JSONPath-style
+    field paths.
+
+    Parameters:
+    data (bytes): The contents of the file.
+    file_name (str): The file's name or S3 key, used to detect its format.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    plan (dict): The masking plan, from check_options.
+    key (bytes): The HMAC key, required by the hmac strategy.
+    engine (str): One of ENGINES, or "auto" or None to choose with choose_engine.
+    output_compression (str): "gzip", "bz2" or "zstd" to compress the output.
+    engines (list): If given, the engine that masked a CSV is appended to it. It
+                    is fallback_engine's when the Arrow reader rejects the file.
+
+    Returns:
+    bytes: The obfuscated file.
+
+    Raises:
+    ValueError: If a strategy other than redact is used for Parquet or JSON input.
+    """
+    compression = detect_compression(file_name, data[:HEAD_BYTES])
+    if compression:
+        with metrics.stage("parse"):
+            data = decompress_bytes(data, compression)
+        file_name = strip_compression_extension(file_name)
+
+    if not is_redact_only(plan) and (
+        is_parquet(file_name, data[:4]) or is_json(file_name)
+    ):
+        raise ValueError("Masking strategies other than redact only support CSV input.")
+
+    if is_parquet(file_name, data[:4]):
+        output = io.BytesIO()
+        with metrics.stage("mask"):
+            mask_parquet(io.BytesIO(data), output, pii_fields)
+        logger.info("Obfuscation complete.")
+        return compress_output(output.getvalue(), output_compression)
+
+    if is_json(file_name):
+        with metrics.stage("mask"):
+            obfuscated_json = b"".join(iter_masked_json([data], file_name, pii_fields))
+        logger.info("Obfuscation complete.")
+        return compress_output(obfuscated_json, output_compression)
+
+    columns = len(header_columns(data)) if engine == AUTO_ENGINE else None
+    engine = choose_engine(engine, plan, len(data), columns)
+    metrics.set_property("engine", engine)
+    logger.info(f"Masking {file_name} with the {engine} engine.")
+
+    df = None
+    if engine == "pyarrow":
+        try:
+            with metrics.stage("parse"):
+                df = read_csv_frame(data, plan, engine)
+        except ValueError as e:
+            engine = fallback_engine(plan)
+            logger.warning(
+                f"The pyarrow engine could not parse {file_name}, so it is masked "
+                f"with the {engine} engine: {e}"
+            )
+            metrics.set_property("EngineFallback", engine)
+    if engines is not None:
+        engines.append(engine)
+
+    if engine in ("splice", "csv"):
+        mask = mask_csv_bytes if engine == "splice" else mask_csv_rows
+        with metrics.stage("mask"):
+            obfuscated_csv = mask(data, pii_fields)
+        logger.info("Obfuscation complete.")
+        return compress_output(obfuscated_csv, output_compression)
+
+    if df is None:
+        with metrics.stage("parse"):
+            df = read_csv_frame(data, plan, engine)
+    metrics.count("Rows", len(df))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"DataFrame before obfuscation:\n{df.head()}")
+    log_missing_fields(pii_fields, df.columns)
+    with metrics.stage("mask"):
+        mask_dataframe(df, plan, key)
+
+    with metrics.stage("serialise"):
+        obfuscated_csv = frame_to_csv(df, engine)
+    logger.info("Obfuscation complete.")
+    return compress_output(obfuscated_csv, output_compression)
+
+
+def iter_masked_dataframes(
+    csv_stream,
+    pii_fields,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    plan=None,
+    key=None,
+    engine="pandas",
+    engines=None,
+):
+    """
+    Parses a CSV stream into DataFrames in chunks and yields each chunk masked as
+    CSV bytes.
+
+    Parameters:
+    csv_stream (file-like): A binary stream of CSV data, such as an S3 response body.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    chunk_rows (int): The number of rows parsed and masked at a time by pandas.
+    plan (dict): The masking plan from prepare_masking. Every field is redacted if
+                 it is not given.
+    key (bytes): The HMAC key, required by the hmac strategy.
+    engine (str): "pandas" or "pyarrow", as for iter_csv_frames.
+    engines (list): If given, the engine that masked each chunk is appended to it,
+                    as chunks the Arrow reader rejects are masked with
+                    fallback_engine.
+
+    Yields:
+    bytes: The masked CSV data for each chunk; only the first includes the header.
+    """
+    plan = plan or build_masking_plan(pii_fields)
+    caches = {}
+    engines = [] if engines is None else engines
+    if engine == "pyarrow":
+        yield from _iter_masked_blocks(
+            csv_stream, pii_fields, plan, key, caches, engines
+        )
+        return
+    reader = iter_csv_frames(
+        csv_stream, plan, engine, chunk_rows, block_size=DEFAULT_CHUNK_BYTES
+    )
+    for chunk_number, df in enumerate(metrics.timed_iter("parse", reader)):
+        metrics.count("Rows", len(df))
+        if chunk_number == 0:
+            log_missing_fields(pii_fields, df.columns)
+        with metrics.stage("mask"):
+            mask_dataframe(df, plan, key, caches)
+        with metrics.stage("serialise"):
+            masked = frame_to_csv(df, engine, header=chunk_number == 0)
+        engines.append(engine)
+        yield masked
+
+
+def _iter_masked_blocks(csv_stream, pii_fields, plan, key, caches, engines):
+    """
+    Masks a CSV stream with the pyarrow engine, one block of whole records at a
+    time, masking each block the Arrow reader rejects with fallback_engine.
+    """
+    columns, stream = peek_header(csv_stream)
+    if not columns:
+        return
+    blocks = iter_record_blocks(stream, DEFAULT_CHUNK_BYTES)
+    for number, block in enumerate(blocks):
+        header = number == 0
+        try:
+            with metrics.stage("parse"):
+                df = read_arrow_block(block, columns, header)
+        except ValueError as e:
+            engines.append(fallback_engine(plan))
+            yield _mask_rejected_block(
+                block, columns, header, pii_fields, plan, key, caches, e
+            )
+            continue
+        metrics.count("Rows", len(df))
+        if header:
+            log_missing_fields(pii_fields, df.columns)
+        with metrics.stage("mask"):
+            mask_dataframe(df, plan, key, caches)
+        with metrics.stage("serialise"):
+            masked = frame_to_csv(df, "pyarrow", header)
+        engines.append("pyarrow")
+        yield masked
+
+
+def _mask_rejected_block(
+    block, columns, header, pii_fields, plan, key, caches, error
+):
+    engine = fallback_engine(plan)
+    logger.warning(
+        f"The pyarrow engine could not parse a block of {len(block)} bytes, so it "
+        f"is masked with the {engine} engine: {error}"
+    )
+    metrics.set_property("EngineFallback", engine)
+    if engine == "splice":
+        indexes = [
+            index for index, column in enumerate(columns) if column in pii_fields
+        ]
+        with metrics.stage("mask"):
+            return mask_csv_block(block, indexes, header=header)
+
+    import pandas as pd
+
+    with metrics.stage("parse"):
+        df = pd.read_csv(
+            io.BytesIO(block),
+            header=0 if header else None,
+            names=None if header else columns,
+            dtype=read_dtypes(plan),
+        )
+    metrics.count("Rows", len(df))
+    with metrics.stage("mask"):
+        mask_dataframe(df, plan, key, caches)
+    with metrics.stage("serialise"):
+        return frame_to_csv(df, "pandas", header)
+
+
+def iter_obfuscated(
+    stream,
+    file_name,
+    pii_fields,
+    plan,
+    key=None,
+    engine="pandas",
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    output_compression=None,
+    engines=None,
+):
+    """
+    Obfuscates a CSV, JSON or JSON Lines stream chunk by chunk.
+
+    Compressed input is decoded as it is read and compressed output is encoded as
+    each masked chunk is produced, so memory is bounded by the chunk size rather
+    than by the size of the file. CSVs are parsed in chunks of `chunk_rows` rows
+    by the pandas and csv engines, and read in blocks of DEFAULT_CHUNK_BYTES bytes
+    by the pyarrow and splice engines and for JSON.
+
+    Parameters:
+    stream (file-like): The binary input stream, such as an S3 response body.
+    file_name (str): The file's name or S3 key, used to detect its format.
+    pii_fields (list): The PII fields, as for mask_bytes.
+    plan (dict): The masking plan, from check_options.
+    key (bytes): The HMAC key, required by the hmac strategy.
+    engine (str): One of ENGINES, or "auto" to choose from the number of columns
+                  with choose_engine. JSON input ignores it.
+    chunk_rows (int): The number of rows parsed and masked at a time by the
+                      pandas and csv engines.
+    output_compression (str): "gzip", "bz2" or "zstd" to compress the output.
+    engines (list): If given, the engine that masked each chunk of a CSV is
+                    appended to it, as for iter_masked_dataframes.
+
+    Yields:
+    bytes: The obfuscated output, in order.
+
+    Raises:
+    ValueError: If a strategy other than redact is used for JSON input.
+    """
+    source, _ = open_decompressed(stream, file_name)
+    file_name = strip_compression_extension(file_name)
+
+    if is_json(file_name):
+        if not is_redact_only(plan):
+            raise ValueError(
+                "Masking strategies other than redact only support CSV input."
+            )
+        chunks = iter_read(source, DEFAULT_CHUNK_BYTES)
+        masked_chunks = metrics.timed_iter(
+            "mask", iter_masked_json(chunks, file_name, pii_fields)
+        )
+    else:
+        if engine == AUTO_ENGINE:
+            columns, source = peek_header(source)
+            engine = choose_engine(engine, plan, columns=len(columns))
+        metrics.set_property("engine", engine)
+        logger.info(f"Masking {file_name} with the {engine} engine.")
+        if engine in FRAME_ENGINES:
+            masked_chunks = iter_masked_dataframes(
+                source, pii_fields, chunk_rows, plan, key, engine, engines
+            )
+        else:
+            if engines is not None:
+                engines.append(engine)
+            chunks = iter_read(source, DEFAULT_CHUNK_BYTES)
+            if engine == "splice":
+                masked_chunks = iter_masked_csv(chunks, pii_fields)
+            else:
+                masked_chunks = iter_masked_rows(
+                    iter_text_lines(chunks), pii_fields, chunk_rows
+                )
+            masked_chunks = metrics.timed_iter("mask", masked_chunks)
+    yield from metrics.timed_iter(
+        "serialise", iter_compressed(masked_chunks, output_compression)
+    )
+
+
+def source_name(source):
+    """
+    Returns the file name of an obfuscate source, used to detect its format.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    name = getattr(source, "name", None)
+    return name if isinstance(name, str) else "data.csv"
+
+
+def obfuscate(
+    source,
+    pii_fields,
+    output=None,
+    file_name=None,
+    engine=None,
+    strategy="redact",
+    strategies=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    output_compression=None,
+):
+    """
+    Obfuscates PII fields of a CSV, JSON or Parquet file without touching S3.
+
+    Bytes are masked in memory, like obfuscate_pii does once it has downloaded a
+    file. A file path or a file-like object is streamed chunk by chunk with
+    iter_obfuscated, except Parquet, which is masked row group by row group from
+    a path and read into memory from any other source. An uncompressed CSV
+    spliced from one path to another is masked through a memory map with
+    mask_csv_file. The format and any compression are detected from `file_name`
+    and the file's magic bytes.
+
+    Parameters:
+    source (bytes, str, os.PathLike or file-like): The input: its contents, its
+                                                   path, or a binary stream.
+    pii_fields (list): A list of column names representing the PII fields to be
+                       obfuscated, or field paths for JSON.
+    output (str, os.PathLike or file-like): Where the output is written. If None,
+                                            the output is returned as bytes.
+    file_name (str): The name used to detect the input's format. Defaults to the
+                     path of the source or the name of its stream, and "data.csv"
+                     if it has neither.
+    engine (str): One of ENGINES, or "auto" or None to choose with choose_engine.
+    strategy (str or dict): The masking strategy of every PII field, as for
+                            obfuscate_pii.
+    strategies (dict): Per-field strategies, as for obfuscate_pii.
+    chunk_rows (int): The number of rows parsed and masked at a time when streaming
+                      with pandas.
+    output_compression (str): "gzip", "bz2" or "zstd" to compress the output.
+                              The output is uncompressed by default.
+
+    Returns:
+    bytes or int: The obfuscated file if `output` is None, and otherwise the
+                  number of bytes written to `output`.
+
+    Raises:
+    ValueError: If the settings are invalid or do not suit the input's format.
+    OSError: If the source cannot be read or the output written.
+    """
+    plan, key, output_compression = check_options(
+        pii_fields, engine, strategy, strategies, output_compression
+    )
+    file_name = file_name or source_name(source)
+
+    with ExitStack() as stack:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            chunks = [
+                mask_bytes(
+                    bytes(source),
+                    file_name,
+                    pii_fields,
+                    plan,
+                    key,
+                    engine,
+                    output_compression,
+                )
+            ]
+        else:
+            path = size = None
+            if isinstance(source, (str, os.PathLike)):
+                path, size = source, os.path.getsize(source)
+                source = stack.enter_context(open(path, "rb"))
+            head = source.read(HEAD_BYTES)
+            stream = PrefixedReader(head, source)
+            if is_parquet(strip_compression_extension(file_name), head):
+                if size is None or detect_compression(file_name, head):
+                    chunks = [
+                        mask_bytes(
+                            stream.read(),
+                            file_name,
+                            pii_fields,
+                            plan,
+                            key,
+                            engine,
+                            output_compression,
+                        )
+                    ]
+                else:
+                    chunks = [
+                        _mask_parquet_file(
+                            source, pii_fields, plan, output_compression
+                        )
+                    ]
+            else:
+                compression = detect_compression(file_name, head)
+                if not compression:
+                    columns = None
+                    if engine == AUTO_ENGINE and not is_json(file_name):
+                        header, stream = peek_header(stream)
+                        columns = len(header)
+                    engine = choose_engine(engine, plan, size, columns)
+                if (
+                    engine == "splice"
+                    and path is not None
+                    and isinstance(output, (str, os.PathLike))
+                    and not compression
+                    and output_compression is None
+                    and not is_json(file_name)
+                ):
+                    with metrics.stage("mask"):
+                        return mask_csv_file(path, output, pii_fields)
+                chunks = iter_obfuscated(
+                    stream,
+                    file_name,
+                    pii_fields,
+                    plan,
+                    key,
+                    engine or "pandas",
+                    chunk_rows,
+                    output_compression,
+                )
+
+        if output is None:
+            return b"".join(chunks)
+        if isinstance(output, (str, os.PathLike)):
+            output = stack.enter_context(open(output, "wb"))
+        bytes_written = 0
+        for chunk in chunks:
+            output.write(chunk)
+            bytes_written += len(chunk)
+        return bytes_written
+
+
+def _mask_parquet_file(source, pii_fields, plan, output_compression):
+    if not is_redact_only(plan):
+        raise ValueError("Masking strategies other than redact only support CSV input.")
+    source.seek(0)
+    output = io.BytesIO()
+    with metrics.stage("mask"):
+        mask_parquet(source, output, pii_fields)
+    logger.info("Obfuscation complete.")
+    return compress_output(output.getvalue(), output_compression)
+
+
+def find_input_files(path):
+    """
+    Lists the files to obfuscate under a file or directory path.
+
+    Directories are walked recursively, and hidden files and directories, whose
+    names start with ".", are left out.
+
+    Parameters:
+    path (str): A file or directory path.
+
+    Returns:
+    list: (local_file_path, name) tuples, where name is the path relative to the
+          directory, or the file's name if `path` is a file, in sorted order.
+
+    Raises:
+    FileNotFoundError: If the path does not exist.
+    """
+    if os.path.isfile(path):
+        return [(path, os.path.basename(path))]
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"The path {path} does not exist.")
+    found = []
+    for root, dirs, file_names in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+        for file_name in sorted(file_names):
+            if file_name.startswith("."):
+                continue
+            local_file_path = os.path.join(root, file_name)
+            found.append((local_file_path, os.path.relpath(local_file_path, path)))
+    return found
+
+
+def output_name(name, output_compression=None):
+    """
+    Names an output file after its input: the input's compression extension is
+    replaced by that of `output_compression`, as the handler does for S3 keys.
+
+    Parameters:
+    name (str): The input's path relative to the input directory.
+    output_compression (str): "gzip", "bz2" or "zstd", or None.
+
+    Returns:
+    str: The output's path relative to the output directory.
+    """
+    return strip_compression_extension(name) + OUTPUT_EXTENSIONS.get(
+        output_compression, ""
+    )
+
+
+def obfuscate_local_file(
+    input_path,
+    output_path,
+    pii_fields,
+    auto_detect=False,
+    sample_kb=DEFAULT_SAMPLE_KB,
+    **options,
+):
+    """
+    Obfuscates one local file into another and times it. It runs in the worker
+    processes of obfuscate_paths, so it reports errors rather than raising them.
+
+    Parameters:
+    input_path (str): The path to the input file.
+    output_path (str): The path the output is written to. Its directory is created
+                       if needed.
+    pii_fields (list): The PII fields to obfuscate.
+    auto_detect (bool): If True, the columns that detect_pii_columns finds in the
+                        first `sample_kb` KiB of a CSV file are obfuscated too.
+    sample_kb (int): The size of the sample read for detection, in KiB.
+    **options: The engine, strategy, strategies, chunk_rows and output_compression,
+               as for obfuscate.
+
+    Returns:
+    dict: The result, with the "input_path", "output_path", "bytes" read, "bytes_out",
+          "seconds", "status" and any "error" and "detected" columns.
+    """
+    result = {
+        "input_path": input_path,
+        "output_path": output_path,
+        "bytes": os.path.getsize(input_path),
+    }
+    started = time.perf_counter()
+    try:
+        if auto_detect:
+            name = strip_compression_extension(input_path)
+            if is_parquet(name) or is_json(name):
+                raise ValueError(
+                    "Automatic PII detection is only supported for CSV files."
+                )
+            detected = detect_pii_columns(
+                read_file_sample(input_path, int(sample_kb) * 1024)
+            )
+            result["detected"] = list(detected)
+            pii_fields = merge_pii_fields(pii_fields, detected)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        result["bytes_out"] = obfuscate(input_path, pii_fields, output_path, **options)
+        result["status"] = "succeeded"
+    except Exception as e:
+        result.update(status="failed", bytes_out=0, error=str(e))
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def obfuscate_paths(
+    input_path,
+    output_directory,
+    pii_fields,
+    processes=DEFAULT_PROCESSES,
+    **options,
+):
+    """
+    Obfuscates a local file or directory tree across a pool of processes.
+
+    Each file is masked by one worker process, so a tree of many files uses every
+    core, and nothing is sent over the network. The output tree mirrors the input
+    tree under `output_directory`.
+
+    Parameters:
+    input_path (str): A file or directory path.
+    output_directory (str): The directory the outputs are written to.
+    pii_fields (list): The PII fields to obfuscate.
+    processes (int): The number of worker processes. 1 obfuscates the files in
+                     this process.
+    **options: The auto_detect and sample_kb settings of obfuscate_local_file, and
+               the settings of obfuscate. output_compression defaults to the
+               compression of each input.
+
+    Returns:
+    dict: The report, with the result of each file from obfuscate_local_file in
+          "files", and the total input "bytes", wall-clock "seconds",
+          "throughput_mb_s" and number of "failed" files.
+    """
+    tasks = []
+    for local_file_path, name in find_input_files(input_path):
+        file_options = dict(options)
+        file_options.setdefault(
+            "output_compression", detect_compression(local_file_path)
+        )
+        output_path = os.path.join(
+            output_directory, output_name(name, file_options["output_compression"])
+        )
+        tasks.append((local_file_path, output_path, pii_fields, file_options))
+
+    started = time.perf_counter()
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(processes, len(tasks))) as executor:
+            futures = [
+                executor.submit(obfuscate_local_file, *task[:3], **task[3])
+                for task in tasks
+            ]
+            files = [future.result() for future in futures]
+    else:
+        files = [obfuscate_local_file(*task[:3], **task[3]) for task in tasks]
+    seconds = time.perf_counter() - started
+
+    processed = sum(
+        result["bytes"] for result in files if result["status"] == "succeeded"
+    )
+    return {
+        "files": files,
+        "bytes": processed,
+        "seconds": seconds,
+        "throughput_mb_s": processed / MB / seconds if seconds else 0.0,
+        "failed": sum(1 for result in files if result["status"] == "failed"),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Obfuscate PII in a local file or directory tree, without S3."
+    )
+    parser.add_argument("input", help="The file or directory to obfuscate.")
+    parser.add_argument("output", help="The directory the outputs are written to.")
+    parser.add_argument(
+        "--pii-fields",
+        nargs="*",
+        default=[],
+        help="The columns, or JSON field paths, to obfuscate.",
+    )
+    parser.add_argument(
+        "--auto-detect",
+        action="store_true",
+        help="Also obfuscate the PII columns detected in a sample of each CSV.",
+    )
+    parser.add_argument(
+        "--sample-kb",
+        type=int,
+        default=DEFAULT_SAMPLE_KB,
+        help=f"The KiB sampled for --auto-detect (default {DEFAULT_SAMPLE_KB}).",
+    )
+    parser.add_argument(
+        "--engine", choices=ENGINES + (AUTO_ENGINE,), help="The CSV engine."
+    )
+    parser.add_argument(
+        "--strategy",
+        default="redact",
+        help="The masking strategy of every field (default redact).",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help=f"The rows masked at a time by pandas (default {DEFAULT_CHUNK_ROWS}).",
+    )
+    parser.add_argument(
+        "--output-compression",
+        choices=tuple(OUTPUT_EXTENSIONS),
+        help="Compress every output (default: the compression of each input).",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=DEFAULT_PROCESSES,
+        help=f"The number of worker processes (default {DEFAULT_PROCESSES}).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.pii_fields and not args.auto_detect:
+        raise SystemExit("Give --pii-fields, --auto-detect or both.")
+
+    options = {
+        "engine": args.engine,
+        "strategy": args.strategy,
+        "chunk_rows": args.chunk_rows,
+        "auto_detect": args.auto_detect,
+        "sample_kb": args.sample_kb,
+    }
+    if args.output_compression:
+        options["output_compression"] = args.output_compression
+    try:
+        report = obfuscate_paths(
+            args.input, args.output, args.pii_fields, args.processes, **options
+        )
+    except FileNotFoundError as e:
+        raise SystemExit(f"Error: {e}")
+
+    for result in report["files"]:
+        if result["status"] == "succeeded":
+            print(
+                f"Success: {result['input_path']} obfuscated to "
+                f"{result['output_path']} "
+                f"({result['bytes'] / MB:.2f} MiB in {result['seconds']:.3f}s)"
+            )
+        else:
+            print(f"Error obfuscating {result['input_path']}: {result['error']}")
+    print(
+        f"Obfuscated {len(report['files']) - report['failed']} of "
+        f"{len(report['files'])} files, {report['bytes'] / MB:.2f} MiB in "
+        f"{report['seconds']:.3f}s ({report['throughput_mb_s']:.2f} MiB/s)"
+    )
+    if report["failed"] or not report["files"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
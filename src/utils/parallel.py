@@ -0,0 +1,291 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from src.utils.csv_engines import iter_record_blocks
+from src.utils.csv_splice import (
+    DEFAULT_BLOCK_BYTES,
+    DEFAULT_REPLACEMENT,
+    mask_csv_block,
+    resolve_pii_indexes,
+)
+from src.utils.s3_client import create_client
+from src.utils.s3_io import S3IO
+from src.utils.s3_multipart import MAX_PARTS, MIN_PART_SIZE
+
+logger = logging.getLogger()
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+ALIGN_PROBE_BYTES = 64 * 1024
+
+_worker_s3 = None
+
+
+def _get_worker_client():
+    """
+    Returns the S3 client of the current worker process, creating it on first use.
+    boto3 clients cannot be shared with child processes, so each one builds its own.
+    """
+    global _worker_s3
+    if _worker_s3 is None:
+        _worker_s3 = create_client("s3")
+    return _worker_s3
+
+
+def find_record_boundary(s3_client, bucket_name, key, offset, size):
+    """
+    Finds the start of the first record beginning at or after a byte offset.
+
+    Small ranged GETs are issued from `offset` until a newline is found.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for the requests.
+    bucket_name (str): The name of the S3 bucket where the CSV file is located.
+    key (str): The key of the CSV file.
+    offset (int): The byte offset to search from.
+    size (int): The size of the object in bytes.
+
+    Returns:
+    int: The offset just after the first newline at or after `offset`,
+         or `size` if there is none.
+    """
+    position = offset
+    while position < size:
+        end = min(position + ALIGN_PROBE_BYTES, size) - 1
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=key, Range=f"bytes={position}-{end}"
+        )
+        index = response["Body"].read().find(b"\n")
+        if index != -1:
+            return position + index + 1
+        position = end + 1
+    return size
+
+
+def plan_byte_ranges(s3_client, bucket_name, key, size, range_size):
+    """
+    Splits an object into byte ranges that each start at a record boundary.
+
+    The object is cut every `range_size` bytes, however many workers there are, so
+    the memory a range needs does not grow with the file. Each nominal split point
+    is then moved forward to the start of the next record; the split points are
+    found concurrently. Only an object too large for MAX_PARTS ranges of
+    `range_size` bytes is cut into larger ranges.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for the alignment requests.
+    bucket_name (str): The name of the S3 bucket where the CSV file is located.
+    key (str): The key of the CSV file.
+    size (int): The size of the object in bytes.
+    range_size (int): The largest size of a range in bytes, before it is extended
+                      to the end of its last record.
+
+    Returns:
+    list: (start, end) tuples with exclusive ends, covering the whole object in order.
+    """
+    step = max(range_size, -(-size // MAX_PARTS), 1)
+    found = S3IO(s3_client).map(
+        partial(find_record_boundary, s3_client, bucket_name, key, size=size),
+        [{"offset": offset} for offset in range(step, size, step)],
+    )
+    boundaries = [0]
+    for boundary in found:
+        if boundary > boundaries[-1] and boundary < size:
+            boundaries.append(boundary)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def mask_byte_range(task, s3_client=None):
+    """
+    Downloads one byte range of a CSV object, masks it and uploads it as a part.
+
+    This is the unit of work run in the worker pool. The range is read and masked
+    in record-aligned blocks, so only the masked part and one block of the input
+    are held in memory.
+
+    Parameters:
+    task (dict): The range to process, with the keys "bucket_name", "key", "start",
+                 "end", "part_number", "output_bucket_name", "output_key",
+                 "upload_id", "indexes", "replacement", "min_part_size", "last"
+                 and "block_size".
+    s3_client (botocore.client.S3): The S3 client to use. Worker processes leave
+                                    this unset and use their own client.
+
+    Returns:
+    dict: The part's "PartNumber" and "ETag", plus "BytesIn" and "BytesOut".
+
+    Raises:
+    ValueError: If the range ends inside a quoted field, or if a part other than
+                the last is smaller than the S3 minimum part size after masking.
+    """
+    s3_client = s3_client or _get_worker_client()
+    response = s3_client.get_object(
+        Bucket=task["bucket_name"],
+        Key=task["key"],
+        Range=f"bytes={task['start']}-{task['end'] - 1}",
+    )
+    masked = bytearray()
+    bytes_in = 0
+    header = task["part_number"] == 1
+    for block in iter_record_blocks(response["Body"], task["block_size"]):
+        bytes_in += len(block)
+        masked += mask_csv_block(
+            block, task["indexes"], task["replacement"], header=header
+        )
+        header = False
+    if not task["last"] and len(masked) < task["min_part_size"]:
+        raise ValueError(
+            f"Part {task['part_number']} is {len(masked)} bytes after masking, "
+            "below the S3 minimum part size; increase the range size."
+        )
+    response = s3_client.upload_part(
+        Bucket=task["output_bucket_name"],
+        Key=task["output_key"],
+        PartNumber=task["part_number"],
+        UploadId=task["upload_id"],
+        Body=masked,
+    )
+    return {
+        "PartNumber": task["part_number"],
+        "ETag": response["ETag"],
+        "BytesIn": bytes_in,
+        "BytesOut": len(masked),
+    }
+
+
+def _create_executor(workers, use_processes):
+    """
+    Creates the worker pool, falling back to threads where processes are unavailable
+    (for example on AWS Lambda, which has no /dev/shm for multiprocessing).
+    """
+    if use_processes:
+        try:
+            return ProcessPoolExecutor(max_workers=workers), True
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable, using threads instead: {e}")
+    return ThreadPoolExecutor(max_workers=workers), False
+
+
+def obfuscate_pii_parallel(
+    s3_client,
+    bucket_name,
+    s3_file_path,
+    pii_fields,
+    output_bucket_name,
+    output_key,
+    workers=DEFAULT_WORKERS,
+    range_size=DEFAULT_RANGE_SIZE,
+    use_processes=True,
+    replacement=DEFAULT_REPLACEMENT,
+    min_part_size=MIN_PART_SIZE,
+    block_size=DEFAULT_BLOCK_BYTES,
+):
+    """
+    Obfuscates PII fields in a CSV file by masking byte ranges of it concurrently.
+
+    The object is split into record-aligned byte ranges which are fetched with
+    ranged GETs, masked with the splice engine in a worker pool and uploaded as
+    numbered parts of one multipart upload. Because part numbers follow the range
+    order, the output is byte-identical to a sequential splice run. There are
+    usually many more ranges than workers, and peak memory depends on
+    `range_size` and `workers` rather than on the size of the file.
+
+    Fields containing embedded newlines are not supported if a range boundary
+    falls inside them; such a file fails with an error and should be processed in
+    stream mode instead.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used by the coordinator.
+    bucket_name (str): The name of the S3 bucket where the CSV file is located.
+    s3_file_path (str): The path to the CSV file within the specified S3 bucket.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    output_bucket_name (str): The name of the S3 bucket the obfuscated CSV is written to.
+    output_key (str): The key of the obfuscated CSV within the output bucket.
+    workers (int): The number of ranges processed at the same time.
+    range_size (int): The largest size of a byte range, before it is extended to
+                      the end of its last record.
+    use_processes (bool): Mask ranges in worker processes rather than threads.
+    replacement (str or bytes): The value written in place of each PII field.
+    min_part_size (int): The smallest part S3 accepts other than the last one.
+    block_size (int): The number of bytes of a range read and masked at a time.
+
+    Returns:
+    int: The number of bytes written to the output object.
+
+    Raises:
+    Exception: Any error from S3 or from masking a range; the multipart upload is
+               aborted before the error is re-raised.
+    """
+    size = s3_client.head_object(Bucket=bucket_name, Key=s3_file_path)[
+        "ContentLength"
+    ]
+    if size == 0:
+        s3_client.put_object(Bucket=output_bucket_name, Key=output_key, Body=b"")
+        return 0
+
+    header_end = find_record_boundary(s3_client, bucket_name, s3_file_path, 0, size)
+    header = s3_client.get_object(
+        Bucket=bucket_name, Key=s3_file_path, Range=f"bytes=0-{header_end - 1}"
+    )["Body"].read()
+    indexes = resolve_pii_indexes(header.rstrip(b"\n"), pii_fields)
+
+    byte_ranges = plan_byte_ranges(
+        s3_client, bucket_name, s3_file_path, size, range_size
+    )
+    logger.info(f"Processing {s3_file_path} as {len(byte_ranges)} byte ranges.")
+
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=output_bucket_name, Key=output_key
+    )["UploadId"]
+    tasks = [
+        {
+            "bucket_name": bucket_name,
+            "key": s3_file_path,
+            "start": start,
+            "end": end,
+            "part_number": part_number,
+            "output_bucket_name": output_bucket_name,
+            "output_key": output_key,
+            "upload_id": upload_id,
+            "indexes": indexes,
+            "replacement": replacement,
+            "min_part_size": min_part_size,
+            "last": part_number == len(byte_ranges),
+            "block_size": block_size,
+        }
+        for part_number, (start, end) in enumerate(byte_ranges, start=1)
+    ]
+
+    try:
+        executor, in_processes = _create_executor(workers, use_processes)
+        worker = mask_byte_range if in_processes else partial(
+            mask_byte_range, s3_client=s3_client
+        )
+        with executor:
+            results = list(executor.map(worker, tasks))
+
+        s3_client.complete_multipart_upload(
+            Bucket=output_bucket_name,
+            Key=output_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": result["PartNumber"], "ETag": result["ETag"]}
+                    for result in results
+                ]
+            },
+        )
+    except Exception:
+        # A failed abort is logged, so the error that failed the file is raised.
+        try:
+            s3_client.abort_multipart_upload(
+                Bucket=output_bucket_name, Key=output_key, UploadId=upload_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload: {e}")
+        raise
+
+    return sum(result["BytesOut"] for result in results)
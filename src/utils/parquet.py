@@ -0,0 +1,104 @@
+import logging
+import os
+
+logger = logging.getLogger()
+
+PARQUET_MAGIC = b"PAR1"
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+_WRITER_CODECS = {"UNCOMPRESSED": "none", "LZ4_RAW": "lz4"}
+
+
+def is_parquet(path, head=None):
+    """
+    Detects Parquet input from its file extension or its leading magic bytes.
+
+    Parameters:
+    path (str): The file name or S3 key of the input.
+    head (bytes): The first bytes of the input, if already available.
+
+    Returns:
+    bool: True if the input is a Parquet file.
+    """
+    if os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS:
+        return True
+    return head is not None and head[:4] == PARQUET_MAGIC
+
+
+def get_compression(parquet_file):
+    """
+    Reads the compression codec of each column from the first row group's metadata.
+
+    Parameters:
+    parquet_file (pyarrow.parquet.ParquetFile): The input file.
+
+    Returns:
+    dict or str: The codec of each column path, in the form ParquetWriter accepts,
+                 or "snappy" if the file has no row groups.
+    """
+    if parquet_file.num_row_groups == 0:
+        return "snappy"
+    row_group = parquet_file.metadata.row_group(0)
+    compression = {}
+    for index in range(row_group.num_columns):
+        column = row_group.column(index)
+        codec = column.compression.upper()
+        compression[column.path_in_schema] = _WRITER_CODECS.get(codec, codec.lower())
+    return compression
+
+
+def mask_parquet(source, sink, pii_fields, replacement="***"):
+    """
+    Obfuscates PII columns of a Parquet file one row group at a time.
+
+    Only the non-PII columns are read and decoded; each PII column is replaced
+    by a constant Arrow string array of the row group's length, so no pandas
+    DataFrame is built and memory is proportional to a single row group. The
+    output keeps the input's schema metadata, column order, row groups and
+    compression codecs. PII columns become string columns, as the replacement
+    value is a string.
+
+    Parameters:
+    source (str or file-like): The Parquet input. It must be seekable.
+    sink (str or file-like): Where the obfuscated Parquet file is written.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    replacement (str): The value written in place of each PII field.
+
+    Returns:
+    int: The number of rows written.
+    """
+    # pyarrow is imported here so that CSV-only callers never pay for loading it.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(source)
+    schema = parquet_file.schema_arrow
+
+    for pii_field in pii_fields:
+        if pii_field in schema.names:
+            logger.info(f"Obfuscating field: {pii_field}")
+        else:
+            logger.warning(f"Field '{pii_field}' not found in Parquet schema.")
+
+    output_schema = schema
+    for index, field in enumerate(schema):
+        if field.name in pii_fields:
+            output_schema = output_schema.set(index, pa.field(field.name, pa.string()))
+    kept_columns = [name for name in schema.names if name not in pii_fields]
+
+    rows = 0
+    with pq.ParquetWriter(
+        sink, output_schema, compression=get_compression(parquet_file)
+    ) as writer:
+        for row_group in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(row_group, columns=kept_columns)
+            size = parquet_file.metadata.row_group(row_group).num_rows
+            masked = pa.repeat(replacement, size)
+            columns = [
+                masked if name in pii_fields else table.column(name)
+                for name in output_schema.names
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=output_schema))
+            rows += size
+
+    return rows
@@ -0,0 +1,237 @@
+import csv
+import io
+import logging
+import re
+
+from src.utils.compression import decompress_prefix, detect_compression
+
+logger = logging.getLogger()
+
+DEFAULT_SAMPLE_KB = 64
+DEFAULT_THRESHOLD = 0.8
+
+# Each detector is a pattern every value of a PII column should match, run over
+# the whole column with Arrow's RE2 engine, and optionally a pattern its header
+# must match. Values alone cannot tell a date of birth from any other date, or
+# a person's name from a town's, so those detectors also look at the header.
+DETECTORS = {
+    "email": (
+        r"^[A-Za-z0-9._%+\-]+@[A-Za-z0-9\-]+(\.[A-Za-z0-9\-]+)*\.[A-Za-z]{2,}$",
+        None,
+    ),
+    "phone": (
+        r"^(\+\d{1,3}[ .\-]?|0)\d{2,4}[ .\-]?\d{3,4}[ .\-]?\d{3,4}$"
+        r"|^\(\d{3}\) ?\d{3}[ .\-]\d{4}$|^\d{3}[.\-]\d{3}[.\-]\d{4}$",
+        None,
+    ),
+    "national_id": (
+        # UK National Insurance numbers and US Social Security numbers.
+        r"^[A-CEGHJ-PR-TW-Z]{2} ?\d{2} ?\d{2} ?\d{2} ?[A-D]$|^\d{3}-\d{2}-\d{4}$",
+        None,
+    ),
+    "date_of_birth": (
+        r"^\d{4}[\-/.]\d{1,2}[\-/.]\d{1,2}$|^\d{1,2}[\-/.]\d{1,2}[\-/.]\d{4}$",
+        re.compile(r"dob|birth|born", re.IGNORECASE),
+    ),
+    "name": (
+        r"^[A-Z][A-Za-z'\-]+( [A-Z][A-Za-z'\-.]*)*$",
+        re.compile(
+            r"^(?!.*(file|user|company|product|host|bucket|domain|course|town|city))"
+            r".*name",
+            re.IGNORECASE,
+        ),
+    ),
+}
+
+
+def read_sample(s3_client, bucket_name, key, sample_bytes):
+    """
+    Downloads the first complete lines of a CSV object with one ranged GET.
+
+    Compressed objects are decompressed as far as the downloaded range allows.
+    The range is counted in compressed bytes, so their sample holds more rows.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for the request.
+    bucket_name (str): The name of the S3 bucket holding the object.
+    key (str): The key of the object.
+    sample_bytes (int): The number of bytes to download.
+
+    Returns:
+    bytes: The start of the CSV, ending at the last complete line.
+    """
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=key, Range=f"bytes=0-{sample_bytes - 1}"
+        )
+    except Exception as e:
+        # S3 rejects any range of an empty object.
+        if getattr(e, "response", {}).get("Error", {}).get("Code") == "InvalidRange":
+            return b""
+        raise
+    return complete_lines(response["Body"].read(), key, sample_bytes)
+
+
+def read_file_sample(path, sample_bytes):
+    """
+    Reads the first complete lines of a local CSV file, as read_sample does for
+    an S3 object.
+
+    Parameters:
+    path (str): The path to the file.
+    sample_bytes (int): The number of bytes to read.
+
+    Returns:
+    bytes: The start of the CSV, ending at the last complete line.
+    """
+    with open(path, "rb") as f:
+        return complete_lines(f.read(sample_bytes), path, sample_bytes)
+
+
+def complete_lines(data, path, sample_bytes):
+    """
+    Decompresses the start of a file and trims it to its last complete line.
+
+    Parameters:
+    data (bytes): Up to `sample_bytes` bytes from the start of the file.
+    path (str): The file name or S3 key, used to detect compression.
+    sample_bytes (int): The number of bytes requested. A shorter read holds the
+                        whole file, so its last line is kept.
+
+    Returns:
+    bytes: The decompressed sample, ending at the last complete line.
+    """
+    complete = len(data) < sample_bytes
+    compression = detect_compression(path, data)
+    if compression:
+        data = decompress_prefix(data, compression)
+    if not complete:
+        data = data[: data.rfind(b"\n") + 1]
+    return data
+
+
+def _sample_table(sample, columns):
+    """
+    Parses a CSV sample into an Arrow table of text columns, with empty fields
+    as nulls.
+
+    A sample the Arrow reader rejects, such as one whose last record was cut
+    inside a quoted field, is parsed with the csv module instead, so detection
+    never silently finds nothing in a file that masking would read.
+
+    Raises:
+    ValueError: If the csv module cannot parse the sample either.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    try:
+        return pv.read_csv(
+            io.BytesIO(sample),
+            parse_options=pv.ParseOptions(newlines_in_values=True),
+            convert_options=pv.ConvertOptions(
+                column_types={column: pa.string() for column in columns},
+                strings_can_be_null=True,
+            ),
+        )
+    except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+        logger.warning(f"Parsing the PII detection sample with the csv module: {e}")
+
+    text = sample.decode("utf-8-sig", errors="replace")
+    values = [[] for _ in columns]
+    try:
+        rows = csv.reader(io.StringIO(text, newline=""))
+        next(rows, None)
+        for row in rows:
+            for index, column_values in enumerate(values):
+                value = row[index] if index < len(row) else ""
+                column_values.append(value or None)
+    except csv.Error as e:
+        raise ValueError(f"Could not parse the sample for PII detection: {e}")
+    return pa.Table.from_arrays(
+        [pa.array(column_values, pa.string()) for column_values in values],
+        names=columns,
+    )
+
+
+def detect_pii_columns(sample, threshold=DEFAULT_THRESHOLD):
+    """
+    Classifies the columns of a CSV sample with the DETECTORS.
+
+    Every column is read as text and each detector's pattern is matched against
+    all of its values at once with Arrow compute, so the cost depends on the size
+    of the sample, not on the file's.
+
+    Parameters:
+    sample (bytes): The start of a CSV file, header included, ending at a complete line.
+    threshold (float): The fraction of a column's non-empty values that must
+                       match a detector.
+
+    Returns:
+    dict: The kind of PII detected in each column, such as "email", keyed by
+          column name, in the order of the columns.
+    """
+    import pyarrow.compute as pc
+
+    header_line = sample.split(b"\n", 1)[0].decode("utf-8", errors="replace")
+    columns = next(csv.reader([header_line]), [])
+    if not columns:
+        return {}
+    table = _sample_table(sample, columns)
+
+    detected = {}
+    for column in table.column_names:
+        values = pc.drop_null(table[column])
+        values = pc.utf8_trim_whitespace(values)
+        values = pc.filter(values, pc.not_equal(values, ""))
+        if len(values) == 0:
+            continue
+        for kind, (pattern, header_pattern) in DETECTORS.items():
+            if header_pattern is not None and not header_pattern.search(column):
+                continue
+            matches = pc.match_substring_regex(values, pattern)
+            if pc.sum(matches).as_py() / len(values) >= threshold:
+                detected[column] = kind
+                break
+    return detected
+
+
+def detect_pii_fields(
+    s3_client,
+    bucket_name,
+    key,
+    sample_kb=DEFAULT_SAMPLE_KB,
+    threshold=DEFAULT_THRESHOLD,
+):
+    """
+    Detects the PII columns of a CSV object from a sample of its first rows.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for the request.
+    bucket_name (str): The name of the S3 bucket holding the object.
+    key (str): The key of the object.
+    sample_kb (int): The number of KiB downloaded from the start of the object.
+    threshold (float): As for detect_pii_columns.
+
+    Returns:
+    dict: The kind of PII detected in each column, keyed by column name.
+    """
+    sample = read_sample(s3_client, bucket_name, key, int(sample_kb) * 1024)
+    return detect_pii_columns(sample, threshold)
+
+
+def merge_pii_fields(pii_fields, detected):
+    """
+    Adds detected PII columns to the explicitly listed fields.
+
+    Parameters:
+    pii_fields (list): The PII fields listed in the invocation JSON.
+    detected (dict): The detected columns, from detect_pii_fields.
+
+    Returns:
+    list: The listed fields in their order, followed by the detected columns
+          that were not listed.
+    """
+    return list(pii_fields) + [
+        column for column in detected if column not in pii_fields
+    ]
@@ -0,0 +1,156 @@
+import io
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from src.utils import metrics
+
+logger = logging.getLogger()
+
+DEFAULT_PREFETCH_BLOCKS = 4
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_UPLOAD_CONCURRENCY = 4
+PUT_TIMEOUT = 0.1
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Read-only file object that downloads a stream ahead of its reader on a
+    background thread.
+
+    The thread reads blocks of `block_size` bytes into a queue of at most
+    `blocks` blocks while the reader masks the ones already downloaded, so the
+    network and the CPU are busy at the same time. A full queue blocks the
+    thread until the reader catches up, which keeps memory bounded at about
+    `blocks * block_size` bytes whatever the size of the stream.
+
+    The time the reader spends waiting for a block is charged to the download
+    stage, so the stage only records the download time that masking could not
+    hide. Errors raised by the stream are re-raised by the read that reaches them.
+
+    The stream is read by a thread of its own rather than on the shared S3 pool,
+    as it runs for as long as the stream does.
+
+    Parameters:
+    stream (file-like): The stream to read, such as an S3 response body.
+    blocks (int): The number of blocks downloaded ahead of the reader.
+    block_size (int): The size in bytes of each block.
+    """
+
+    def __init__(
+        self, stream, blocks=DEFAULT_PREFETCH_BLOCKS, block_size=DEFAULT_BLOCK_SIZE
+    ):
+        super().__init__()
+        if blocks < 1:
+            raise ValueError("blocks must be at least 1.")
+        self._queue = queue.Queue(maxsize=blocks)
+        self._stop = threading.Event()
+        self._block = b""
+        self._offset = 0
+        self._eof = False
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._fill,
+            args=(stream, block_size),
+            name="prefetch",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def _fill(self, stream, block_size):
+        try:
+            while not self._stop.is_set():
+                block = stream.read(block_size)
+                metrics.count("BytesIn", len(block))
+                self._put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def _take(self, block):
+        if isinstance(block, Exception):
+            self._error, block = block, b""
+        if not block:
+            self._eof = True
+        self._block, self._offset = block, 0
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(DEFAULT_BLOCK_SIZE), b""))
+        if size == 0:
+            return b""
+        if self._offset == len(self._block) and not self._eof:
+            with metrics.stage("download"):
+                self._take(self._queue.get())
+
+        # Blocks already downloaded are added without waiting, so a large read
+        # returns as much as is available rather than a single block.
+        parts = []
+        wanted = size
+        while wanted:
+            if self._offset == len(self._block):
+                if self._eof:
+                    break
+                try:
+                    self._take(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                continue
+            part = self._block[self._offset : self._offset + wanted]
+            self._offset += len(part)
+            wanted -= len(part)
+            parts.append(part)
+        if not parts and self._error is not None:
+            raise self._error
+        return b"".join(parts)
+
+    def close(self):
+        """
+        Stops the background thread and discards the blocks it has downloaded.
+        """
+        if self.closed:
+            return
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+        super().close()
+
+
+@contextmanager
+def pipelined_source(stream, prefetch_blocks=DEFAULT_PREFETCH_BLOCKS):
+    """
+    Opens a downloaded stream as the first stage of a pipeline.
+
+    Parameters:
+    stream (file-like): The stream to read, such as an S3 response body.
+    prefetch_blocks (int): The number of blocks downloaded ahead by a
+                           PrefetchReader. 0 reads the stream in the caller's
+                           thread, timing each read as part of the download stage.
+
+    Yields:
+    file-like: The stream to read.
+    """
+    if prefetch_blocks < 1:
+        yield metrics.timed_stream(stream)
+        return
+    with PrefetchReader(stream, prefetch_blocks) as reader:
+        yield reader
@@ -1,42 +1,76 @@
+import csv
 import json
-import boto3
-import pandas as pd
-import io
 import logging
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, unquote_plus
+
+from src.utils.idempotency import (
+    config_hash,
+    find_output,
+    index_key,
+    invocation_index_key,
+    normalise_etag,
+    record_output,
+)
+from src.utils.json_stream import is_json
+from src.utils.obfuscator import (
+    AUTO_ENGINE,
+    AUTO_SPLICE_MAX_BYTES,
+    DEFAULT_CHUNK_ROWS,
+    ENGINES,
+    check_options,
+    choose_engine,
+    iter_obfuscated,
+    mask_bytes,
+)
+from src.utils.parallel import DEFAULT_WORKERS, obfuscate_pii_parallel
+from src.utils.pipeline import (
+    DEFAULT_PREFETCH_BLOCKS,
+    DEFAULT_UPLOAD_CONCURRENCY,
+    pipelined_source,
+)
+from src.utils.parquet import is_parquet, mask_parquet
+from src.utils.pii_detect import (
+    DEFAULT_SAMPLE_KB,
+    detect_pii_fields,
+    merge_pii_fields,
+    read_sample,
+)
+from src.utils import metrics
+from src.utils.csv_engines import header_columns
+from src.utils.csv_splice import HEADER_PROBE_BYTES
+from src.utils.compression import (
+    OUTPUT_EXTENSIONS,
+    detect_compression,
+    resolve_compression,
+    strip_compression_extension,
+)
+from src.utils.masking import build_masking_plan, is_redact_only
+from src.utils.s3_multipart import S3MultipartWriter
+from src.utils.s3_client import LazyClient
+from src.utils.s3_io import S3IO, is_not_found, max_concurrency
+from src.utils.s3_range_reader import S3RangeReader
+from src.utils.tf_state import (
+    get_bucket_names_from_tf_state,
+    tf_state_bucket,
+    tf_state_key,
+)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3 = boto3.client("s3")
-
-tf_state_bucket = "tf-state-gdpr-obfuscator-test"
-tf_state_key = "tf-state"
-
-
-def get_bucket_names_from_tf_state(bucket_name, object_key):
-    """
-    Retrieves the names of the input, processed, and invocation buckets from a Terraform state file.
-
-    Parameters:
-    bucket_name (str): The name of the S3 bucket where the Terraform state file is located.
-    object_key (str): The key of the Terraform state file within the specified bucket.
-
-    Returns:
-    tuple: A tuple containing the names of the input, processed, and invocation buckets.
-           If an error occurs during retrieval, returns (None, None, None).
-    """
-    try:
-        response = s3.get_object(Bucket=bucket_name, Key=object_key)
-        data = json.loads(response["Body"].read().decode("utf-8"))
-        input_bucket_name = data["outputs"]["gdpr_input_bucket"]["value"]
-        processed_bucket_name = data["outputs"]["gdpr_processed_bucket"]["value"]
-        invocation_bucket_name = data["outputs"]["gdpr_invocation_bucket"]["value"]
+# pandas, pyarrow and boto3 are only imported when first needed, which keeps
+# cold starts short for small files that never touch pandas.
+s3 = LazyClient("s3")
 
-        return input_bucket_name, processed_bucket_name, invocation_bucket_name
-    except Exception as e:
-        logger.error(f"Failed to retrieve bucket names: {e}")
-        return None, None, None
+MAX_RECORD_WORKERS = 8
+MAX_FILE_WORKERS = 8
+FILE_LIST_KEYS = ("s3_file_paths", "s3_prefix", "manifest")
+REPORT_PREFIX = "reports/"
+DELETE_BATCH_SIZE = 1000
 
 
 def get_keys_from_bucket(bucket_name):
@@ -65,141 +99,1287 @@ def get_keys_from_bucket(bucket_name):
     return json_key
 
 
-def obfuscate_pii(bucket_name, s3_file_path, pii_fields):
+def obfuscate_pii(
+    bucket_name,
+    s3_file_path,
+    pii_fields,
+    engine="pandas",
+    strategy="redact",
+    strategies=None,
+    output_compression=None,
+    engines=None,
+):
     """
     Parameters:
     bucket_name (str): The name of the S3 bucket where the CSV file is located.
     s3_file_path (str): The path to the CSV file within the specified S3 bucket.
     pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    engine (str): "pandas" parses the CSV into a DataFrame with the pandas C parser;
+                  "pyarrow" parses it with Arrow, reading every value as text;
+                  "csv" masks it row by row with the standard library csv module;
+                  "splice" replaces the PII fields in the raw bytes and copies
+                  every other byte unchanged. "auto" chooses by size and column
+                  count with src.utils.obfuscator.choose_engine. None uses
+                  "splice", which needs nothing beyond the standard library, for
+                  CSVs of up to FAST_PATH_MAX_BYTES that are only redacted, and
+                  "pandas" otherwise.
+    strategy (str or dict): The masking strategy of every PII field, "redact" ("***")
+                            by default. See src.utils.masking for the others, such
+                            as "hmac" pseudonyms or "email_domain". Strategies other
+                            than "redact" need the pandas or pyarrow engine and
+                            CSV input.
+    strategies (dict): Per-field strategies that override `strategy`, keyed by column name.
+    output_compression (str): "gzip", "bz2" or "zstd" to compress the output.
+                              The output is uncompressed by default.
+    engines (list): If given, the engine that masked the CSV is appended to it, as
+                    for src.utils.obfuscator.mask_bytes.
+
+    Input compressed with gzip, bz2 or zstd, detected from the file extension or
+    the file's magic bytes, is decompressed in memory before it is masked; the
+    streaming functions decompress it chunk by chunk instead.
+    Parquet input, detected from the ".parquet" extension or the file's magic bytes,
+    is obfuscated with Arrow instead and returned as Parquet bytes. JSON and JSON Lines
+    input, detected from the ".json", ".jsonl" or ".ndjson" extension, takes dotted
+    or JSONPath-style field paths such as "user.contact.email".
+    The file is masked by src.utils.obfuscator.mask_bytes once it is downloaded;
+    src.utils.obfuscator.obfuscate does the same for local input.
 
     Returns:
     bytes: The obfuscated CSV data as bytes. If an error occurs during processing, returns None.
     """
     try:
-        response = s3.get_object(Bucket=bucket_name, Key=s3_file_path)
-        csv_data = response["Body"].read()
-
-        df = pd.read_csv(io.BytesIO(csv_data))
-        logger.info(f"DataFrame before obfuscation:\n{df.head()}")
-        for pii_field in pii_fields:
-            if pii_field in df.columns:
-                logger.info(f"Obfuscating field: {pii_field}")
-                df[pii_field] = "***"
-            else:
-                logger.warning(f"Field '{pii_field}' not found in DataFrame columns.")
-
-        obfuscated_csv = df.to_csv(index=False)
-        logger.info("Obfuscation complete.")
-        return obfuscated_csv.encode("utf-8")
+        plan, key, output_compression = check_options(
+            pii_fields, engine, strategy, strategies, output_compression
+        )
+
+        with metrics.stage("download"):
+            response = s3.get_object(Bucket=bucket_name, Key=s3_file_path)
+            csv_data = response["Body"].read()
+        metrics.count("BytesIn", len(csv_data))
+
+        return mask_bytes(
+            csv_data,
+            s3_file_path,
+            pii_fields,
+            plan,
+            key,
+            engine,
+            output_compression,
+            engines,
+        )
 
     except Exception as e:
         logger.error(f"Failed to process file: {e}")
         return None
 
 
-def handler(event, context):
+def obfuscate_pii_stream(
+    bucket_name,
+    s3_file_path,
+    pii_fields,
+    output_bucket_name,
+    output_key,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    engine="pandas",
+    strategy="redact",
+    strategies=None,
+    output_compression=None,
+    prefetch_blocks=DEFAULT_PREFETCH_BLOCKS,
+    upload_concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+    engines=None,
+):
     """
-    AWS Lambda function handler for processing PII data obfuscation.
+    Obfuscates PII fields in a CSV file without holding the whole file in memory.
+
+    With the pandas and csv engines the S3 response body is parsed in chunks of
+    `chunk_rows` rows; with the pyarrow and splice engines it is read in blocks of
+    DEFAULT_CHUNK_BYTES bytes.
+    Each chunk is masked on its own and the output is streamed to the destination
+    object through a multipart upload. Peak memory is bounded by the chunk size
+    rather than by the size of the file.
 
-    This function retrieves the names of the input, processed, and invocation 
-    buckets from a Terraform state file, retrieves the key of the first 
-    JSON file found in the invocation bucket, reads the JSON content, and processes
-    the CSV file located in the specified input bucket. The PII fields 
-    specified in the JSON content are obfuscated, and the obfuscated CSV 
-    file is uploaded to the processed bucket. The input and invocation buckets are then emptied.
+    Compressed input is decoded as it is read, and compressed output is encoded as
+    each masked chunk is produced, so neither is ever inflated as a whole.
+
+    Downloading, masking and uploading run as a pipeline. A PrefetchReader
+    downloads the next blocks while the current chunk is masked, and up to
+    `upload_concurrency` parts upload while the next ones are produced. Wall-clock
+    time therefore approaches that of the slowest stage rather than their sum.
+    The bounded queues between the stages keep memory bounded.
 
     Parameters:
-    event (dict): The event data passed to the Lambda function.
-    context (LambdaContext): The runtime information provided by AWS Lambda.
+    bucket_name (str): The name of the S3 bucket where the CSV file is located.
+    s3_file_path (str): The path to the CSV file within the specified S3 bucket.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    output_bucket_name (str): The name of the S3 bucket the obfuscated CSV is written to.
+    output_key (str): The key of the obfuscated CSV within the output bucket.
+    chunk_rows (int): The number of rows parsed and masked at a time by the pandas
+                      and csv engines.
+    engine (str): One of ENGINES or "auto", as for obfuscate_pii. "auto" chooses
+                  from the number of columns, as the size of the decompressed
+                  input is not known.
+    strategy (str or dict): The default masking strategy, as for obfuscate_pii.
+    strategies (dict): Per-field strategies, as for obfuscate_pii. Pseudonyms are
+                       cached across chunks, so each distinct value is hashed once.
+    output_compression (str): "gzip", "bz2" or "zstd" to compress the output.
+    prefetch_blocks (int): The blocks of the input downloaded ahead of masking, or
+                           0 to download each block only when it is needed.
+    upload_concurrency (int): The parts of the output uploaded at the same time.
+    engines (list): If given, the engine that masked each chunk of the CSV is
+                    appended to it, as for src.utils.obfuscator.iter_obfuscated.
 
     Returns:
-    dict: A dictionary containing the HTTP status code and body of the response.
+    int: The number of bytes written to the output object.
+         If an error occurs during processing, returns None.
     """
-    input_bucket_name, processed_bucket_name, invocation_bucket_name = (
-        get_bucket_names_from_tf_state(tf_state_bucket, tf_state_key)
-    )
-
     try:
-        json_file_path = get_keys_from_bucket(invocation_bucket_name)
-        if not json_file_path:
-            raise ValueError("No JSON file found in the invocation bucket.")
+        if engine not in ENGINES + (AUTO_ENGINE,):
+            raise ValueError(f"Unknown engine: {engine}")
+        plan, key, output_compression = check_options(
+            pii_fields, engine, strategy, strategies, output_compression
+        )
+
+        with metrics.stage("download"):
+            response = s3.get_object(Bucket=bucket_name, Key=s3_file_path)
+        with pipelined_source(response["Body"], prefetch_blocks) as source:
+            masked_chunks = iter_obfuscated(
+                source,
+                s3_file_path,
+                pii_fields,
+                plan,
+                key,
+                engine,
+                chunk_rows,
+                output_compression,
+                engines,
+            )
+            writer = write_pipelined(
+                masked_chunks, output_bucket_name, output_key, upload_concurrency
+            )
+        metrics.count("BytesOut", writer.bytes_written)
+
+        logger.info(
+            f"Streaming obfuscation complete: {writer.bytes_written} bytes written "
+            f"to {output_bucket_name}/{output_key}."
+        )
+        return writer.bytes_written
+
     except Exception as e:
-        logger.error(f"Error retrieving JSON file from bucket: {e}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps("Error retrieving JSON file from invocation bucket."),
-        }
+        logger.error(f"Failed to process file: {e}")
+        return None
 
+
+def write_pipelined(chunks, output_bucket_name, output_key, upload_concurrency):
+    """
+    Uploads a stream of output chunks as the last stage of a pipeline.
+
+    Stages timed while the chunks are produced are subtracted from the upload
+    stage, so it is only charged for the writes, the waits for a free part slot
+    and the completion of the upload.
+
+    Parameters:
+    chunks (iterable): The output, in order.
+    output_bucket_name (str): The name of the S3 bucket the output is written to.
+    output_key (str): The key of the output within the bucket.
+    upload_concurrency (int): The parts uploaded at the same time.
+
+    Returns:
+    S3MultipartWriter: The closed writer.
+    """
+    with metrics.stage("upload"):
+        with S3MultipartWriter(
+            s3, output_bucket_name, output_key, max_in_flight=upload_concurrency
+        ) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    return writer
+
+
+def get_invocation_records(event):
+    """
+    Extracts the location of every uploaded invocation JSON file from an S3 event.
+
+    Parameters:
+    event (dict): The event data passed to the Lambda function.
+
+    Returns:
+    list: (bucket_name, key) tuples, one per ".json" object in the event's records.
+          Returns an empty list for events without S3 records, such as manual invocations.
+    """
+    records = []
+    for record in (event or {}).get("Records", []):
+        s3_record = record.get("s3")
+        if not s3_record:
+            continue
+        key = unquote_plus(s3_record["object"]["key"])
+        if key.endswith(".json"):
+            records.append((s3_record["bucket"]["name"], key))
+    return records
+
+
+def get_record_etags(event):
+    """
+    Extracts the ETag of every object named in an S3 event's records.
+
+    Parameters:
+    event (dict): The event data passed to the Lambda function.
+
+    Returns:
+    dict: The ETag of each object, keyed by (bucket_name, key).
+    """
+    etags = {}
+    for record in (event or {}).get("Records", []):
+        s3_record = record.get("s3")
+        if s3_record and s3_record["object"].get("eTag"):
+            key = unquote_plus(s3_record["object"]["key"])
+            etags[(s3_record["bucket"]["name"], key)] = s3_record["object"]["eTag"]
+    return etags
+
+
+def process_invocation(
+    invocation_bucket_name, json_file_path, processed_bucket_name, etag=None
+):
+    """
+    Reads one invocation JSON file and obfuscates the CSV file it points to.
+
+    The PII fields specified in the JSON content are obfuscated, and the obfuscated
+    CSV file is uploaded to the processed bucket.
+
+    Instead of a single "s3_file_path", the JSON content may name many files with
+    "s3_file_paths", a list of keys, "s3_prefix", every object under a prefix of
+    the input bucket, or "manifest", a file listing them. They are processed as
+    one job; see process_files.
+
+    Setting "mode" to "stream" in the JSON content processes the CSV in chunks and
+    writes the output with a multipart upload, so large files do not have to fit in memory.
+    Setting "engine" to "splice" masks the raw CSV bytes instead of using pandas,
+    "pyarrow" parses the CSV with Arrow as text and "csv" with the standard
+    library csv module. "auto" chooses by the file's size and column count.
+    Without an "engine", small CSVs in memory mode are masked with "splice" and
+    never load pandas.
+    Setting "strategy" to "hmac" replaces PII fields with keyed pseudonyms instead
+    of "***", and "strategies" sets the strategy of individual fields. Strategies
+    other than "redact" are supported in the memory and stream modes with the
+    pandas and pyarrow engines.
+    Setting "mode" to "parallel" masks record-aligned byte ranges of the CSV in a
+    worker pool with the splice engine and uploads each range as a multipart part.
+    Files with a ".parquet" extension are always processed one row group at a time,
+    and ".json", ".jsonl" and ".ndjson" files are always streamed record by record.
+    Files with a ".gz", ".bz2" or ".zst" extension are decompressed as they are
+    streamed, in stream mode unless the mode is "json". By default the output is
+    compressed the same way as the input; "output_compression" may be set to
+    "gzip", "bz2", "zstd" or "none" instead, and the output key's extension follows it.
+
+    Parameters:
+    invocation_bucket_name (str): The name of the S3 bucket holding the JSON file.
+    json_file_path (str): The key of the JSON file within the invocation bucket.
+    processed_bucket_name (str): The name of the S3 bucket the obfuscated CSV is written to.
+    etag (str): The ETag of the JSON file from the S3 event. A replayed event whose
+                JSON file has already been processed and deleted is then
+                recognised from the index and succeeds without doing anything.
+
+    Returns:
+    tuple: A dictionary containing the HTTP status code and body of the response, and
+           a list of the (bucket_name, key) pairs of the JSON and CSV files the
+           invocation consumed. The list is empty unless every file succeeded.
+           The response of a single file also names the CSV "engine" it was
+           masked with; that of a job counts the files of each engine.
+    """
     try:
         response = s3.get_object(Bucket=invocation_bucket_name, Key=json_file_path)
         json_content = json.loads(response["Body"].read().decode("utf-8"))
+        etag = response.get("ETag") or etag
     except Exception as e:
+        if etag and processed_bucket_name and is_not_found(e):
+            entry_key = invocation_index_key(
+                invocation_bucket_name, json_file_path, etag
+            )
+            if find_output(s3, processed_bucket_name, entry_key):
+                logger.info(
+                    f"Invocation {invocation_bucket_name}/{json_file_path} "
+                    "was already processed."
+                )
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps("Invocation already processed."),
+                }, []
         logger.error(f"Error reading JSON file: {e}")
-        return {"statusCode": 500, "body": json.dumps("Error reading JSON file.")}
+        return {"statusCode": 500, "body": json.dumps("Error reading JSON file.")}, []
 
     try:
         input_bucket = json_content.get("bucket_name")
         csv_file_path = json_content.get("s3_file_path")
         pii_fields = json_content.get("pii_fields", [])
+        is_job = any(name in json_content for name in FILE_LIST_KEYS)
 
         logger.info(f"CSV file path: {csv_file_path}, PII fields: {pii_fields}")
 
-        if not input_bucket or not csv_file_path:
+        if not input_bucket or not (csv_file_path or is_job):
             raise ValueError(
                 "Bucket name or CSV file path not found in the JSON content."
             )
+        # Validated once here rather than for each file of a job.
+        build_masking_plan(
+            pii_fields,
+            json_content.get("strategy", "redact"),
+            json_content.get("strategies"),
+        )
 
-        obfuscated_csv_data = obfuscate_pii(input_bucket, csv_file_path, pii_fields)
+        if not processed_bucket_name:
+            logger.error("Processed bucket name not found in JSON.")
+            return {
+                "statusCode": 400,
+                "body": json.dumps("Processed bucket name not found."),
+            }, []
 
-        if obfuscated_csv_data:
-            if processed_bucket_name:
-                obfuscated_file_path = f"processed/{os.path.basename(csv_file_path)}"
-                s3.put_object(
-                    Bucket=processed_bucket_name,
-                    Key=obfuscated_file_path,
-                    Body=obfuscated_csv_data,
+        if not is_job:
+            with metrics.for_file(csv_file_path):
+                output_key, _, _, engine = obfuscate_file(
+                    json_content, input_bucket, csv_file_path, processed_bucket_name
                 )
-                logger.info(
-                    f"Uploaded obfuscated CSV to {processed_bucket_name}/{obfuscated_file_path}"
-                )
-            else:
-                logger.error("Processed bucket name not found in JSON.")
-                return {
-                    "statusCode": 400,
-                    "body": json.dumps("Processed bucket name not found."),
-                }
-        empty_bucket(input_bucket_name)
-        empty_bucket(invocation_bucket_name)
+            record_invocation(
+                invocation_bucket_name,
+                json_file_path,
+                etag,
+                processed_bucket_name,
+                output_key,
+            )
+            consumed = [
+                (input_bucket, csv_file_path),
+                (invocation_bucket_name, json_file_path),
+            ]
+            return {
+                "statusCode": 200,
+                "body": json.dumps("Processing completed successfully."),
+                "engine": engine,
+            }, consumed
 
+        report_key = (
+            f"{REPORT_PREFIX}{os.path.splitext(os.path.basename(json_file_path))[0]}.json"
+        )
+        report = process_files(json_content, processed_bucket_name, report_key)
+        consumed = []
+        if not report["failed"]:
+            record_invocation(
+                invocation_bucket_name,
+                json_file_path,
+                etag,
+                processed_bucket_name,
+                report_key,
+            )
+            consumed = [
+                (result["bucket_name"], result["s3_file_path"])
+                for result in report["files"]
+            ]
+            consumed.append((invocation_bucket_name, json_file_path))
         return {
-            "statusCode": 200,
-            "body": json.dumps("Processing completed successfully."),
-        }
+            "statusCode": 500 if report["failed"] else 200,
+            "body": json.dumps(
+                {
+                    "processed": report["processed"],
+                    "skipped": report["skipped"],
+                    "failed": report["failed"],
+                    "engines": report["engines"],
+                    "report_key": report_key,
+                }
+            ),
+        }, consumed
 
     except Exception as e:
         logger.error(f"Error processing JSON content: {e}")
-        return {"statusCode": 500, "body": json.dumps("Error processing JSON content.")}
+        return (
+            {"statusCode": 500, "body": json.dumps("Error processing JSON content.")},
+            [],
+        )
 
 
-def empty_bucket(bucket_name):
+def record_invocation(
+    invocation_bucket_name, json_file_path, etag, processed_bucket_name, output_key
+):
     """
-    Deletes all objects in the specified S3 bucket.
+    Records a processed invocation JSON file in the index, before it is deleted,
+    so that a replay of its S3 event can be recognised. Nothing is recorded if the
+    file's ETag is unknown.
 
     Parameters:
-    bucket_name (str): The name of the S3 bucket to be emptied.
+    invocation_bucket_name (str): The name of the S3 bucket holding the JSON file.
+    json_file_path (str): The key of the JSON file.
+    etag (str): The ETag of the JSON file.
+    processed_bucket_name (str): The bucket holding the index.
+    output_key (str): The key of the output, or of the report of a job.
+    """
+    if not etag:
+        return
+    record_output(
+        s3,
+        processed_bucket_name,
+        invocation_index_key(invocation_bucket_name, json_file_path, etag),
+        output_key,
+        {
+            "bucket_name": invocation_bucket_name,
+            "s3_file_path": json_file_path,
+            "etag": normalise_etag(etag),
+        },
+    )
+
+
+def obfuscate_file(
+    json_content,
+    input_bucket,
+    csv_file_path,
+    processed_bucket_name,
+    keep_path=False,
+    source_etag=None,
+    source_size=None,
+):
+    """
+    Obfuscates one input file as configured by an invocation JSON and uploads the output.
+
+    Each processed file is recorded in an index in the processed bucket, keyed by
+    the source's bucket, key and ETag, the hash of the settings that shape the
+    output, and the output key. If the same source has already been processed
+    with the same settings and its output still exists, it is skipped after a
+    few HEAD requests. Setting "force" to true in the invocation JSON processes
+    it again.
+
+    Setting "auto_detect" to true in the invocation JSON also masks the columns
+    that detect_pii_fields finds in the first "sample_kb" KiB of a CSV file, with
+    the default strategy.
+
+    Parameters:
+    json_content (dict): The invocation JSON, which sets the PII fields, mode,
+                         engine, strategies and output compression.
+    input_bucket (str): The name of the S3 bucket holding the input file.
+    csv_file_path (str): The key of the input file.
+    processed_bucket_name (str): The name of the S3 bucket the output is written to.
+    keep_path (bool): If True, the output key keeps the input key's whole path,
+                      "processed/<key>", so files of a job with the same name in
+                      different partitions do not overwrite each other. Otherwise
+                      it is "processed/<file name>".
+    source_etag (str): The ETag of the input file, if already known from a listing
+                       or HEAD request. Otherwise it is fetched with head_object.
+    source_size (int): The size of the input file in bytes, if already known along
+                       with its ETag. It is used to choose the CSV engine.
+
+    Returns:
+    tuple: The key of the output object, the number of bytes written, whether
+           the file was skipped because it had already been processed, and the
+           CSV engine that masked it, or None if it was skipped or is not a CSV
+           file. When the Arrow reader rejects some of the data, this is the
+           fallback engine, or both joined with "+" if each masked part of it.
+
+    Raises:
+    ValueError: If the settings are invalid or obfuscation fails.
+    """
+    pii_fields = json_content.get("pii_fields", [])
+    engine = json_content.get("engine")
+    strategy = json_content.get("strategy", "redact")
+    strategies = json_content.get("strategies")
+
+    input_compression = detect_compression(csv_file_path)
+    output_compression = resolve_compression(
+        json_content.get("output_compression", input_compression)
+    )
+    file_name = strip_compression_extension(
+        csv_file_path if keep_path else os.path.basename(csv_file_path)
+    )
+    obfuscated_file_path = (
+        f"processed/{file_name}{OUTPUT_EXTENSIONS.get(output_compression, '')}"
+    )
+
+    mode = json_content.get("mode", "memory")
+    if is_parquet(file_name):
+        mode = "parquet"
+    elif is_json(file_name):
+        mode = "json"
+    elif input_compression and mode == "memory":
+        logger.info("Streaming compressed input rather than inflating it in memory.")
+        mode = "stream"
+    elif (input_compression or output_compression) and mode == "parallel":
+        # Compressed data cannot be split at byte offsets, so it is streamed
+        # with the engine parallel mode would have used.
+        logger.info("Compressed files are streamed rather than split in parallel.")
+        mode = "stream"
+        engine = engine or "splice"
+    if mode == "parquet" and (input_compression or output_compression):
+        raise ValueError(
+            "Parquet files compress their own column chunks and cannot be "
+            "compressed as a whole."
+        )
+    metrics.set_property("mode", mode)
+    plan = build_masking_plan(pii_fields, strategy, strategies)
+    if not is_redact_only(plan) and mode in ("parallel", "parquet", "json"):
+        raise ValueError(
+            f"Masking strategies other than redact are not supported in {mode} mode."
+        )
+    if json_content.get("auto_detect") and mode in ("parquet", "json"):
+        raise ValueError("Automatic PII detection is only supported for CSV files.")
+
+    if source_etag is None:
+        head = s3.head_object(Bucket=input_bucket, Key=csv_file_path)
+        source_etag, source_size = head["ETag"], head.get("ContentLength")
+    digest = config_hash(json_content)
+    entry_key = index_key(
+        input_bucket, csv_file_path, source_etag, digest, obfuscated_file_path
+    )
+    if not json_content.get("force"):
+        existing = find_output(s3, processed_bucket_name, entry_key)
+        if existing:
+            logger.info(
+                f"Skipping {input_bucket}/{csv_file_path}: already processed to "
+                f"{processed_bucket_name}/{existing['output_key']}"
+            )
+            metrics.count("SkippedFiles", 1)
+            return existing["output_key"], existing["bytes_written"], True, None
+
+    pipeline_settings = {
+        "prefetch_blocks": json_content.get(
+            "prefetch_blocks", DEFAULT_PREFETCH_BLOCKS
+        ),
+        "upload_concurrency": json_content.get(
+            "upload_concurrency", DEFAULT_UPLOAD_CONCURRENCY
+        ),
+    }
+
+    if json_content.get("auto_detect"):
+        with metrics.stage("detect"):
+            detected = detect_pii_fields(
+                s3,
+                input_bucket,
+                csv_file_path,
+                json_content.get("sample_kb", DEFAULT_SAMPLE_KB),
+            )
+        logger.info(f"Detected PII columns in {csv_file_path}: {detected}")
+        metrics.set_property("DetectedPIIFields", list(detected))
+        pii_fields = merge_pii_fields(pii_fields, detected)
+
+    engine = resolve_engine(
+        engine,
+        mode,
+        build_masking_plan(pii_fields, strategy, strategies),
+        input_bucket,
+        csv_file_path,
+        source_size,
+    )
+
+    engines = []
+    if mode == "parquet":
+        bytes_written = obfuscate_pii_parquet(
+            input_bucket,
+            csv_file_path,
+            pii_fields,
+            processed_bucket_name,
+            obfuscated_file_path,
+        )
+    elif mode == "json":
+        bytes_written = obfuscate_pii_json(
+            input_bucket,
+            csv_file_path,
+            pii_fields,
+            processed_bucket_name,
+            obfuscated_file_path,
+            output_compression=output_compression,
+            **pipeline_settings,
+        )
+    elif mode == "parallel":
+        bytes_written = obfuscate_pii_parallel(
+            s3,
+            input_bucket,
+            csv_file_path,
+            pii_fields,
+            processed_bucket_name,
+            obfuscated_file_path,
+            workers=json_content.get("workers", DEFAULT_WORKERS),
+        )
+        if bytes_written is not None:
+            metrics.count("BytesOut", bytes_written)
+    elif mode == "stream":
+        bytes_written = obfuscate_pii_stream(
+            input_bucket,
+            csv_file_path,
+            pii_fields,
+            processed_bucket_name,
+            obfuscated_file_path,
+            chunk_rows=json_content.get("chunk_rows", DEFAULT_CHUNK_ROWS),
+            engine=engine,
+            strategy=strategy,
+            strategies=strategies,
+            output_compression=output_compression,
+            engines=engines,
+            **pipeline_settings,
+        )
+    else:
+        obfuscated_csv_data = obfuscate_pii(
+            input_bucket,
+            csv_file_path,
+            pii_fields,
+            engine=engine,
+            strategy=strategy,
+            strategies=strategies,
+            output_compression=output_compression,
+            engines=engines,
+        )
+        if obfuscated_csv_data is None:
+            raise ValueError("Obfuscation failed.")
+        with metrics.stage("upload"):
+            s3.put_object(
+                Bucket=processed_bucket_name,
+                Key=obfuscated_file_path,
+                Body=obfuscated_csv_data,
+            )
+        bytes_written = len(obfuscated_csv_data)
+        metrics.count("BytesOut", bytes_written)
+
+    if bytes_written is None:
+        raise ValueError("Streaming obfuscation failed.")
+    if engines:
+        engine = "+".join(dict.fromkeys(engines))
+        metrics.set_property("engine", engine)
+    logger.info(
+        f"Uploaded obfuscated file to {processed_bucket_name}/{obfuscated_file_path}"
+    )
+    record_output(
+        s3,
+        processed_bucket_name,
+        entry_key,
+        obfuscated_file_path,
+        {
+            "bucket_name": input_bucket,
+            "s3_file_path": csv_file_path,
+            "etag": normalise_etag(source_etag),
+            "config_hash": digest,
+            "bytes_written": bytes_written,
+        },
+    )
+    return obfuscated_file_path, bytes_written, False, engine
+
+
+def resolve_engine(engine, mode, plan, bucket_name, key, size=None):
+    """
+    Picks the CSV engine of an input file before it is downloaded, so that the
+    choice can be reported in the handler's response.
+
+    With "auto", the column count is read from the header, downloaded with one
+    ranged GET, only when the size of the file alone does not decide the engine.
+
+    Parameters:
+    engine (str): The engine set in the invocation JSON, "auto", or None.
+    mode (str): The processing mode of the file.
+    plan (dict): The masking plan of the file.
+    bucket_name (str): The name of the S3 bucket holding the file.
+    key (str): The key of the file.
+    size (int): The size of the file in bytes, or None if it is not known.
+
+    Returns:
+    str: The engine the file is masked with, or None for Parquet and JSON files.
+    """
+    if mode == "parallel":
+        return "splice"
+    if mode not in ("memory", "stream"):
+        return None
+    if engine is None and mode == "stream":
+        return "pandas"
+    columns = None
+    if engine == AUTO_ENGINE and is_redact_only(plan):
+        if size is None or size > AUTO_SPLICE_MAX_BYTES:
+            with metrics.stage("download"):
+                sample = read_sample(s3, bucket_name, key, HEADER_PROBE_BYTES)
+            columns = len(header_columns(sample))
+    return choose_engine(engine, plan, size, columns)
+
+
+def parse_s3_uri(uri, default_bucket):
+    """
+    Splits an "s3://bucket/key" URI into its bucket and key. Anything else is taken
+    as a key in the default bucket.
+
+    Returns:
+    tuple: The bucket name and key.
+    """
+    if uri.startswith("s3://"):
+        bucket_name, _, key = uri[len("s3://") :].partition("/")
+        return bucket_name, key
+    return default_bucket, uri
+
+
+def read_manifest(bucket_name, manifest):
+    """
+    Reads the list of input files from a manifest file in S3.
+
+    The manifest is either a JSON array of keys, or a text file with one key per
+    line. Lines of the form "bucket,key", as in the CSV manifests of S3 Batch
+    Operations, name a file in another bucket; their keys are URL-encoded.
+
+    Parameters:
+    bucket_name (str): The input bucket, used for keys without a bucket.
+    manifest (str): The key of the manifest in the input bucket, or an
+                    "s3://bucket/key" URI.
+
+    Returns:
+    list: (bucket_name, key) tuples, in the order of the manifest.
+    """
+    manifest_bucket, manifest_key = parse_s3_uri(manifest, bucket_name)
+    response = s3.get_object(Bucket=manifest_bucket, Key=manifest_key)
+    text = response["Body"].read().decode("utf-8")
+    if text.lstrip().startswith("["):
+        return [parse_s3_uri(key, bucket_name) for key in json.loads(text)]
+
+    files = []
+    for row in csv.reader(text.splitlines()):
+        if not row or not row[0].strip():
+            continue
+        if len(row) == 1:
+            files.append(parse_s3_uri(row[0].strip(), bucket_name))
+        else:
+            files.append((row[0].strip(), unquote(row[1].strip())))
+    return files
+
+
+def iter_prefix_objects(bucket_name, prefix):
+    """
+    Lists every object under a prefix of an S3 bucket, skipping folder markers.
+
+    Yields:
+    tuple: The key, size in bytes and ETag of each object.
+    """
+    request = {"Bucket": bucket_name, "Prefix": prefix}
+    while True:
+        response = s3.list_objects_v2(**request)
+        for obj in response.get("Contents", []):
+            if not obj["Key"].endswith("/"):
+                yield obj["Key"], obj["Size"], obj.get("ETag")
+        if not response.get("IsTruncated"):
+            return
+        request["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def resolve_input_files(json_content):
+    """
+    Lists the input files of a job from its invocation JSON.
+
+    Files named by "s3_file_path", "s3_file_paths", "s3_prefix" and "manifest" are
+    combined, in that order, and each file is listed once. Keys in "s3_file_paths"
+    may also be "s3://bucket/key" URIs.
+
+    Parameters:
+    json_content (dict): The invocation JSON.
+
+    Returns:
+    list: (bucket_name, key, size, etag) tuples. The size and ETag are None for
+          files that were not found by listing a prefix.
+    """
+    input_bucket = json_content["bucket_name"]
+    files = []
+    if json_content.get("s3_file_path"):
+        files.append((input_bucket, json_content["s3_file_path"], None, None))
+    for path in json_content.get("s3_file_paths") or []:
+        files.append((*parse_s3_uri(path, input_bucket), None, None))
+    if "s3_prefix" in json_content:
+        for key, size, etag in iter_prefix_objects(
+            input_bucket, json_content["s3_prefix"]
+        ):
+            files.append((input_bucket, key, size, etag))
+    if json_content.get("manifest"):
+        for bucket_name, key in read_manifest(input_bucket, json_content["manifest"]):
+            files.append((bucket_name, key, None, None))
+
+    unique = {}
+    for bucket_name, key, size, etag in files:
+        if unique.get((bucket_name, key), (None,))[0] is None:
+            unique[(bucket_name, key)] = (size, etag)
+    return [
+        (bucket_name, key, size, etag)
+        for (bucket_name, key), (size, etag) in unique.items()
+    ]
+
+
+def process_files(json_content, processed_bucket_name, report_key):
+    """
+    Obfuscates every input file of a job and writes an aggregate report.
+
+    The files are fanned out over a bounded thread pool of "file_workers" threads
+    (MAX_FILE_WORKERS by default), sharing the S3 client and the settings of the
+    invocation JSON. The output of each file is written to "processed/<key>". The
+    sizes and ETags of files not found by listing a prefix are fetched first with
+    concurrent HEAD requests, and files that do not exist are reported as failed.
+    Files already processed with the same settings are reported as skipped.
+
+    Parameters:
+    json_content (dict): The invocation JSON.
+    processed_bucket_name (str): The name of the S3 bucket the output is written to.
+    report_key (str): The key the report is written to in the processed bucket.
+
+    Returns:
+    dict: The report, with the number of files "processed" (including those
+          "skipped") and "failed", the total "bytes_in", "bytes_out" and
+          "duration_ms", the number of files masked with each CSV engine in
+          "engines", and one entry in "files" per input file with its
+          "status", sizes, "engine", "duration_ms" and any "error".
+
+    Raises:
+    ValueError: If the job has no input files.
+    """
+    started = time.perf_counter()
+    files = resolve_input_files(json_content)
+    if not files:
+        raise ValueError("No input files found for the job.")
+    logger.info(f"Processing {len(files)} files as one job.")
+
+    objects = {}
+    io_pool = S3IO(s3)
+    unlisted = {}
+    for bucket_name, key, size, etag in files:
+        if size is None:
+            unlisted.setdefault(bucket_name, []).append(key)
+        else:
+            objects[(bucket_name, key)] = (size, etag)
+    for bucket_name, keys in unlisted.items():
+        for key, head in zip(keys, io_pool.head_objects(bucket_name, keys)):
+            objects[(bucket_name, key)] = (
+                (head["ContentLength"], head["ETag"]) if head else (None, None)
+            )
+
+    def process(file):
+        bucket_name, key = file[:2]
+        size, etag = objects[(bucket_name, key)]
+        file_started = time.perf_counter()
+        result = {"bucket_name": bucket_name, "s3_file_path": key, "bytes_in": size}
+        try:
+            if size is None:
+                raise ValueError("Object not found.")
+            with metrics.for_file(key):
+                output_key, bytes_written, skipped, engine = obfuscate_file(
+                    json_content,
+                    bucket_name,
+                    key,
+                    processed_bucket_name,
+                    keep_path=True,
+                    source_etag=etag,
+                    source_size=size,
+                )
+            result.update(
+                status="skipped" if skipped else "succeeded",
+                output_key=output_key,
+                bytes_out=bytes_written,
+                engine=engine,
+            )
+        except Exception as e:
+            logger.error(f"Failed to obfuscate {bucket_name}/{key}: {e}")
+            result.update(status="failed", error=str(e))
+        result["duration_ms"] = round((time.perf_counter() - file_started) * 1000, 3)
+        return result
+
+    workers = min(len(files), json_content.get("file_workers", MAX_FILE_WORKERS))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = list(executor.map(process, files))
+
+    failed = sum(1 for result in results if result["status"] == "failed")
+    engines = {}
+    for result in results:
+        if result.get("engine"):
+            engines[result["engine"]] = engines.get(result["engine"], 0) + 1
+    report = {
+        "processed": len(results) - failed,
+        "skipped": sum(1 for result in results if result["status"] == "skipped"),
+        "failed": failed,
+        "bytes_in": sum(result["bytes_in"] or 0 for result in results),
+        "bytes_out": sum(result.get("bytes_out", 0) for result in results),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        "engines": engines,
+        "files": results,
+    }
+    s3.put_object(
+        Bucket=processed_bucket_name,
+        Key=report_key,
+        Body=json.dumps(report, indent=2).encode("utf-8"),
+        ContentType="application/json",
+    )
+    logger.info(
+        f"Job complete: {report['processed']} files processed, "
+        f"{report['skipped']} of them skipped, {failed} failed. "
+        f"Report written to {processed_bucket_name}/{report_key}"
+    )
+    return report
+
+
+def obfuscate_pii_parquet(
+    bucket_name, s3_file_path, pii_fields, output_bucket_name, output_key
+):
+    """
+    Obfuscates PII columns of a Parquet file in S3 one row group at a time.
+
+    The input is read through ranged GETs, fetching only the footer and the
+    non-PII column chunks of each row group, and the output is streamed to the
+    destination object through a multipart upload.
+
+    Parameters:
+    bucket_name (str): The name of the S3 bucket where the Parquet file is located.
+    s3_file_path (str): The path to the Parquet file within the specified S3 bucket.
+    pii_fields (list): A list of column names representing the PII fields to be obfuscated.
+    output_bucket_name (str): The name of the S3 bucket the obfuscated file is written to.
+    output_key (str): The key of the obfuscated file within the output bucket.
+
+    Returns:
+    int: The number of bytes written to the output object.
+         If an error occurs during processing, returns None.
+    """
+    try:
+        source = S3RangeReader(s3, bucket_name, s3_file_path)
+        # Ranged reads, masking and part uploads are interleaved row group by
+        # row group inside pyarrow, so they are timed as a single stage.
+        with metrics.stage("mask"):
+            with S3MultipartWriter(s3, output_bucket_name, output_key) as writer:
+                rows = mask_parquet(source, writer, pii_fields)
+        metrics.count("Rows", rows)
+        metrics.count("BytesOut", writer.bytes_written)
+
+        logger.info(
+            f"Parquet obfuscation complete: {rows} rows, {writer.bytes_written} bytes "
+            f"written to {output_bucket_name}/{output_key}."
+        )
+        return writer.bytes_written
+
+    except Exception as e:
+        logger.error(f"Failed to process file: {e}")
+        return None
+
+
+def obfuscate_pii_json(
+    bucket_name,
+    s3_file_path,
+    pii_fields,
+    output_bucket_name,
+    output_key,
+    output_compression=None,
+    prefetch_blocks=DEFAULT_PREFETCH_BLOCKS,
+    upload_concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+):
+    """
+    Obfuscates PII fields of a JSON or JSON Lines file in S3 without holding it in memory.
+
+    The S3 response body is read in blocks of DEFAULT_CHUNK_BYTES bytes and masked
+    one line, or one top-level array element, at a time. Records without PII are
+    copied unchanged, and the output is streamed to the destination object through
+    a multipart upload. Compressed input, such as "events.jsonl.gz", is decoded as
+    it is read.
+
+    Parameters:
+    bucket_name (str): The name of the S3 bucket where the JSON file is located.
+    s3_file_path (str): The path to the JSON file within the specified S3 bucket.
+    pii_fields (list): Dotted or JSONPath-style paths of the PII fields to be obfuscated.
+    output_bucket_name (str): The name of the S3 bucket the obfuscated file is written to.
+    output_key (str): The key of the obfuscated file within the output bucket.
+    output_compression (str): "gzip", "bz2" or "zstd" to compress the output.
+    prefetch_blocks (int): As for obfuscate_pii_stream.
+    upload_concurrency (int): As for obfuscate_pii_stream.
 
     Returns:
-    None: This function does not return any value. It logs information about the deletion process.
+    int: The number of bytes written to the output object.
+         If an error occurs during processing, returns None.
     """
     try:
-        response = s3.list_objects_v2(Bucket=bucket_name)
+        plan, _, output_compression = check_options(
+            pii_fields, output_compression=output_compression
+        )
+        with metrics.stage("download"):
+            response = s3.get_object(Bucket=bucket_name, Key=s3_file_path)
+        with pipelined_source(response["Body"], prefetch_blocks) as source:
+            masked_chunks = iter_obfuscated(
+                source,
+                s3_file_path,
+                pii_fields,
+                plan,
+                output_compression=output_compression,
+            )
+            writer = write_pipelined(
+                masked_chunks, output_bucket_name, output_key, upload_concurrency
+            )
+        metrics.count("BytesOut", writer.bytes_written)
+
+        logger.info(
+            f"JSON obfuscation complete: {writer.bytes_written} bytes written "
+            f"to {output_bucket_name}/{output_key}."
+        )
+        return writer.bytes_written
+
+    except Exception as e:
+        logger.error(f"Failed to process file: {e}")
+        return None
+
+
+def handler(event, context):
+    """
+    AWS Lambda function handler for processing PII data obfuscation.
+
+    This function retrieves the names of the input, processed, and invocation
+    buckets from a Terraform state file and processes the invocation JSON files
+    named in the S3 event's records. Records in a batched event are processed
+    concurrently and the result of each one is reported in the response. The JSON
+    and CSV files of each successful record are then deleted; the files of failed
+    records are kept so the invocation can be retried. Only files in the input and
+    invocation buckets are deleted, even when a job names files in other buckets.
 
-        if "Contents" in response:
-            for obj in response["Contents"]:
-                s3.delete_object(Bucket=bucket_name, Key=obj["Key"])
-            logger.info(f"All objects deleted from bucket: {bucket_name}")
+    Events without S3 records, such as manual invocations, fall back to the first
+    JSON file found by listing the invocation bucket, and on success the input and
+    invocation buckets are emptied.
+
+    The duration of each stage, the bytes read and written and the peak memory of
+    the invocation are written to the logs as a single line in CloudWatch embedded
+    metric format, whether or not processing succeeds.
+
+    Parameters:
+    event (dict): The event data passed to the Lambda function.
+    context (LambdaContext): The runtime information provided by AWS Lambda.
+
+    Returns:
+    dict: A dictionary containing the HTTP status code and body of the response.
+    """
+    collector = metrics.start_invocation()
+    request_id = getattr(context, "aws_request_id", None)
+    if request_id:
+        collector.set_property("RequestId", request_id)
+    try:
+        response = process_event(event)
+        collector.set_property("statusCode", response["statusCode"])
+        return response
+    finally:
+        collector.emit()
+
+
+def process_event(event):
+    """
+    Processes the invocation JSON files of an S3 event, as described for handler.
+
+    Parameters:
+    event (dict): The event data passed to the Lambda function.
+
+    Returns:
+    dict: A dictionary containing the HTTP status code and body of the response.
+    """
+    with metrics.stage("state_lookup"):
+        input_bucket_name, processed_bucket_name, invocation_bucket_name = (
+            get_bucket_names_from_tf_state(tf_state_bucket, tf_state_key)
+        )
+
+    records = get_invocation_records(event)
+    etags = get_record_etags(event)
+    if not records:
+        try:
+            with metrics.stage("key_discovery"):
+                json_file_path = get_keys_from_bucket(invocation_bucket_name)
+            if not json_file_path:
+                raise ValueError("No JSON file found in the invocation bucket.")
+        except Exception as e:
+            logger.error(f"Error retrieving JSON file from bucket: {e}")
+            return {
+                "statusCode": 500,
+                "body": json.dumps(
+                    "Error retrieving JSON file from invocation bucket."
+                ),
+            }
+
+        result, _ = process_invocation(
+            invocation_bucket_name, json_file_path, processed_bucket_name
+        )
+        metrics.count("Records", 1)
+        if result["statusCode"] == 200:
+            with metrics.stage("cleanup"):
+                empty_buckets({input_bucket_name: None, invocation_bucket_name: None})
+        else:
+            metrics.count("FailedRecords", 1)
+        return result
+
+    with ThreadPoolExecutor(
+        max_workers=min(len(records), MAX_RECORD_WORKERS)
+    ) as executor:
+        results = list(
+            executor.map(
+                lambda record: process_invocation(
+                    record[0], record[1], processed_bucket_name, etags.get(record)
+                ),
+                records,
+            )
+        )
+
+    report = []
+    consumed_keys = {}
+    for (bucket_name, key), (result, consumed) in zip(records, results):
+        entry = {
+            "bucket_name": bucket_name,
+            "key": key,
+            "statusCode": result["statusCode"],
+            "message": json.loads(result["body"]),
+        }
+        if "engine" in result:
+            entry["engine"] = result["engine"]
+        report.append(entry)
+        for consumed_bucket, consumed_key in consumed:
+            consumed_keys.setdefault(consumed_bucket, []).append(consumed_key)
+        if result["statusCode"] == 200:
+            logger.info(f"Processed invocation {bucket_name}/{key}")
         else:
-            logger.info(f"No objects found in bucket: {bucket_name}")
+            logger.error(f"Failed invocation {bucket_name}/{key}: {result['body']}")
 
+    # Only the configured buckets are cleaned up, so an invocation or manifest that
+    # names files in other buckets cannot make the function delete them.
+    cleanup_buckets = (input_bucket_name, invocation_bucket_name)
+    for bucket_name in consumed_keys.keys() - set(cleanup_buckets):
+        logger.warning(
+            f"Not deleting {len(consumed_keys[bucket_name])} source files from "
+            f"{bucket_name}, which is not the input or invocation bucket."
+        )
+    with metrics.stage("cleanup"):
+        empty_buckets(
+            {
+                bucket_name: keys
+                for bucket_name, keys in consumed_keys.items()
+                if bucket_name in cleanup_buckets
+            }
+        )
+
+    failed = sum(1 for result in report if result["statusCode"] != 200)
+    metrics.count("Records", len(results))
+    metrics.count("FailedRecords", failed)
+
+    return {
+        "statusCode": 500 if failed else 200,
+        "body": json.dumps(
+            {
+                "processed": len(results) - failed,
+                "failed": failed,
+                "results": report,
+            }
+        ),
+    }
+
+
+def empty_buckets(buckets):
+    """
+    Empties several S3 buckets at the same time with empty_bucket.
+
+    Parameters:
+    buckets (dict): The keys to delete from each bucket, keyed by bucket name.
+                    A value of None deletes every object in the bucket.
+
+    Returns:
+    dict: The result of empty_bucket for each bucket.
+    """
+    if not buckets:
+        return {}
+    # Each call waits on its own delete batches, so the calls run on a pool of
+    # their own rather than on the S3 I/O pool the batches are sent to.
+    with ThreadPoolExecutor(max_workers=len(buckets)) as executor:
+        futures = {
+            bucket_name: (
+                executor.submit(empty_bucket, bucket_name)
+                if keys is None
+                else executor.submit(empty_bucket, bucket_name, keys=keys)
+            )
+            for bucket_name, keys in buckets.items()
+        }
+    return {bucket_name: future.result() for bucket_name, future in futures.items()}
+
+
+def delete_keys(bucket_name, keys):
+    """
+    Deletes up to 1000 objects from an S3 bucket with a single delete_objects request.
+
+    Parameters:
+    bucket_name (str): The name of the S3 bucket.
+    keys (list): The keys of the objects to delete.
+
+    Returns:
+    list: The keys that could not be deleted.
+    """
+    try:
+        response = s3.delete_objects(
+            Bucket=bucket_name,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
     except Exception as e:
+        logger.error(f"Failed to delete batch of {len(keys)} objects: {e}")
+        return list(keys)
+    errors = response.get("Errors", [])
+    for error in errors:
+        logger.error(f"Failed to delete {error.get('Key')}: {error.get('Message')}")
+    return [error["Key"] for error in errors]
+
+
+def iter_key_batches(bucket_name):
+    """
+    Lists every object in an S3 bucket, one page of up to 1000 keys at a time.
+
+    Parameters:
+    bucket_name (str): The name of the S3 bucket to list.
+
+    Yields:
+    list: The keys on each non-empty page of list_objects_v2.
+    """
+    request = {"Bucket": bucket_name}
+    while True:
+        response = s3.list_objects_v2(**request)
+        batch = [obj["Key"] for obj in response.get("Contents", [])]
+        if batch:
+            yield batch
+        if not response.get("IsTruncated"):
+            return
+        request["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def empty_bucket(bucket_name, keys=None):
+    """
+    Deletes all objects in the specified S3 bucket, or only the given keys.
+
+    Every page of list_objects_v2 is read, and keys are deleted in batches of up to
+    1000 with delete_objects. Batches are sent concurrently on the shared S3 I/O
+    pool while the remaining pages are still being listed. At most twice as many
+    batches as the pool has threads are in flight, so listing waits for deletes
+    to finish rather than queueing every page of a large bucket.
+
+    Parameters:
+    bucket_name (str): The name of the S3 bucket to be emptied.
+    keys (list): If given, only these keys are deleted and the bucket is not listed.
+
+    Returns:
+    dict: "deleted", the number of objects deleted, and "failed", the keys that
+          could not be deleted. If listing the bucket fails part way, the batches
+          already submitted are still deleted and counted.
+    """
+    if keys is not None:
+        batches = (
+            list(keys[start : start + DELETE_BATCH_SIZE])
+            for start in range(0, len(keys), DELETE_BATCH_SIZE)
+        )
+    else:
+        batches = iter_key_batches(bucket_name)
+
+    io_pool = S3IO(s3)
+    window = 2 * max_concurrency()
+    pending = deque()
+    submitted = 0
+    failed = []
+    listed = True
+    try:
+        for batch in batches:
+            if len(pending) >= window:
+                failed.extend(pending.popleft().result())
+            pending.append(io_pool.submit(delete_keys, bucket_name, batch))
+            submitted += len(batch)
+    except Exception as e:
+        listed = False
         logger.error(f"Failed to delete objects from bucket: {e}")
+
+    for future in pending:
+        failed.extend(future.result())
+    deleted = submitted - len(failed)
+
+    if failed:
+        logger.error(
+            f"Deleted {deleted} objects from bucket: {bucket_name}, {len(failed)} failed"
+        )
+    elif deleted:
+        logger.info(f"All objects deleted from bucket: {bucket_name}")
+    elif listed:
+        logger.info(f"No objects found in bucket: {bucket_name}")
+
+    return {"deleted": deleted, "failed": failed}
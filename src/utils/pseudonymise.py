@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import logging
+import os
+
+logger = logging.getLogger()
+
+HMAC_KEY_ENV_VAR = "GDPR_HMAC_KEY"
+HMAC_KEY_FILE_ENV_VAR = "GDPR_HMAC_KEY_FILE"
+MAX_CACHED_TOKENS = 1_000_000
+
+
+def load_hmac_key(key_file=None):
+    """
+    Loads the secret key used to pseudonymise PII values.
+
+    The key is read from the GDPR_HMAC_KEY environment variable or, if that is not
+    set, from the file named by `key_file` or by the GDPR_HMAC_KEY_FILE environment
+    variable. A single trailing newline is stripped from the file's content.
+
+    Parameters:
+    key_file (str): The path of a file holding the key.
+
+    Returns:
+    bytes: The key.
+
+    Raises:
+    ValueError: If no key is configured or the key is empty.
+    """
+    key = os.environ.get(HMAC_KEY_ENV_VAR)
+    if key:
+        return key.encode("utf-8")
+
+    key_file = key_file or os.environ.get(HMAC_KEY_FILE_ENV_VAR)
+    if not key_file:
+        raise ValueError(
+            f"No HMAC key configured; set {HMAC_KEY_ENV_VAR} or {HMAC_KEY_FILE_ENV_VAR}."
+        )
+    with open(key_file, "rb") as f:
+        key = f.read()
+    if key.endswith(b"\n"):
+        key = key[:-1]
+    if key.endswith(b"\r"):
+        key = key[:-1]
+    if not key:
+        raise ValueError(f"HMAC key file is empty: {key_file}")
+    return key
+
+
+def pseudonymise_value(value, key):
+    """
+    Computes the pseudonym of a single value with HMAC-SHA256.
+
+    Parameters:
+    value (str): The value to pseudonymise.
+    key (bytes): The secret key.
+
+    Returns:
+    str: The hex digest, identical for equal values and keys.
+    """
+    return hmac.new(key, str(value).encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def pseudonymise_column(values, key, cache=None):
+    """
+    Replaces every value of a column with its HMAC-SHA256 pseudonym.
+
+    The column is factorised first, so each distinct value is hashed once and the
+    pseudonyms are spread back over the rows with a single NumPy take. The cost is
+    proportional to the number of distinct values rather than the number of rows.
+    Missing values stay missing.
+
+    Parameters:
+    values (pandas.Series): The column to pseudonymise.
+    key (bytes): The secret key.
+    cache (dict): Pseudonyms already computed for earlier chunks of the same file.
+                  It is updated in place and cleared once it holds MAX_CACHED_TOKENS.
+
+    Returns:
+    numpy.ndarray: The pseudonyms, aligned with the rows of `values`.
+    """
+    import numpy as np
+
+    codes, uniques = values.factorize()
+    if cache is None:
+        cache = {}
+    elif len(cache) + len(uniques) > MAX_CACHED_TOKENS:
+        cache.clear()
+
+    tokens = np.empty(len(uniques) + 1, dtype=object)
+    for index, unique in enumerate(uniques):
+        token = cache.get(unique)
+        if token is None:
+            token = cache[unique] = pseudonymise_value(unique, key)
+        tokens[index] = token
+    # Missing values are coded -1, which takes the trailing NaN.
+    tokens[-1] = np.nan
+    return tokens.take(codes)
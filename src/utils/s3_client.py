@@ -0,0 +1,127 @@
+import os
+import threading
+
+from src.utils.s3_io import DEFAULT_MAX_CONCURRENCY, MAX_CONCURRENCY_ENV_VAR
+
+MAX_POOL_CONNECTIONS_ENV_VAR = "GDPR_S3_MAX_POOL_CONNECTIONS"
+RETRY_MODE_ENV_VAR = "GDPR_S3_RETRY_MODE"
+MAX_ATTEMPTS_ENV_VAR = "GDPR_S3_MAX_ATTEMPTS"
+CONNECT_TIMEOUT_ENV_VAR = "GDPR_S3_CONNECT_TIMEOUT"
+READ_TIMEOUT_ENV_VAR = "GDPR_S3_READ_TIMEOUT"
+ENDPOINT_URL_ENV_VAR = "GDPR_S3_ENDPOINT_URL"
+ADDRESSING_STYLE_ENV_VAR = "GDPR_S3_ADDRESSING_STYLE"
+
+DEFAULT_MAX_POOL_CONNECTIONS = 64
+DEFAULT_RETRY_MODE = "adaptive"
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+
+
+def client_settings():
+    """
+    Reads the settings of the clients built by create_client from the environment.
+
+    The connection pool holds at least as many connections as the shared S3 thread
+    pool has threads (GDPR_S3_MAX_CONCURRENCY), so its requests never queue for a
+    connection.
+
+    Returns:
+    dict: The keyword arguments of botocore.config.Config, and "endpoint_url",
+          which is None unless GDPR_S3_ENDPOINT_URL is set.
+
+    Raises:
+    ValueError: If a numeric setting is not a number.
+    """
+    concurrency = int(os.environ.get(MAX_CONCURRENCY_ENV_VAR, DEFAULT_MAX_CONCURRENCY))
+    settings = {
+        "max_pool_connections": int(
+            os.environ.get(
+                MAX_POOL_CONNECTIONS_ENV_VAR,
+                max(DEFAULT_MAX_POOL_CONNECTIONS, concurrency),
+            )
+        ),
+        "retries": {
+            "mode": os.environ.get(RETRY_MODE_ENV_VAR, DEFAULT_RETRY_MODE),
+            "total_max_attempts": int(
+                os.environ.get(MAX_ATTEMPTS_ENV_VAR, DEFAULT_MAX_ATTEMPTS)
+            ),
+        },
+        "connect_timeout": float(
+            os.environ.get(CONNECT_TIMEOUT_ENV_VAR, DEFAULT_CONNECT_TIMEOUT)
+        ),
+        "read_timeout": float(
+            os.environ.get(READ_TIMEOUT_ENV_VAR, DEFAULT_READ_TIMEOUT)
+        ),
+        "tcp_keepalive": True,
+        "endpoint_url": os.environ.get(ENDPOINT_URL_ENV_VAR) or None,
+    }
+    addressing_style = os.environ.get(ADDRESSING_STYLE_ENV_VAR)
+    if addressing_style:
+        settings["s3"] = {"addressing_style": addressing_style}
+    return settings
+
+
+def create_client(service_name, **overrides):
+    """
+    Builds a boto3 client with the connection pool, retry policy and timeouts read
+    by client_settings.
+
+    The default botocore client keeps 10 pooled connections and uses legacy
+    retries, which caps concurrent requests and backs off slowly when S3
+    throttles. Adaptive retries also rate-limit the client once it is throttled.
+    Setting GDPR_S3_ENDPOINT_URL points the client at a local S3 stand-in, such as
+    MinIO or moto's server, and GDPR_S3_ADDRESSING_STYLE to "path" suits those.
+
+    Parameters:
+    service_name (str): The AWS service of the client, such as "s3".
+    **overrides: Settings that replace those of client_settings, such as
+                 max_pool_connections=100 or endpoint_url="http://localhost:9000".
+
+    Returns:
+    botocore.client.BaseClient: The boto3 client.
+    """
+    import boto3
+    from botocore.config import Config
+
+    settings = {**client_settings(), **overrides}
+    endpoint_url = settings.pop("endpoint_url")
+    options = {"endpoint_url": endpoint_url} if endpoint_url else {}
+    return boto3.client(service_name, config=Config(**settings), **options)
+
+
+class LazyClient:
+    """
+    Stand-in for a boto3 client that only creates the client on first use.
+
+    Importing boto3 and building a client costs a few hundred milliseconds, so a
+    module that holds one of these at module level stays cheap to import. Any
+    attribute access, such as `s3.get_object`, creates the real client once with
+    create_client and is forwarded to it.
+
+    Parameters:
+    service_name (str): The AWS service of the client, such as "s3".
+    """
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        """
+        Returns the real client, creating it on the first call.
+
+        Returns:
+        botocore.client.BaseClient: The boto3 client.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = create_client(self.service_name)
+        return self._client
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get_client(), name)
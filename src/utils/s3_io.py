@@ -0,0 +1,131 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENCY_ENV_VAR = "GDPR_S3_MAX_CONCURRENCY"
+DEFAULT_MAX_CONCURRENCY = 32
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def max_concurrency():
+    """
+    Returns the size of the shared pool, from the GDPR_S3_MAX_CONCURRENCY
+    environment variable.
+    """
+    return max(int(os.environ.get(MAX_CONCURRENCY_ENV_VAR, DEFAULT_MAX_CONCURRENCY)), 1)
+
+
+def get_executor():
+    """
+    Returns the thread pool shared by every S3IO, creating it on the first call.
+
+    Its size, read from the GDPR_S3_MAX_CONCURRENCY environment variable, is the
+    maximum number of S3 requests in flight across the whole process, however
+    many callers are submitting them.
+
+    Returns:
+    concurrent.futures.ThreadPoolExecutor: The shared pool.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max_concurrency(), thread_name_prefix="s3-io"
+                )
+    return _executor
+
+
+def is_not_found(error):
+    """
+    Returns True if an exception is an S3 "not found" client error.
+    """
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in NOT_FOUND_CODES
+
+
+class S3IO:
+    """
+    Issues independent S3 requests concurrently on a shared, bounded thread pool.
+
+    boto3 clients are thread-safe, so the requests of many objects can overlap
+    instead of each waiting for the one before it. Every method submits all of its
+    requests before waiting for any of them and returns the results in the order
+    of its arguments.
+
+    Only single requests, or short functions that make requests one after another,
+    should be submitted. Work that itself waits on the pool must run elsewhere, or
+    the pool could fill with tasks waiting for each other.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for all requests.
+    executor (concurrent.futures.Executor): The pool the requests run on.
+                                           Defaults to the shared pool.
+    """
+
+    def __init__(self, s3_client, executor=None):
+        self.s3 = s3_client
+        self.executor = executor or get_executor()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Runs a function on the pool.
+
+        Returns:
+        concurrent.futures.Future: The function's pending result.
+        """
+        return self.executor.submit(function, *args, **kwargs)
+
+    def map(self, function, requests, return_exceptions=False):
+        """
+        Runs a function once per request and waits for every call.
+
+        Parameters:
+        function (callable): The function to call, such as s3.head_object.
+        requests (iterable): The keyword arguments of each call, as dictionaries.
+        return_exceptions (bool): If True, an exception raised by a call is returned
+                                  in its place instead of being raised.
+
+        Returns:
+        list: The result of each call, in the order of `requests`.
+        """
+        futures = [self.submit(function, **request) for request in requests]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def head_objects(self, bucket_name, keys):
+        """
+        Fetches the metadata of several objects concurrently.
+
+        Parameters:
+        bucket_name (str): The name of the S3 bucket.
+        keys (list): The keys of the objects.
+
+        Returns:
+        list: The head_object response of each object, or None if it does not
+              exist, in the order of `keys`.
+
+        Raises:
+        Exception: Any error other than a missing object.
+        """
+        responses = self.map(
+            self.s3.head_object,
+            [{"Bucket": bucket_name, "Key": key} for key in keys],
+            return_exceptions=True,
+        )
+        for index, response in enumerate(responses):
+            if isinstance(response, Exception):
+                if not is_not_found(response):
+                    raise response
+                responses[index] = None
+        return responses
@@ -0,0 +1,178 @@
+import io
+import logging
+from collections import deque
+
+from src.utils.s3_io import get_executor
+
+logger = logging.getLogger()
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    Write-only file object that streams everything written to it into an S3 object.
+
+    Data is buffered until a full part is available and then sent with upload_part,
+    so at most one part is held in memory at a time. The multipart upload is only
+    created once the first full part is ready; outputs smaller than one part are
+    written with a single put_object when the writer is closed.
+
+    With `max_in_flight` above 1, parts are uploaded on a thread pool while the
+    writer's caller goes on producing the next ones, and a write waits only once
+    `max_in_flight` parts are in flight. Memory is then bounded by that many parts.
+
+    Used as a context manager, the upload is completed on a clean exit and aborted
+    if the block raises, so no half-written object or orphaned parts are left behind.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for all requests.
+    bucket_name (str): The name of the destination S3 bucket.
+    key (str): The key of the destination object.
+    part_size (int): The size in bytes of each uploaded part (at least 5 MiB).
+    max_in_flight (int): The number of parts uploaded at the same time. 1 uploads
+                         each part before the write that filled it returns.
+    executor (concurrent.futures.Executor): The pool concurrent parts are uploaded
+                                           on. Defaults to the shared S3 pool.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket_name,
+        key,
+        part_size=DEFAULT_PART_SIZE,
+        max_in_flight=1,
+        executor=None,
+    ):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes.")
+        self.s3 = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = part_size
+        self.max_in_flight = max(max_in_flight, 1)
+        self.executor = executor
+        self.upload_id = None
+        self.parts = []
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._part_count = 0
+        self._pending = deque()
+        self._aborted = False
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        size = memoryview(data).nbytes
+        self._buffer += data
+        self.bytes_written += size
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+        return size
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            response = self.s3.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key
+            )
+            self.upload_id = response["UploadId"]
+        self._part_count += 1
+        if self.max_in_flight == 1:
+            self.parts.append(self._send_part(self._part_count, bytes(body)))
+            return
+        if self.executor is None:
+            self.executor = get_executor()
+        while len(self._pending) >= self.max_in_flight:
+            self.parts.append(self._pending.popleft().result())
+        self._pending.append(
+            self.executor.submit(self._send_part, self._part_count, bytes(body))
+        )
+
+    def _send_part(self, part_number, body):
+        response = self.s3.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            PartNumber=part_number,
+            UploadId=self.upload_id,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def _wait_for_parts(self):
+        """
+        Waits for every part in flight, oldest first, and records it.
+
+        Raises:
+        Exception: The error of the first part that failed to upload.
+        """
+        while self._pending:
+            self.parts.append(self._pending.popleft().result())
+
+    def close(self):
+        """
+        Flushes any buffered data and completes the upload.
+
+        If completing the upload fails, the multipart upload is aborted and the
+        original error is re-raised.
+        """
+        if self.closed:
+            return
+        if self._aborted:
+            super().close()
+            return
+        try:
+            if self.upload_id is None:
+                self.s3.put_object(
+                    Bucket=self.bucket_name, Key=self.key, Body=bytes(self._buffer)
+                )
+            else:
+                if self._buffer:
+                    self._upload_part(self._buffer)
+                self._wait_for_parts()
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={"Parts": self.parts},
+                )
+            self._buffer.clear()
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            super().close()
+
+    def abort(self):
+        """
+        Discards any buffered data and aborts the multipart upload if one was started.
+        """
+        self._aborted = True
+        self._buffer.clear()
+        # Parts still in flight would otherwise be stored after the abort.
+        while self._pending:
+            self._pending.popleft().exception()
+        if self.upload_id is not None:
+            try:
+                self.s3.abort_multipart_upload(
+                    Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id
+                )
+            except Exception as e:
+                logger.error(f"Failed to abort multipart upload: {e}")
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
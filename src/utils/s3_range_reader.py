@@ -0,0 +1,66 @@
+import io
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over an S3 object.
+
+    Every read is served with a ranged GET, so only the requested bytes are
+    downloaded. This gives readers that need random access, such as Parquet's
+    footer-first layout, a file-like view of an object without downloading it.
+
+    Parameters:
+    s3_client (botocore.client.S3): The S3 client used for all requests.
+    bucket_name (str): The name of the S3 bucket where the object is located.
+    key (str): The key of the object.
+    size (int): The size of the object in bytes. Looked up with head_object if not given.
+    """
+
+    def __init__(self, s3_client, bucket_name, key, size=None):
+        super().__init__()
+        self.s3 = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        if size is None:
+            size = s3_client.head_object(Bucket=bucket_name, Key=key)["ContentLength"]
+        self.size = size
+        self.requests = 0
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        if self._position >= self.size or not len(buffer):
+            return 0
+        end = min(self._position + len(buffer), self.size) - 1
+        response = self.s3.get_object(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            Range=f"bytes={self._position}-{end}",
+        )
+        data = response["Body"].read()
+        self.requests += 1
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import time
+
+from src.utils.s3_client import LazyClient
+
+logger = logging.getLogger()
+
+s3 = LazyClient("s3")
+
+tf_state_bucket = "tf-state-gdpr-obfuscator-test"
+tf_state_key = "tf-state"
+
+DEFAULT_CACHE_TTL_SECONDS = 300
+CACHE_TTL_ENV_VAR = "GDPR_STATE_CACHE_TTL"
+BUCKET_ENV_VARS = (
+    "GDPR_INPUT_BUCKET",
+    "GDPR_PROCESSED_BUCKET",
+    "GDPR_INVOCATION_BUCKET",
+)
+
+_cache = {}
+
+
+def clear_bucket_name_cache():
+    """
+    Forgets every cached Terraform state lookup, forcing the next call to fetch it again.
+    """
+    _cache.clear()
+
+
+def get_cache_ttl():
+    """
+    Returns the number of seconds a cached state lookup is trusted before it is
+    revalidated, read from the GDPR_STATE_CACHE_TTL environment variable.
+    """
+    try:
+        return float(os.environ.get(CACHE_TTL_ENV_VAR, DEFAULT_CACHE_TTL_SECONDS))
+    except ValueError:
+        logger.warning(f"Invalid {CACHE_TTL_ENV_VAR}, using the default.")
+        return DEFAULT_CACHE_TTL_SECONDS
+
+
+def _is_not_modified(error):
+    if not hasattr(error, "response"):
+        return False
+    return error.response.get("ResponseMetadata", {}).get(
+        "HTTPStatusCode"
+    ) == 304 or error.response.get("Error", {}).get("Code") in ("304", "NotModified")
+
+
+def _fetch_bucket_names(s3_client, bucket_name, object_key, cached):
+    """
+    Reads the bucket names from the state file, or confirms the cached ones with
+    a conditional GET if an ETag is known. Returns the updated cache entry.
+    """
+    request = {"Bucket": bucket_name, "Key": object_key}
+    if cached and cached["etag"]:
+        request["IfNoneMatch"] = cached["etag"]
+    try:
+        response = s3_client.get_object(**request)
+    except Exception as e:
+        if cached and _is_not_modified(e):
+            return dict(cached, checked_at=time.monotonic())
+        raise
+
+    data = json.loads(response["Body"].read().decode("utf-8"))
+    outputs = data["outputs"]
+    return {
+        "etag": response.get("ETag"),
+        "checked_at": time.monotonic(),
+        "bucket_names": (
+            outputs["gdpr_input_bucket"]["value"],
+            outputs["gdpr_processed_bucket"]["value"],
+            outputs["gdpr_invocation_bucket"]["value"],
+        ),
+    }
+
+
+def get_bucket_names_from_tf_state(
+    bucket_name=tf_state_bucket, object_key=tf_state_key, s3_client=None
+):
+    """
+    Retrieves the names of the input, processed, and invocation buckets from a Terraform state file.
+
+    Each name can be set directly with the GDPR_INPUT_BUCKET, GDPR_PROCESSED_BUCKET
+    and GDPR_INVOCATION_BUCKET environment variables; if all three are set, the state
+    file is not read at all. Otherwise the result is cached at module level, so warm
+    Lambda invocations reuse it. After GDPR_STATE_CACHE_TTL seconds the cache is
+    revalidated with a conditional GET on the state file's ETag, which only
+    downloads and parses the file again if it has changed.
+
+    Parameters:
+    bucket_name (str): The name of the S3 bucket where the Terraform state file is located.
+    object_key (str): The key of the Terraform state file within the specified bucket.
+    s3_client (botocore.client.S3): The S3 client to use. Defaults to this module's client.
+
+    Returns:
+    tuple: A tuple containing the names of the input, processed, and invocation buckets.
+           If an error occurs during retrieval and nothing is cached, returns (None, None, None).
+    """
+    overrides = tuple(os.environ.get(name) for name in BUCKET_ENV_VARS)
+    if all(overrides):
+        return overrides
+
+    cache_key = (bucket_name, object_key)
+    cached = _cache.get(cache_key)
+    if cached is None or time.monotonic() - cached["checked_at"] >= get_cache_ttl():
+        try:
+            cached = _fetch_bucket_names(
+                s3_client or s3, bucket_name, object_key, cached
+            )
+            _cache[cache_key] = cached
+        except Exception as e:
+            if cached is None:
+                logger.error(f"Failed to retrieve bucket names: {e}")
+                return None, None, None
+            logger.warning(f"Failed to revalidate bucket names, using cached: {e}")
+
+    return tuple(
+        override or name for override, name in zip(overrides, cached["bucket_names"])
+    )
@@ -1,51 +1,77 @@
-import boto3
+import argparse
+import glob
 import os
-import json
-from datetime import datetime
+import time
+import uuid
+from datetime import datetime, timezone
 
-from src.utils.processing2 import tf_state_bucket, tf_state_key
-from src.data.create_data import data_file_path
+from src.utils.s3_client import LazyClient
+from src.utils.s3_io import S3IO
+from src.utils.tf_state import (
+    get_bucket_names_from_tf_state,
+    tf_state_bucket,
+    tf_state_key,
+)
+from src.data.paths import data_file_path
+
+s3 = LazyClient("s3")
 
-s3 = boto3.client("s3")
+MB = 1024 * 1024
+DEFAULT_MULTIPART_THRESHOLD_MB = 16
+DEFAULT_PART_SIZE_MB = 16
+DEFAULT_PART_CONCURRENCY = 8
 
 
-def get_bucket_names_from_tf_state(bucket_name, object_key):
+def generate_s3_file_path(local_file_path, name=None):
     """
-    Retrieves the names of the input, processed, and invocation buckets from a Terraform state file.
+    Generates a unique timestamped S3 key for a local file.
+
+    The timestamp is in UTC with microseconds, most significant part first, so
+    keys sort in upload order. A random suffix keeps keys generated in the same
+    microsecond, such as by concurrent uploads, from colliding.
 
     Parameters:
-    bucket_name (str): The name of the S3 bucket where the Terraform state file is located.
-    object_key (str): The key of the Terraform state file within the specified bucket.
+    local_file_path (str): The path to the local file for which the key is generated.
+    name (str): The name to put after the timestamp, such as a path relative to an
+                uploaded directory. Defaults to the file's name.
 
     Returns:
-    tuple: A tuple containing the names of the input, processed, and invocation buckets.
-           If an error occurs during retrieval, returns (None, None, None).
-    """    
-    try:
-        response = s3.get_object(Bucket=bucket_name, Key=object_key)
-        data = json.loads(response["Body"].read().decode("utf-8"))
-        input_bucket_name = data["outputs"]["gdpr_input_bucket"]["value"]
-        processed_bucket_name = data["outputs"]["gdpr_processed_bucket"]["value"]
-        invocation_bucket_name = data["outputs"]["gdpr_invocation_bucket"]["value"]
-        return input_bucket_name, processed_bucket_name, invocation_bucket_name
-    except Exception as e:
-        print(f"Failed to retrieve bucket names: {e}")
-        return None, None, None
-
-
-def generate_s3_file_path(local_file_path):
+    str: The key in the format 'YYYYMMDDTHHMMSSffffffZ_<8 hex digits>_<name>'.
     """
-    Generates a timestamped filename for an S3 object based on the local file's name.
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    name = name or os.path.basename(local_file_path)
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}_{name}"
+
+
+def make_transfer_config(
+    part_size_mb=DEFAULT_PART_SIZE_MB,
+    part_concurrency=DEFAULT_PART_CONCURRENCY,
+    multipart_threshold_mb=DEFAULT_MULTIPART_THRESHOLD_MB,
+):
+    """
+    Builds the transfer settings of each upload.
+
+    Files of at least `multipart_threshold_mb` are sent as a multipart upload with
+    up to `part_concurrency` parts in flight, so one large file is not limited to
+    the throughput of a single connection.
 
     Parameters:
-    local_file_path (str): The path to the local file for which the timestamped filename is being generated.
+    part_size_mb (int): The size of each part in MiB.
+    part_concurrency (int): The parts of one file uploaded at the same time.
+    multipart_threshold_mb (int): The size in MiB from which files are uploaded
+                                  in parts.
 
     Returns:
-    str: The timestamped filename in the format 'YYYY_DD_MM_HH:MM:SS_filename'.
+    boto3.s3.transfer.TransferConfig: The transfer settings.
     """
-    timestamp = datetime.now().strftime("%Y_%d_%m_%H:%M:%S")
-    file_name = os.path.basename(local_file_path)
-    return f"{timestamp}_{file_name}"
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=multipart_threshold_mb * MB,
+        multipart_chunksize=part_size_mb * MB,
+        max_concurrency=part_concurrency,
+        use_threads=part_concurrency > 1,
+    )
 
 
 def upload_file_to_s3(local_file_path, bucket_name):
@@ -71,10 +97,178 @@ def upload_file_to_s3(local_file_path, bucket_name):
     return s3_file_path
 
 
-local_file_path = data_file_path
-input_bucket_name, processed_bucket_name, invocation_bucket_name = (
-    get_bucket_names_from_tf_state(tf_state_bucket, tf_state_key)
-)
+def find_local_files(paths):
+    """
+    Expands files, directories and glob patterns into the files to upload.
+
+    Directories are walked recursively, and each of their files is named by its
+    path relative to the directory, so files with the same name in different
+    subdirectories keep distinct keys.
+
+    Parameters:
+    paths (list): File paths, directory paths or glob patterns such as "data/*.csv".
+
+    Returns:
+    list: (local_file_path, name) tuples, without duplicates, in the order found.
+          Paths that match nothing are left out with an error message.
+    """
+    found = {}
+    for path in paths:
+        matches = [path]
+        if glob.has_magic(path):
+            matches = sorted(glob.glob(path, recursive=True))
+        if not any(os.path.exists(match) for match in matches):
+            print(f"Error: The file {path} does not exist.")
+            continue
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, file_names in os.walk(match):
+                    dirs.sort()
+                    for file_name in sorted(file_names):
+                        local_file_path = os.path.join(root, file_name)
+                        name = os.path.relpath(local_file_path, match)
+                        found.setdefault(local_file_path, name.replace(os.sep, "/"))
+            elif os.path.isfile(match):
+                found.setdefault(match, os.path.basename(match))
+    return list(found.items())
+
+
+def upload_paths(paths, bucket_name, prefix="", transfer_config=None):
+    """
+    Uploads files, directories and glob patterns to an S3 bucket concurrently and
+    times each upload.
+
+    The files are uploaded on the shared S3 thread pool, and each one is split
+    into parts as set by `transfer_config`.
+
+    Parameters:
+    paths (list): File paths, directory paths or glob patterns.
+    bucket_name (str): The name of the S3 bucket where the files will be uploaded.
+    prefix (str): A prefix added to every key, such as "exports/".
+    transfer_config (boto3.s3.transfer.TransferConfig): The transfer settings of
+                                                        each upload. Defaults to
+                                                        make_transfer_config().
+
+    Returns:
+    dict: The report, with one entry in "files" per file holding its
+          "local_file_path", "s3_file_path", "bytes", "seconds" and "status",
+          and any "error", and the total "bytes", wall-clock "seconds",
+          "throughput_mb_s" and number of "failed" files.
+    """
+    transfer_config = transfer_config or make_transfer_config()
+    files = [
+        {
+            "local_file_path": local_file_path,
+            "s3_file_path": prefix + generate_s3_file_path(local_file_path, name),
+            "bytes": os.path.getsize(local_file_path),
+        }
+        for local_file_path, name in find_local_files(paths)
+    ]
+
+    def upload(local_file_path, s3_file_path, **_):
+        started = time.perf_counter()
+        s3.upload_file(
+            local_file_path, bucket_name, s3_file_path, Config=transfer_config
+        )
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = S3IO(s3).map(upload, files, return_exceptions=True)
+    seconds = time.perf_counter() - started
+
+    for result, outcome in zip(files, results):
+        if isinstance(outcome, Exception):
+            result.update(status="failed", seconds=None, error=str(outcome))
+        else:
+            result.update(status="succeeded", seconds=outcome)
+    uploaded = sum(
+        result["bytes"] for result in files if result["status"] == "succeeded"
+    )
+    return {
+        "files": files,
+        "bytes": uploaded,
+        "seconds": seconds,
+        "throughput_mb_s": uploaded / MB / seconds if seconds else 0.0,
+        "failed": sum(1 for result in files if result["status"] == "failed"),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Upload files, directories or glob patterns to an S3 bucket."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[data_file_path],
+        help=f"Files, directories or glob patterns to upload (default {data_file_path}).",
+    )
+    parser.add_argument(
+        "--bucket",
+        help="The bucket to upload to (default: the input bucket in the Terraform state).",
+    )
+    parser.add_argument("--prefix", default="", help="A prefix added to every key.")
+    parser.add_argument(
+        "--part-size-mb",
+        type=int,
+        default=DEFAULT_PART_SIZE_MB,
+        help=f"The size of each multipart part in MiB (default {DEFAULT_PART_SIZE_MB}).",
+    )
+    parser.add_argument(
+        "--part-concurrency",
+        type=int,
+        default=DEFAULT_PART_CONCURRENCY,
+        help="The parts of one file uploaded at the same time "
+        f"(default {DEFAULT_PART_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--multipart-threshold-mb",
+        type=int,
+        default=DEFAULT_MULTIPART_THRESHOLD_MB,
+        help="The size in MiB from which files are uploaded in parts "
+        f"(default {DEFAULT_MULTIPART_THRESHOLD_MB}).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    bucket_name = args.bucket
+    if not bucket_name:
+        bucket_name, _, _ = get_bucket_names_from_tf_state(
+            tf_state_bucket, tf_state_key
+        )
+        if not bucket_name:
+            raise SystemExit(
+                "Failed to retrieve input bucket name. Make sure the buckets have been created."
+            )
+
+    report = upload_paths(
+        args.paths,
+        bucket_name,
+        args.prefix,
+        make_transfer_config(
+            args.part_size_mb, args.part_concurrency, args.multipart_threshold_mb
+        ),
+    )
+    for result in report["files"]:
+        if result["status"] == "succeeded":
+            print(
+                f"Success: File {result['local_file_path']} uploaded to "
+                f"{bucket_name}/{result['s3_file_path']} "
+                f"({result['bytes'] / MB:.2f} MiB in {result['seconds']:.3f}s)"
+            )
+        else:
+            print(f"Error uploading {result['local_file_path']}: {result['error']}")
+    print(
+        f"Uploaded {len(report['files']) - report['failed']} of {len(report['files'])} "
+        f"files, {report['bytes'] / MB:.2f} MiB in {report['seconds']:.3f}s "
+        f"({report['throughput_mb_s']:.2f} MiB/s)"
+    )
+    if report["failed"] or not report["files"]:
+        raise SystemExit(1)
+
 
-if input_bucket_name:
-    s3_file_path = upload_file_to_s3(local_file_path, input_bucket_name)
+if __name__ == "__main__":
+    main()
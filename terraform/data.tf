@@ -16,8 +16,15 @@ data "terraform_remote_state" "gdpr_state" {
 
 data "archive_file" "upload_zip" {
   type        = "zip"
-  source_file = "${path.module}/../src/utils/processing2.py"
   output_path = "${path.module}/../upload.zip"
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../src/utils", "*.py")
+    content {
+      content  = file("${path.module}/../src/utils/${source.value}")
+      filename = "src/utils/${source.value}"
+    }
+  }
 }
 
 
@@ -44,6 +44,18 @@ resource "aws_iam_policy" "lambda_s3_policy" {
           "arn:aws:logs:eu-west-2:*:log-group:/aws/lambda/my_lambda_function:*"
           
         ]
+      },
+      {
+        # Stream and parallel modes write their output as multipart uploads,
+        # and abort them when a file fails.
+        Effect = "Allow",
+        Action = [
+          "s3:AbortMultipartUpload",
+          "s3:ListMultipartUploadParts"
+        ],
+        Resource = [
+          "arn:aws:s3:::${data.terraform_remote_state.gdpr_state.outputs.gdpr_processed_bucket}/*"
+        ]
       }
     ]
   })
@@ -1,16 +1,36 @@
+# Packages the AWS SDK for pandas layer does not include, such as zstandard for
+# .zst files. Run `make layer` before terraform apply to build the directory.
+data "archive_file" "dependencies_layer" {
+  type        = "zip"
+  source_dir  = "${path.module}/../layer"
+  output_path = "${path.module}/../layer.zip"
+}
+
+resource "aws_lambda_layer_version" "dependencies" {
+  layer_name          = "gdpr-obfuscator-dependencies"
+  filename            = data.archive_file.dependencies_layer.output_path
+  source_code_hash    = data.archive_file.dependencies_layer.output_base64sha256
+  compatible_runtimes = ["python3.10"]
+}
+
 resource "aws_lambda_function" "my_lambda" {
     filename         = data.archive_file.upload_zip.output_path
     function_name    = "my_lambda_function"
     role             = aws_iam_role.lambda_role.arn
-    handler          = "processing2.handler"
+    handler          = "src.utils.processing2.handler"
     runtime          = "python3.10"  # check (3.8 wont work with wrangler)
     source_code_hash = filebase64sha256(data.archive_file.upload_zip.output_path)
-    layers           = ["arn:aws:lambda:eu-west-2:336392948345:layer:AWSSDKPandas-Python310:8"]
+    layers           = [
+      "arn:aws:lambda:eu-west-2:336392948345:layer:AWSSDKPandas-Python310:8",
+      aws_lambda_layer_version.dependencies.arn,
+    ]
     memory_size   = 1024
     timeout       = 60
 environment {
     variables = {
-    EXAMPLE_ENV_VAR = "value"
+    GDPR_INPUT_BUCKET      = data.terraform_remote_state.gdpr_state.outputs.gdpr_input_bucket
+    GDPR_PROCESSED_BUCKET  = data.terraform_remote_state.gdpr_state.outputs.gdpr_processed_bucket
+    GDPR_INVOCATION_BUCKET = data.terraform_remote_state.gdpr_state.outputs.gdpr_invocation_bucket
     }
 }
 }
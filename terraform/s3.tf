@@ -8,6 +8,23 @@ resource "aws_s3_bucket" "gdpr_processed_bucket" {
   force_destroy = true
 }
 
+# Parts of a multipart upload that was never completed or aborted, such as one
+# left by a Lambda that timed out, are billed until they are removed.
+resource "aws_s3_bucket_lifecycle_configuration" "gdpr_processed_bucket" {
+  bucket = aws_s3_bucket.gdpr_processed_bucket.id
+
+  rule {
+    id     = "abort-incomplete-multipart-uploads"
+    status = "Enabled"
+
+    filter {}
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+}
+
 resource "aws_s3_bucket" "gdpr_invocation_bucket" {
   bucket_prefix = "gdpr-invocation-"
   force_destroy = true
@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_bucket_name_cache(monkeypatch):
+    """
+    Stops cached Terraform state lookups and bucket overrides leaking between tests.
+    The module is imported here rather than at the top of the file so that it, and
+    its S3 client, are created after the test modules have imported moto.
+    """
+    from src.utils.tf_state import BUCKET_ENV_VARS, clear_bucket_name_cache
+
+    for name in BUCKET_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    clear_bucket_name_cache()
+    yield
+    clear_bucket_name_cache()
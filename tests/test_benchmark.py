@@ -0,0 +1,87 @@
+import json
+import pytest
+
+from benchmarks.benchmark import (
+    build_dataset,
+    compare_results,
+    run_case,
+)
+from src.utils.metrics import STAGES
+
+
+@pytest.fixture
+def small_dataset(tmp_path):
+    return build_dataset(32 * 1024, 10, str(tmp_path), base_rows=50)
+
+
+def test_build_dataset_repeats_base_rows(small_dataset, tmp_path):
+    with open(small_dataset["path"]) as f:
+        lines = f.read().splitlines()
+
+    header = lines[0].split(",")
+    assert len(header) == 10
+    assert header[-2:] == ["Extra 9", "Extra 10"]
+    assert small_dataset["rows"] == len(lines) - 1 > 50
+    assert small_dataset["bytes"] >= 32 * 1024
+    user_ids = [int(line.split(",")[0]) for line in lines[1:]]
+    assert len(set(user_ids)) == len(user_ids)
+    assert build_dataset(32 * 1024, 10, str(tmp_path)) == small_dataset
+
+
+@pytest.mark.parametrize(
+    "target",
+    [
+        "obfuscate_pii:pandas",
+        "obfuscate_pii:splice",
+        "obfuscate_pii:pyarrow",
+        "obfuscate_pii:csv",
+        "obfuscate_pii:auto",
+        "handler:memory",
+        "handler:stream",
+    ],
+)
+def test_run_case_measures_target(small_dataset, target):
+    result = run_case(small_dataset, target)
+
+    assert result["ok"]
+    assert result["seconds"] > 0
+    assert result["rows_per_s"] == pytest.approx(
+        small_dataset["rows"] / result["seconds"]
+    )
+    assert result["peak_rss_mb"] > 0
+    stage = "upload" if target.startswith("handler") else "download"
+    assert result["stages"][stage] > 0
+    json.dumps(result)
+
+
+def test_run_case_times_stream_parse_from_metrics(small_dataset):
+    result = run_case(small_dataset, "handler:stream")
+
+    assert set(result["stages"]) == set(STAGES) | {"other"}
+    assert result["stages"]["parse"] > 0
+    assert result["stages"]["serialise"] > 0
+
+
+def test_compare_results():
+    def report(seconds):
+        return {
+            "results": [
+                {
+                    "dataset": {"name": "1MB_8cols"},
+                    "target": "handler:memory",
+                    "seconds": seconds,
+                }
+            ]
+        }
+
+    comparison = compare_results(report(2.0), report(1.5))
+
+    assert comparison == [
+        {
+            "dataset": "1MB_8cols",
+            "target": "handler:memory",
+            "baseline": 2.0,
+            "current": 1.5,
+            "change": -0.25,
+        }
+    ]
@@ -0,0 +1,133 @@
+import bz2
+import gzip
+import io
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from src.utils.compression import (
+    PrefixedReader,
+    compress_bytes,
+    decompress_bytes,
+    decompress_prefix,
+    detect_compression,
+    iter_compressed,
+    iter_read,
+    open_decompressed,
+    resolve_compression,
+    strip_compression_extension,
+)
+
+CSV = b"name,email\n" + b"John,john@example.com\n" * 10000
+
+
+@pytest.mark.parametrize(
+    "path, head, expected",
+    [
+        ("data.csv.gz", None, "gzip"),
+        ("data.CSV.GZ", None, "gzip"),
+        ("data.csv.bz2", None, "bz2"),
+        ("data.csv.zst", None, "zstd"),
+        ("data.csv", gzip.compress(b"a"), "gzip"),
+        ("data", bz2.compress(b"a"), "bz2"),
+        ("data", b"\x28\xb5\x2f\xfd\x00", "zstd"),
+        ("data.csv", b"name", None),
+        ("data.csv", None, None),
+    ],
+)
+def test_detect_compression(path, head, expected):
+    assert detect_compression(path, head) == expected
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("data.csv.gz", "data.csv"),
+        ("exports/users.jsonl.bz2", "exports/users.jsonl"),
+        ("data.csv", "data.csv"),
+    ],
+)
+def test_strip_compression_extension(path, expected):
+    assert strip_compression_extension(path) == expected
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bz2", "zstd"])
+def test_compressed_chunks_round_trip(compression):
+    chunks = [CSV[start : start + 1000] for start in range(0, len(CSV), 1000)]
+
+    compressed = b"".join(iter_compressed(chunks, compression))
+
+    assert len(compressed) < len(CSV)
+    assert decompress_bytes(compressed, compression) == CSV
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bz2", "zstd"])
+def test_open_decompressed_detects_magic_bytes_and_streams(compression):
+    reader, detected = open_decompressed(
+        io.BytesIO(compress_bytes(CSV, compression)), "data"
+    )
+
+    blocks = list(iter_read(reader, 4096))
+
+    assert detected == compression
+    assert max(len(block) for block in blocks) <= 4096
+    assert b"".join(blocks) == CSV
+
+
+def test_open_decompressed_passes_plain_input_through():
+    reader, detected = open_decompressed(io.BytesIO(CSV), "data.csv")
+
+    assert detected is None
+    assert reader.read(2) == b"na"
+    assert reader.read() == CSV[2:]
+
+
+def test_concatenated_gzip_members_are_decompressed():
+    data = gzip.compress(b"name\nJohn\n") + gzip.compress(b"Jane\n")
+
+    assert decompress_bytes(data, "gzip") == b"name\nJohn\nJane\n"
+
+
+def test_prefixed_reader_replays_head():
+    reader = PrefixedReader(b"abc", io.BytesIO(b"defgh"))
+
+    assert reader.read(2) == b"ab"
+    assert reader.read(3) == b"cde"
+    assert reader.read() == b"fgh"
+    assert reader.read(1) == b""
+
+
+def test_uncompressed_output_is_unchanged():
+    assert compress_bytes(CSV, None) == CSV
+    assert list(iter_compressed([b"a", b"b"], None)) == [b"a", b"b"]
+
+
+@pytest.mark.parametrize("compression", [None, "none", "gzip", "bz2", "zstd"])
+def test_resolve_compression(compression):
+    expected = None if compression == "none" else compression
+    assert resolve_compression(compression) == expected
+
+
+def test_resolve_compression_rejects_unknown_codec():
+    with pytest.raises(ValueError, match="Unknown compression"):
+        resolve_compression("lzma")
+
+
+def test_zstd_needs_zstandard_package():
+    with patch.dict(sys.modules, {"zstandard": None}):
+        with pytest.raises(ValueError, match="zstandard"):
+            resolve_compression("zstd")
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bz2"])
+def test_decompress_prefix_of_truncated_data(compression):
+    data = CSV * 10
+    compressed = compress_bytes(data, compression)
+
+    prefix = decompress_prefix(compressed[: len(compressed) // 2], compression)
+
+    assert 0 < len(prefix) < len(data)
+    assert data.startswith(prefix)
+    assert decompress_prefix(compressed, compression) == data
+    assert decompress_prefix(compressed * 2, compression) == data * 2
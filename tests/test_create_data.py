@@ -0,0 +1,113 @@
+import csv
+
+import pytest
+
+from src.data.create_data import (
+    DEFAULT_SCHEMA,
+    GENERATORS,
+    generate_data,
+    main,
+    parse_schema,
+    parse_size,
+    write_csv,
+)
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("512", 512),
+        ("512B", 512),
+        ("64KB", 64 * 1024),
+        ("1MB", 1024**2),
+        ("1.5mb", int(1.5 * 1024**2)),
+        ("2GB", 2 * 1024**3),
+    ],
+)
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+def test_parse_schema():
+    assert parse_schema("User ID:id, Email Address:email,phone") == (
+        ("User ID", "id"),
+        ("Email Address", "email"),
+        ("phone", "phone"),
+    )
+    with pytest.raises(ValueError, match="Unknown column type: salary"):
+        parse_schema("Pay:salary")
+
+
+def test_write_csv_rows(tmp_path):
+    result = write_csv(str(tmp_path / "data.csv"), rows=25_001, seed=1)
+
+    rows = read_rows(result["path"])
+    assert rows[0] == [name for name, _ in DEFAULT_SCHEMA]
+    assert len(rows) == 25_002 == result["rows"] + 1
+    assert all(len(row) == len(DEFAULT_SCHEMA) for row in rows)
+    assert [int(row[0]) for row in rows[1:]] == list(range(1001, 26002))
+    assert {row[6] for row in rows[1:]} == {"Male", "Female"}
+    assert all("@" in row[3] for row in rows[1:])
+    assert result["bytes"] == (tmp_path / "data.csv").stat().st_size
+
+
+def test_write_csv_size(tmp_path):
+    result = write_csv(str(tmp_path / "data.csv"), size=2 * 1024**2, seed=1)
+
+    assert result["bytes"] == pytest.approx(2 * 1024**2, rel=0.02)
+
+
+def test_write_csv_is_reproducible_however_it_is_split(tmp_path):
+    schema = parse_schema(",".join(GENERATORS))
+    first = write_csv(str(tmp_path / "a.csv"), rows=30_000, schema=schema, seed=7)
+    second = write_csv(
+        str(tmp_path / "b.csv"),
+        rows=30_000,
+        schema=schema,
+        seed=7,
+        chunk_rows=1,
+        processes=2,
+    )
+    third = write_csv(str(tmp_path / "c.csv"), rows=30_000, schema=schema, seed=8)
+
+    a = (tmp_path / "a.csv").read_bytes()
+    assert a == (tmp_path / "b.csv").read_bytes()
+    assert a != (tmp_path / "c.csv").read_bytes()
+    assert first["seed"] == second["seed"] == 7 != third["seed"]
+
+
+def test_generate_data():
+    df = generate_data(100, seed=3)
+
+    assert list(df.columns) == [name for name, _ in DEFAULT_SCHEMA]
+    assert len(df) == 100
+    assert df["User ID"].tolist() == list(range(1001, 1101))
+    assert df.equals(generate_data(100, seed=3))
+
+
+def test_main(tmp_path, capsys):
+    path = tmp_path / "out" / "data.csv"
+
+    main(
+        [
+            "--rows",
+            "10",
+            "--seed",
+            "2",
+            "--schema",
+            "Name:name,Phone:phone",
+            "--output",
+            str(path),
+        ]
+    )
+
+    rows = read_rows(path)
+    assert rows[0] == ["Name", "Phone"]
+    assert len(rows) == 11
+    assert all(len(row[1]) == 11 and row[1].startswith("07") for row in rows[1:])
+    assert "Data saved to" in capsys.readouterr().out
@@ -0,0 +1,125 @@
+import io
+
+import pytest
+
+from src.utils.csv_engines import (
+    frame_to_csv,
+    header_columns,
+    iter_csv_frames,
+    iter_masked_rows,
+    iter_record_blocks,
+    iter_text_lines,
+    mask_csv_rows,
+    peek_header,
+    read_csv_frame,
+)
+from src.utils.masking import build_masking_plan, mask_dataframe
+
+CSV = b'id,name,note\n007,"Smith, John",1.50\n008,,NA\n009,Jane,"say ""hi""\nbye"\n'
+MASKED = b'id,name,note\n007,***,1.50\n008,***,NA\n009,***,"say ""hi""\nbye"\n'
+
+
+def mask_frames(frames, plan, engine):
+    output = []
+    for number, df in enumerate(frames):
+        mask_dataframe(df, plan)
+        output.append(frame_to_csv(df, engine, header=number == 0))
+    return b"".join(output)
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"id,name\n1,John\n", ["id", "name"]),
+        (b'id,"last, first"', ["id", "last, first"]),
+        (b"\xef\xbb\xbfid,name\r\n", ["id", "name"]),
+        (b"", []),
+    ],
+    ids=["plain", "quoted_no_newline", "bom_crlf", "empty"],
+)
+def test_header_columns(data, expected):
+    assert header_columns(data) == expected
+
+
+def test_peek_header_replays_the_stream():
+    columns, stream = peek_header(io.BytesIO(CSV))
+
+    assert columns == ["id", "name", "note"]
+    assert stream.read() == CSV
+
+
+def test_pyarrow_engine_keeps_values_as_text():
+    plan = build_masking_plan(["name"])
+    df = read_csv_frame(CSV, plan, "pyarrow")
+    mask_dataframe(df, plan)
+
+    assert frame_to_csv(df, "pyarrow") == MASKED
+
+
+def test_pandas_engine_infers_types():
+    plan = build_masking_plan(["name"])
+    df = read_csv_frame(b"id,name\n007,John\n", plan, "pandas")
+    mask_dataframe(df, plan)
+
+    assert frame_to_csv(df, "pandas") == b"id,name\n7,***\n"
+
+
+@pytest.mark.parametrize("block_size", [32, 1024 * 1024])
+def test_pyarrow_frames_match_whole_file(block_size):
+    plan = build_masking_plan(["name"])
+    frames = iter_csv_frames(io.BytesIO(CSV), plan, "pyarrow", block_size=block_size)
+
+    assert mask_frames(frames, plan, "pyarrow") == MASKED
+
+
+@pytest.mark.parametrize("block_size", [1, 8, 32, 1024])
+def test_iter_record_blocks_end_at_records(block_size):
+    blocks = list(iter_record_blocks(io.BytesIO(CSV), block_size))
+
+    assert b"".join(blocks) == CSV
+    for block in blocks:
+        assert block.endswith(b"\n")
+        assert block.count(b'"') % 2 == 0
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_header_only_stream_keeps_header(engine):
+    plan = build_masking_plan(["name"])
+    frames = iter_csv_frames(io.BytesIO(b"id,name\n"), plan, engine)
+
+    assert mask_frames(frames, plan, engine) == b"id,name\n"
+
+
+def test_pyarrow_engine_quotes_column_names():
+    plan = build_masking_plan(["name"])
+    df = read_csv_frame(b'id,"a,b"\n1,2\n', plan, "pyarrow")
+
+    assert frame_to_csv(df, "pyarrow") == b'id,"a,b"\n1,2\n'
+
+
+def test_iter_text_lines_splits_characters_across_chunks():
+    data = "name\nJosé\nZoë\n".encode("utf-8")
+    chunks = [data[i : i + 1] for i in range(len(data))]
+
+    assert list(iter_text_lines(chunks)) == ["name\n", "José\n", "Zoë\n"]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 100])
+def test_csv_engine_masks_streamed_rows(chunk_rows):
+    chunks = [CSV[i : i + 7] for i in range(0, len(CSV), 7)]
+
+    masked = iter_masked_rows(iter_text_lines(chunks), ["name"], chunk_rows)
+
+    assert b"".join(masked) == MASKED
+
+
+def test_csv_engine_masks_bytes():
+    assert mask_csv_rows(b"\xef\xbb\xbf" + CSV, ["name"]) == MASKED
+
+
+def test_csv_engine_keeps_short_rows():
+    assert mask_csv_rows(b"id,name\n1\n2,John\n", ["name"]) == b"id,name\n1\n2,***\n"
+
+
+def test_csv_engine_empty_input():
+    assert mask_csv_rows(b"", ["name"]) == b""
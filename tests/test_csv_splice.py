@@ -0,0 +1,180 @@
+import io
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.utils.csv_splice import (
+    encode_replacement,
+    iter_masked_csv,
+    mask_csv_bytes,
+    mask_csv_file,
+    split_records,
+    write_vectored,
+)
+
+MAPPED_CSV_CASES = [
+    (b"name,email\nJohn,john@example.com", ["email"]),
+    (b"id,name,email\n1,John\n\n2,Jane,jane@example.com\n", ["id", "email"]),
+    (
+        b'id,name,note\n1,"Smith, John","said ""hi""\nthen left"\n2,Jane,ok\n'
+        b"3,Jim,fine\n",
+        ["name", "note"],
+    ),
+    (b'id,note,name\r\n1,"a,b",John\r\n2,,Jane\r\n', ["name"]),
+    (b"name\r\nJohn\r\n\r\nJane\r\n", ["name"]),
+    (b"a,b,c\n" + b"1,22,333\n" * 50 + b'4,"5\n5",6\n' + b"7,8,9\n" * 50, ["b"]),
+    (b"name,email\nJohn,john@example.com\n", ["nonexistent"]),
+    (b"id,name,email", ["name"]),
+    (b"", ["name"]),
+]
+
+
+@pytest.mark.parametrize(
+    "csv_content, pii_fields, expected_output",
+    [
+        (
+            b"name,email\nJohn,john@example.com",
+            ["email"],
+            b"name,email\nJohn,***",
+        ),
+        (
+            b"name,email,phone\nJohn,john@example.com,1234567890\n",
+            ["email", "phone"],
+            b"name,email,phone\nJohn,***,***\n",
+        ),
+        (
+            b"name,email\nJohn,john@example.com\n",
+            [],
+            b"name,email\nJohn,john@example.com\n",
+        ),
+        (
+            b"name,email\nJohn,john@example.com\n",
+            ["nonexistent"],
+            b"name,email\nJohn,john@example.com\n",
+        ),
+        (
+            b"id,name,score\n007,John,1.50\n",
+            ["name"],
+            b"id,name,score\n007,***,1.50\n",
+        ),
+        (
+            b'id,name,note\n1,"Smith, John","said ""hi""\nthen left"\n2,Jane,ok\n',
+            ["name"],
+            b'id,name,note\n1,***,"said ""hi""\nthen left"\n2,***,ok\n',
+        ),
+        (
+            b'id,note,name\r\n1,"a,b",John\r\n2,,Jane\r\n',
+            ["name"],
+            b'id,note,name\r\n1,"a,b",***\r\n2,,***\r\n',
+        ),
+        (
+            b"id,name,email\n1,John\n\n2,Jane,jane@example.com\n",
+            ["email"],
+            b"id,name,email\n1,John\n\n2,Jane,***\n",
+        ),
+        (
+            b"name\r\nJohn\r\n\r\nJane\r\n",
+            ["name"],
+            b"name\r\n***\r\n\r\n***\r\n",
+        ),
+    ],
+    ids=[
+        "single_pii_field",
+        "multiple_pii_fields",
+        "no_pii_fields",
+        "pii_field_not_in_csv",
+        "non_pii_values_unchanged",
+        "quoted_fields_with_newlines",
+        "crlf_line_endings",
+        "short_and_blank_rows",
+        "crlf_blank_row",
+    ],
+)
+def test_mask_csv_bytes(csv_content, pii_fields, expected_output):
+    assert mask_csv_bytes(csv_content, pii_fields) == expected_output
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_iter_masked_csv_is_independent_of_chunk_boundaries(chunk_size):
+    csv_content = (
+        b'id,name,note\r\n1,"Smith, John","said ""hi""\nthen left"\r\n'
+        b"2,Jane,ok\r\n3,Jim,\r\n"
+    )
+    chunks = [
+        csv_content[start : start + chunk_size]
+        for start in range(0, len(csv_content), chunk_size)
+    ]
+
+    result = b"".join(iter_masked_csv(chunks, ["name", "note"]))
+
+    assert result == mask_csv_bytes(csv_content, ["name", "note"])
+    assert result == b"id,name,note\r\n1,***,***\r\n2,***,***\r\n3,***,***\r\n"
+
+
+def test_split_records_keeps_incomplete_record():
+    records, remainder = split_records(b'a,b\n1,"x\ny"\n2,"open\n')
+
+    assert records == [b"a,b", b'1,"x\ny"']
+    assert remainder == b'2,"open\n'
+
+
+@pytest.mark.parametrize(
+    "replacement, expected",
+    [("***", b"***"), (b"[redacted]", b"[redacted]"), ("a,b", b'"a,b"'), ('x"y', b'"x""y"')],
+)
+def test_encode_replacement(replacement, expected):
+    assert encode_replacement(replacement) == expected
+
+
+def test_mask_csv_bytes_custom_replacement():
+    result = mask_csv_bytes(b"name,email\nJohn,j@example.com\n", ["name"], "N/A, hidden")
+
+    assert result == b'name,email\n"N/A, hidden",j@example.com\n'
+
+
+def test_mask_csv_bytes_matches_pandas_on_dummy_data():
+    with open("src/data/dummy_data_large.csv", "rb") as csv_file:
+        csv_content = csv_file.read()
+    pii_fields = ["Name", "Email Address", "Sex", "DOB"]
+
+    df = pd.read_csv(io.BytesIO(csv_content))
+    for pii_field in pii_fields:
+        df[pii_field] = "***"
+
+    assert mask_csv_bytes(csv_content, pii_fields) == df.to_csv(index=False).encode(
+        "utf-8"
+    )
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 64, 4096])
+@pytest.mark.parametrize("csv_content, pii_fields", MAPPED_CSV_CASES)
+def test_mask_csv_file_matches_mask_csv_bytes(
+    tmp_path, csv_content, pii_fields, block_size
+):
+    source = tmp_path / "input.csv"
+    source.write_bytes(csv_content)
+    output = tmp_path / "output.csv"
+
+    bytes_written = mask_csv_file(
+        str(source), str(output), pii_fields, block_size=block_size
+    )
+
+    expected = mask_csv_bytes(csv_content, pii_fields) if csv_content else b""
+    assert output.read_bytes() == expected
+    assert bytes_written == len(expected)
+
+
+def test_write_vectored_resumes_partial_writes(tmp_path):
+    path = tmp_path / "output"
+    real_writev = os.writev
+
+    def short_writev(fd, buffers):
+        return real_writev(fd, [bytes(buffers[0])[:2]])
+
+    with open(path, "wb") as output, patch("os.writev", side_effect=short_writev):
+        bytes_written = write_vectored(output.fileno(), [b"abc", memoryview(b"defg")])
+
+    assert bytes_written == 7
+    assert path.read_bytes() == b"abcdefg"
@@ -0,0 +1,116 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.utils.idempotency import (
+    config_hash,
+    find_output,
+    index_key,
+    invocation_index_key,
+    normalise_etag,
+    record_output,
+)
+
+
+@pytest.fixture
+def mock_processed_bucket():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="processed-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3
+
+
+def test_normalise_etag():
+    assert normalise_etag('"abc"') == "abc"
+    assert normalise_etag("abc") == "abc"
+    assert normalise_etag(None) == ""
+
+
+def test_config_hash_ignores_unrelated_fields():
+    settings = {"pii_fields": ["email"], "strategy": "redact"}
+
+    assert config_hash(settings) == config_hash(
+        {**settings, "bucket_name": "other", "s3_file_path": "other.csv"}
+    )
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"pii_fields": ["email", "name"]},
+        {"strategy": "hmac"},
+        {"engine": "splice"},
+        {"mode": "stream"},
+        {"output_compression": "gzip"},
+    ],
+)
+def test_config_hash_changes_with_settings(change, monkeypatch):
+    monkeypatch.setenv("GDPR_HMAC_KEY", "secret")
+    settings = {"pii_fields": ["email"]}
+
+    assert config_hash(settings) != config_hash({**settings, **change})
+
+
+def test_config_hash_default_mode():
+    settings = {"pii_fields": ["email"]}
+
+    assert config_hash(settings) == config_hash({**settings, "mode": "memory"})
+
+
+def test_config_hash_changes_with_hmac_key(monkeypatch):
+    settings = {"pii_fields": ["email"], "strategy": "hmac"}
+    monkeypatch.setenv("GDPR_HMAC_KEY", "first")
+    first = config_hash(settings)
+    monkeypatch.setenv("GDPR_HMAC_KEY", "second")
+
+    assert config_hash(settings) != first
+
+
+def test_index_key_depends_on_etag():
+    first = index_key("input", "data.csv", '"a"', "digest", "processed/data.csv")
+
+    assert first.startswith("index/")
+    assert first == index_key("input", "data.csv", "a", "digest", "processed/data.csv")
+    assert first != index_key("input", "data.csv", "b", "digest", "processed/data.csv")
+    assert invocation_index_key("input", "job.json", "a").startswith(
+        "index/invocations/"
+    )
+
+
+def test_find_output_without_entry(mock_processed_bucket):
+    assert find_output(mock_processed_bucket, "processed-bucket", "index/x.json") is None
+
+
+def test_record_then_find_output(mock_processed_bucket):
+    s3 = mock_processed_bucket
+    s3.put_object(Bucket="processed-bucket", Key="processed/data.csv", Body=b"abc")
+
+    record_output(
+        s3,
+        "processed-bucket",
+        "index/x.json",
+        "processed/data.csv",
+        {"s3_file_path": "data.csv"},
+    )
+
+    entry = s3.get_object(Bucket="processed-bucket", Key="index/x.json")
+    assert entry["Metadata"] == {"output-key": "processed/data.csv"}
+    body = json.loads(entry["Body"].read())
+    assert body["s3_file_path"] == "data.csv"
+    assert body["output_key"] == "processed/data.csv"
+    assert find_output(s3, "processed-bucket", "index/x.json") == {
+        "output_key": "processed/data.csv",
+        "bytes_written": 3,
+    }
+
+
+def test_find_output_with_removed_output(mock_processed_bucket):
+    s3 = mock_processed_bucket
+    record_output(s3, "processed-bucket", "index/x.json", "processed/data.csv", {})
+
+    assert find_output(s3, "processed-bucket", "index/x.json") is None
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Cold-start import budget of each entry point, in seconds. Measured at about
+# 0.05s for the Lambda handler and 0.02s for create_json_payload and upload; the
+# margin absorbs slow CI machines.
+IMPORT_BUDGETS = {
+    "src.utils.processing2": 0.5,
+    "src.utils.create_json_payload": 0.5,
+    "src.utils.upload": 0.5,
+}
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "boto3", "botocore")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module):
+    """Imports a module in a fresh interpreter, as on a cold start."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        capture_output=True,
+        check=True,
+        cwd=ROOT,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS))
+def test_entry_point_does_not_import_heavy_modules(module):
+    loaded = measure_import(module)["modules"]
+
+    assert [name for name in HEAVY_MODULES if name in loaded] == []
+
+
+@pytest.mark.parametrize("module, budget", sorted(IMPORT_BUDGETS.items()))
+def test_entry_point_import_time_budget(module, budget):
+    best = min(measure_import(module)["seconds"] for _ in range(3))
+
+    assert best < budget
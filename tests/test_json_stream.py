@@ -0,0 +1,130 @@
+import json
+import pytest
+
+from src.utils.json_stream import (
+    is_json,
+    iter_masked_json,
+    iter_masked_json_array,
+    iter_masked_json_lines,
+    parse_field_path,
+)
+
+RECORDS = [
+    {"user": {"contact": {"email": "john@example.com", "phone": "1"}, "name": "Zoë"}},
+    {"id": 2},
+    {"user": {"contact": [{"email": "nested@example.com"}]}},
+    {"orders": [{"card": "4111"}, {"card": "5500"}]},
+    3,
+    "text",
+]
+PII_FIELDS = ["user.contact.email", "$.user['name']", "orders[*].card"]
+EXPECTED = [
+    {"user": {"contact": {"email": "***", "phone": "1"}, "name": "***"}},
+    {"id": 2},
+    {"user": {"contact": [{"email": "nested@example.com"}]}},
+    {"orders": [{"card": "***"}, {"card": "***"}]},
+    3,
+    "text",
+]
+
+
+def split_chunks(data, size):
+    return [data[start : start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize(
+    "path, expected_steps",
+    [
+        ("user.contact.email", ("user", "contact", "email")),
+        ("$.user.contact.email", ("user", "contact", "email")),
+        ("$['user'][\"contact\"].email", ("user", "contact", "email")),
+        ("orders[*].card", ("orders", "*", "card")),
+        ("orders[0].card", ("orders", 0, "card")),
+        ("email", ("email",)),
+    ],
+)
+def test_parse_field_path(path, expected_steps):
+    assert parse_field_path(path) == expected_steps
+
+
+@pytest.mark.parametrize("path", ["", "$", "user..email", "orders[x]"])
+def test_parse_field_path_invalid(path):
+    with pytest.raises(ValueError):
+        parse_field_path(path)
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [("a.json", True), ("a.JSONL", True), ("a.ndjson", True), ("a.csv", False)],
+)
+def test_is_json(path, expected):
+    assert is_json(path) is expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_masked_json_lines_is_chunk_size_invariant(chunk_size):
+    data = b"\n".join(json.dumps(record).encode("utf-8") for record in RECORDS)
+
+    result = b"".join(
+        iter_masked_json_lines(split_chunks(data, chunk_size), PII_FIELDS)
+    )
+
+    assert [json.loads(line) for line in result.split(b"\n")] == EXPECTED
+
+
+def test_iter_masked_json_lines_copies_unchanged_lines_verbatim():
+    data = b'{"id":  1,   "name": "x"}\r\n\n{"user": {"name": "John"}}\n'
+
+    result = b"".join(iter_masked_json_lines([data], ["user.name"]))
+
+    assert result == b'{"id":  1,   "name": "x"}\r\n\n{"user":{"name":"***"}}\n'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2], ids=["compact", "indented"])
+def test_iter_masked_json_array_is_chunk_size_invariant(chunk_size, indent):
+    data = json.dumps(RECORDS, indent=indent, ensure_ascii=False).encode("utf-8")
+
+    result = b"".join(
+        iter_masked_json_array(split_chunks(data, chunk_size), PII_FIELDS)
+    )
+
+    assert json.loads(result) == EXPECTED
+
+
+def test_iter_masked_json_array_copies_unchanged_elements_verbatim():
+    data = b'[{"id": 1}, {"name": "John"} ,\n 2]'
+
+    result = b"".join(iter_masked_json_array([data], ["name"]))
+
+    assert result == b'[{"id": 1},{"name":"***"},2]'
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ ]  ", b"\xef\xbb\xbf[]"])
+def test_iter_masked_json_array_empty(data):
+    assert b"".join(iter_masked_json_array([data], ["name"])) == b"[]"
+
+
+@pytest.mark.parametrize("data", [b"[1, 2", b"[1 2]", b"{}", b"[1,]"])
+def test_iter_masked_json_array_malformed(data):
+    with pytest.raises(ValueError):
+        b"".join(iter_masked_json_array(split_chunks(data, 1), ["name"]))
+
+
+@pytest.mark.parametrize(
+    "path, data",
+    [
+        ("data.jsonl", b'{"name": "John"}\n{"name": "Jane"}\n'),
+        ("data.json", b'{"name": "John"}\n{"name": "Jane"}\n'),
+        ("data.json", b'[{"name": "John"}, {"name": "Jane"}]'),
+        ("data.json", b'{\n  "rows": [{"name": "John"}],\n  "name": "Jane"\n}'),
+    ],
+    ids=["json_lines", "json_lines_with_json_extension", "array", "document"],
+)
+def test_iter_masked_json_detects_format(path, data):
+    result = b"".join(
+        iter_masked_json(split_chunks(data, 4), path, ["name", "rows[*].name"])
+    )
+
+    assert b"John" not in result
+    assert b"Jane" not in result
@@ -0,0 +1,122 @@
+import pandas as pd
+import pytest
+
+from src.utils.masking import (
+    STRATEGIES,
+    build_masking_plan,
+    is_redact_only,
+    mask_dataframe,
+    needs_key,
+    read_dtypes,
+)
+from src.utils.pseudonymise import pseudonymise_value
+
+
+@pytest.mark.parametrize(
+    "strategy, options, values, expected",
+    [
+        ("redact", {}, ["John", None], ["***", "***"]),
+        (
+            "email_domain",
+            {},
+            ["john@example.net", "no-domain", "a@b@c.org", None],
+            ["***@example.net", "***", "***@c.org", None],
+        ),
+        (
+            "keep_last",
+            {"n": 4},
+            ["4111111111111111", "123", "Zoë1234", None],
+            ["************1111", "123", "***1234", None],
+        ),
+        ("keep_last", {"n": 0}, ["abc"], ["***"]),
+        ("preserve_length", {}, ["John", "Zoë", "", None], ["****", "***", "", None]),
+        (
+            "year",
+            {},
+            ["1990-05-12", "2001-12-31", "not a date", None],
+            ["1990", "2001", "***", None],
+        ),
+        (
+            "year",
+            {},
+            [
+                "1990-05-12T10:00:00",
+                "12/05/1991",
+                "May 12, 1992",
+                "31.12.1985",
+                "1993-05-12T00:30:00+02:00",
+                "1994-06-01 10:00:00-05:00",
+                "1990-13-45",
+                "",
+            ],
+            ["1990", "***", "***", "***", "1993", "1994", "***", "***"],
+        ),
+        ("null", {}, ["John", "Jane"], [None, None]),
+    ],
+)
+def test_strategy_kernels(strategy, options, values, expected):
+    df = pd.DataFrame(
+        {"field": pd.Series(values, dtype=object), "id": range(len(values))}
+    )
+
+    mask_dataframe(df, {"field": (strategy, options)})
+
+    result = [None if pd.isna(value) else value for value in df["field"]]
+    assert result == expected
+    assert df["id"].tolist() == list(range(len(values)))
+
+
+def test_hmac_strategy_uses_key_and_cache():
+    df = pd.DataFrame({"email": ["a@example.com", "b@example.com", "a@example.com"]})
+    caches = {}
+
+    mask_dataframe(df, {"email": ("hmac", {})}, key=b"key", caches=caches)
+
+    assert df["email"][0] == df["email"][2] == pseudonymise_value("a@example.com", b"key")
+    assert len(caches["email"]) == 2
+
+
+def test_build_masking_plan_per_field_strategies(caplog):
+    plan = build_masking_plan(
+        ["name", "email", "card"],
+        strategies={
+            "email": "email_domain",
+            "card": {"name": "keep_last", "n": 2},
+            "other": "null",
+        },
+    )
+
+    assert plan == {
+        "name": ("redact", {}),
+        "email": ("email_domain", {}),
+        "card": ("keep_last", {"n": 2}),
+    }
+    assert "Strategy given for 'other'" in caplog.text
+    assert not is_redact_only(plan)
+    assert not needs_key(plan)
+    assert read_dtypes(plan) == {"email": str, "card": str}
+
+
+@pytest.mark.parametrize("spec", ["unknown", {"n": 4}, {"name": "nope"}])
+def test_build_masking_plan_unknown_strategy(spec):
+    with pytest.raises(ValueError, match="Unknown strategy"):
+        build_masking_plan(["name"], strategies={"name": spec})
+
+
+def test_redact_only_plan_reads_default_dtypes():
+    plan = build_masking_plan(["name", "email"])
+
+    assert is_redact_only(plan)
+    assert read_dtypes(plan) is None
+
+
+def test_every_registered_strategy_is_tested():
+    assert set(STRATEGIES) == {
+        "redact",
+        "null",
+        "hmac",
+        "email_domain",
+        "keep_last",
+        "preserve_length",
+        "year",
+    }
@@ -0,0 +1,169 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from src.utils import metrics
+from src.utils.metrics import InvocationMetrics
+
+
+def test_nested_stages_are_timed_exclusively():
+    collector = InvocationMetrics()
+    with collector.stage("upload"):
+        time.sleep(0.02)
+        with collector.stage("mask"):
+            time.sleep(0.05)
+
+    assert collector.durations["mask"] >= 0.05
+    assert 0.02 <= collector.durations["upload"] < 0.05
+
+
+def test_stages_accumulate():
+    collector = InvocationMetrics()
+    for _ in range(3):
+        with collector.stage("mask"):
+            time.sleep(0.01)
+
+    assert collector.durations["mask"] >= 0.03
+
+
+def test_stage_is_recorded_when_block_raises():
+    collector = InvocationMetrics()
+    with pytest.raises(ValueError):
+        with collector.stage("parse"):
+            raise ValueError("bad csv")
+
+    assert "parse" in collector.durations
+
+
+def test_timed_iter_charges_producer_and_not_consumer():
+    def slow_chunks():
+        for chunk in (b"a", b"b"):
+            time.sleep(0.02)
+            yield chunk
+
+    collector = InvocationMetrics()
+    chunks = []
+    for chunk in collector.timed_iter("download", slow_chunks()):
+        with collector.stage("mask"):
+            time.sleep(0.01)
+        chunks.append(chunk)
+
+    assert chunks == [b"a", b"b"]
+    assert collector.durations["download"] >= 0.04
+    assert collector.durations["mask"] < collector.durations["download"]
+
+
+def test_timed_stream_counts_bytes_read():
+    collector = InvocationMetrics()
+    stream = collector.timed_stream(io.BytesIO(b"name,email\nJohn,j@x.com\n"))
+
+    assert stream.read(5) == b"name,"
+    assert stream.read() == b"email\nJohn,j@x.com\n"
+    assert collector.counters["BytesIn"] == 24
+    assert "download" in collector.durations
+
+
+def test_stages_from_threads_do_not_interfere():
+    collector = InvocationMetrics()
+
+    def work():
+        with collector.stage("upload"):
+            time.sleep(0.02)
+        collector.count("Rows", 10)
+
+    with collector.stage("cleanup"):
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert collector.counters["Rows"] == 40
+    assert collector.durations["upload"] >= 0.08
+    # Stages of other threads are not subtracted from this thread's stage.
+    assert collector.durations["cleanup"] >= 0.02
+
+
+def test_to_emf_declares_every_metric():
+    collector = InvocationMetrics()
+    with collector.stage("state_lookup"):
+        pass
+    collector.count("BytesIn", 2 * 1024**2)
+    collector.count("Rows", 100)
+    collector.set_property("mode", "stream")
+
+    record = collector.to_emf()
+
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == metrics.NAMESPACE
+    assert directive["Dimensions"] == [["Service"]]
+    units = {metric["Name"]: metric["Unit"] for metric in directive["Metrics"]}
+    assert units["StateLookupDuration"] == "Milliseconds"
+    assert units["TotalDuration"] == "Milliseconds"
+    assert units["BytesIn"] == "Bytes"
+    assert units["Rows"] == "Count"
+    assert units["Throughput"] == "Megabytes/Second"
+    assert units["PeakMemory"] == "Megabytes"
+    for name in units:
+        assert isinstance(record[name], (int, float))
+    assert record["Service"] == metrics.SERVICE
+    assert record["mode"] == "stream"
+    assert "mode" not in units
+
+
+def test_properties_are_recorded_per_file():
+    collector = InvocationMetrics()
+    collector.set_property("RequestId", "abc")
+
+    def process(key, mode, engine):
+        with collector.for_file(key):
+            collector.set_property("mode", mode)
+            time.sleep(0.01)
+            collector.set_property("engine", engine)
+
+    threads = [
+        threading.Thread(target=process, args=("a.csv", "memory", "splice")),
+        threading.Thread(target=process, args=("b.csv", "memory", "pyarrow")),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record = collector.to_emf()
+
+    assert record["RequestId"] == "abc"
+    assert record["mode"] == "memory"
+    assert "engine" not in record
+    assert sorted(record["Files"], key=lambda file: file["File"]) == [
+        {"File": "a.csv", "mode": "memory", "engine": "splice"},
+        {"File": "b.csv", "mode": "memory", "engine": "pyarrow"},
+    ]
+
+
+def test_emit_prints_a_single_json_line(capsys):
+    collector = metrics.start_invocation()
+    metrics.count("Rows", 3)
+    with metrics.stage("mask"):
+        pass
+
+    record = collector.emit()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0]) == record
+    assert record["Rows"] == 3
+    assert "MaskDuration" in record
+
+
+def test_start_invocation_resets_the_current_collector():
+    metrics.start_invocation()
+    metrics.count("Rows", 5)
+
+    collector = metrics.start_invocation()
+
+    assert metrics.current() is collector
+    assert collector.counters == {}
@@ -0,0 +1,306 @@
+import gzip
+import io
+import json
+from unittest.mock import patch
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.utils.obfuscator import (
+    choose_engine,
+    find_input_files,
+    main,
+    obfuscate,
+    obfuscate_paths,
+    output_name,
+)
+from src.utils.csv_splice import mask_csv_bytes, mask_csv_file
+from src.utils.masking import build_masking_plan
+
+CSV = b"id,name,email\n007,John Smith,john@example.com\n008,Jane Doe,jane@example.com\n"
+SPLICED = b"id,name,email\n007,***,***\n008,***,***\n"
+
+
+@pytest.fixture
+def local_tree(tmp_path):
+    root = tmp_path / "exports"
+    (root / "2024" / "01").mkdir(parents=True)
+    (root / ".cache").mkdir()
+    (root / "a.csv").write_bytes(CSV)
+    (root / "2024" / "01" / "b.csv.gz").write_bytes(gzip.compress(CSV))
+    (root / "2024" / "01" / ".hidden.csv").write_bytes(CSV)
+    (root / ".cache" / "c.csv").write_bytes(CSV)
+    return root
+
+
+@pytest.mark.parametrize(
+    "engine, size, columns, strategy, expected",
+    [
+        ("pandas", 10, None, "redact", "pandas"),
+        (None, 10, None, "redact", "splice"),
+        (None, 10 * 1024 * 1024, None, "redact", "pandas"),
+        (None, None, None, "redact", "pandas"),
+        (None, 10, None, "email_domain", "pandas"),
+        ("auto", 10, 8, "redact", "splice"),
+        ("auto", 10 * 1024 * 1024, 8, "redact", "splice"),
+        ("auto", 200 * 1024 * 1024, 8, "redact", "pyarrow"),
+        ("auto", 200 * 1024 * 1024, 100, "redact", "splice"),
+        ("auto", None, None, "redact", "pyarrow"),
+        ("auto", 10, 8, "email_domain", "pyarrow"),
+    ],
+)
+def test_choose_engine(engine, size, columns, strategy, expected):
+    plan = build_masking_plan(["email"], strategy)
+
+    assert choose_engine(engine, plan, size, columns) == expected
+
+
+def test_obfuscate_bytes():
+    assert obfuscate(CSV, ["name", "email"]) == SPLICED
+
+
+@pytest.mark.parametrize("engine", ["splice", "csv", "pyarrow", "auto"])
+@pytest.mark.parametrize("as_stream", [False, True], ids=["bytes", "stream"])
+def test_obfuscate_text_engines_keep_values(engine, as_stream):
+    source = io.BytesIO(CSV) if as_stream else CSV
+
+    assert obfuscate(source, ["name", "email"], engine=engine) == SPLICED
+
+
+def test_obfuscate_auto_engine_on_large_file(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_bytes(CSV + CSV.split(b"\n", 1)[1] * 20000)
+    output = tmp_path / "out.csv"
+
+    with patch("src.utils.obfuscator.AUTO_SPLICE_MAX_BYTES", 1024), patch(
+        "src.utils.obfuscator.mask_csv_file"
+    ) as mock_mask_csv_file:
+        obfuscate(source, ["name", "email"], output=output, engine="auto")
+
+    mock_mask_csv_file.assert_not_called()
+    assert output.read_bytes().startswith(SPLICED)
+
+
+RAGGED = (
+    CSV
+    + b"009,Ann Lee\n010,Bo Ray,bo@example.com,extra\n"
+    + CSV.split(b"\n", 1)[1]
+)
+
+
+@pytest.mark.parametrize("as_stream", [False, True], ids=["bytes", "stream"])
+def test_pyarrow_engine_falls_back_to_splice_on_ragged_rows(as_stream):
+    source = io.BytesIO(RAGGED) if as_stream else RAGGED
+
+    # Small blocks leave the well-formed rows to Arrow and the ragged ones to splice.
+    with patch("src.utils.obfuscator.DEFAULT_CHUNK_BYTES", 64):
+        result = obfuscate(source, ["name", "email"], engine="pyarrow")
+
+    assert result == mask_csv_bytes(RAGGED, ["name", "email"])
+
+
+@pytest.mark.parametrize("as_stream", [False, True], ids=["bytes", "stream"])
+def test_pyarrow_engine_falls_back_to_pandas_for_strategies(as_stream):
+    data = b"id,name,email\n1,John,john@example.com\n2,Jane\n"
+    source = io.BytesIO(data) if as_stream else data
+
+    result = obfuscate(source, ["email"], engine="pyarrow", strategy="email_domain")
+
+    assert result == b"id,name,email\n1,John,***@example.com\n2,Jane,\n"
+
+
+def test_obfuscate_pyarrow_engine_with_strategies():
+    result = obfuscate(CSV, ["email"], engine="pyarrow", strategy="email_domain")
+
+    assert result == (
+        b"id,name,email\n007,John Smith,***@example.com\n008,Jane Doe,***@example.com\n"
+    )
+
+
+def test_obfuscate_path_to_path(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_bytes(CSV)
+    output = tmp_path / "out.csv"
+
+    bytes_written = obfuscate(str(source), ["name", "email"], output=str(output))
+
+    assert output.read_bytes() == SPLICED
+    assert bytes_written == len(SPLICED)
+
+
+@pytest.mark.parametrize(
+    "options, mapped",
+    [
+        ({"engine": "splice"}, True),
+        ({"engine": "pandas"}, False),
+        ({"engine": "splice", "output_compression": "gzip"}, False),
+    ],
+    ids=["splice", "pandas", "compressed_output"],
+)
+def test_obfuscate_memory_maps_spliced_files(tmp_path, options, mapped):
+    source = tmp_path / "data.csv"
+    source.write_bytes(CSV)
+    output = tmp_path / "out.csv"
+
+    with patch(
+        "src.utils.obfuscator.mask_csv_file", wraps=mask_csv_file
+    ) as mock_mask_csv_file:
+        obfuscate(source, ["name"], output=output, **options)
+
+    assert mock_mask_csv_file.called == mapped
+
+
+def test_obfuscate_file_like_with_pandas():
+    output = io.BytesIO()
+
+    obfuscate(io.BytesIO(CSV), ["name"], output=output, engine="pandas", chunk_rows=1)
+
+    assert output.getvalue() == (
+        b"id,name,email\n7,***,john@example.com\n8,***,jane@example.com\n"
+    )
+
+
+def test_obfuscate_compressed_path(tmp_path):
+    source = tmp_path / "data.csv.gz"
+    source.write_bytes(gzip.compress(CSV))
+
+    compressed = obfuscate(
+        source, ["name", "email"], engine="splice", output_compression="gzip"
+    )
+
+    assert obfuscate(source, ["name", "email"], engine="splice") == SPLICED
+    assert gzip.decompress(compressed) == SPLICED
+
+
+def test_obfuscate_json_lines_stream():
+    source = io.BytesIO(b'{"user": {"email": "a@b.com"}, "id": 1}\n')
+
+    result = obfuscate(source, ["user.email"], file_name="events.jsonl")
+
+    assert json.loads(result) == {"user": {"email": "***"}, "id": 1}
+
+
+@pytest.mark.parametrize("as_path", [True, False], ids=["path", "bytes"])
+def test_obfuscate_parquet(tmp_path, as_path):
+    source = tmp_path / "data.parquet"
+    pq.write_table(pa.table({"name": ["John"], "id": [7]}), source)
+
+    result = obfuscate(str(source) if as_path else source.read_bytes(), ["name"])
+
+    table = pq.read_table(io.BytesIO(result))
+    assert table.to_pydict() == {"name": ["***"], "id": [7]}
+
+
+@pytest.mark.parametrize(
+    "source, options, error",
+    [
+        (CSV, {"engine": "unknown"}, "Unknown engine: unknown"),
+        (
+            CSV,
+            {"engine": "csv", "strategy": "email_domain"},
+            "need the pandas or pyarrow engine",
+        ),
+        (CSV, {"output_compression": "lzma"}, "lzma"),
+        (
+            b'{"name": "John"}\n',
+            {"file_name": "x.jsonl", "strategy": "email_domain"},
+            "only support CSV input",
+        ),
+    ],
+    ids=["engine", "csv_strategy", "compression", "json_strategy"],
+)
+def test_obfuscate_rejects_invalid_settings(source, options, error):
+    with pytest.raises(ValueError, match=error):
+        obfuscate(source, ["name"], **options)
+
+
+def test_find_input_files_skips_hidden_files(local_tree):
+    names = [name for _, name in find_input_files(str(local_tree))]
+
+    assert names == ["a.csv", "2024/01/b.csv.gz"]
+
+
+def test_find_input_files_missing_path(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        find_input_files(str(tmp_path / "missing"))
+
+
+@pytest.mark.parametrize(
+    "name, compression, expected",
+    [
+        ("a.csv", None, "a.csv"),
+        ("a.csv.gz", "gzip", "a.csv.gz"),
+        ("a.csv.gz", None, "a.csv"),
+        ("a.csv", "zstd", "a.csv.zst"),
+    ],
+)
+def test_output_name(name, compression, expected):
+    assert output_name(name, compression) == expected
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_obfuscate_paths_mirrors_the_tree(local_tree, tmp_path, processes):
+    output = tmp_path / "out"
+
+    report = obfuscate_paths(
+        str(local_tree), str(output), ["name", "email"], processes, engine="splice"
+    )
+
+    assert report["failed"] == 0
+    assert report["bytes"] == sum(result["bytes"] for result in report["files"])
+    assert (output / "a.csv").read_bytes() == SPLICED
+    compressed = (output / "2024" / "01" / "b.csv.gz").read_bytes()
+    assert gzip.decompress(compressed) == SPLICED
+    assert not (output / ".cache").exists()
+
+
+def test_obfuscate_paths_auto_detects_pii_columns(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_bytes(CSV)
+
+    report = obfuscate_paths(
+        str(source), str(tmp_path / "out"), [], 1, auto_detect=True
+    )
+
+    assert report["files"][0]["detected"] == ["name", "email"]
+    assert (tmp_path / "out" / "data.csv").read_bytes() == SPLICED
+
+
+def test_main_reports_each_file(local_tree, tmp_path, capsys):
+    main(
+        [
+            str(local_tree),
+            str(tmp_path / "out"),
+            "--pii-fields",
+            "name",
+            "email",
+            "--processes",
+            "1",
+        ]
+    )
+
+    output = capsys.readouterr().out
+    assert "Success:" in output
+    assert "Obfuscated 2 of 2 files" in output
+
+
+def test_main_exits_with_error_on_failure(tmp_path, capsys, monkeypatch):
+    monkeypatch.delenv("GDPR_HMAC_KEY", raising=False)
+    source = tmp_path / "data.csv"
+    source.write_bytes(CSV)
+
+    with pytest.raises(SystemExit) as error:
+        main(
+            [
+                str(source),
+                str(tmp_path / "out"),
+                "--pii-fields",
+                "name",
+                "--strategy",
+                "hmac",
+            ]
+        )
+
+    assert error.value.code == 1
+    assert "Error obfuscating" in capsys.readouterr().out
@@ -0,0 +1,182 @@
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.csv_splice import mask_csv_bytes
+from src.utils.parallel import (
+    _create_executor,
+    obfuscate_pii_parallel,
+    plan_byte_ranges,
+)
+
+CSV_CONTENT = b"id,name,email\n" + b"".join(
+    b"%d,Person %d,person%d@example.com\n" % (i, i, i) for i in range(200)
+)
+
+
+@pytest.fixture
+def s3_buckets():
+    with mock_aws(), patch("moto.s3.models.S3_UPLOAD_PART_MIN_SIZE", 1):
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        for bucket in ["input-bucket", "processed-bucket"]:
+            s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+            )
+        yield s3
+
+
+def test_plan_byte_ranges_aligns_to_records(s3_buckets):
+    s3 = s3_buckets
+    s3.put_object(Bucket="input-bucket", Key="data.csv", Body=CSV_CONTENT)
+
+    byte_ranges = plan_byte_ranges(
+        s3, "input-bucket", "data.csv", len(CSV_CONTENT), range_size=100
+    )
+
+    longest_line = max(len(line) + 1 for line in CSV_CONTENT.split(b"\n"))
+    assert len(byte_ranges) > len(CSV_CONTENT) // (100 + longest_line)
+    assert byte_ranges[0][0] == 0
+    assert byte_ranges[-1][1] == len(CSV_CONTENT)
+    for (_, end), (start, _) in zip(byte_ranges, byte_ranges[1:]):
+        assert end == start
+        assert CSV_CONTENT[start - 1 : start] == b"\n"
+    for start, end in byte_ranges:
+        assert end - start < 100 + longest_line
+
+
+def test_plan_byte_ranges_stays_within_max_parts(s3_buckets):
+    s3 = s3_buckets
+    s3.put_object(Bucket="input-bucket", Key="data.csv", Body=CSV_CONTENT)
+
+    with patch("src.utils.parallel.MAX_PARTS", 5):
+        byte_ranges = plan_byte_ranges(
+            s3, "input-bucket", "data.csv", len(CSV_CONTENT), range_size=100
+        )
+
+    assert len(byte_ranges) <= 5
+    assert byte_ranges[-1][1] == len(CSV_CONTENT)
+
+
+@pytest.mark.parametrize("workers", [1, 3, 8], ids=["one", "three", "eight"])
+@pytest.mark.parametrize(
+    "csv_content",
+    [CSV_CONTENT, CSV_CONTENT.rstrip(b"\n")],
+    ids=["trailing_newline", "no_trailing_newline"],
+)
+def test_obfuscate_pii_parallel_matches_sequential_output(
+    s3_buckets, workers, csv_content
+):
+    s3 = s3_buckets
+    s3.put_object(Bucket="input-bucket", Key="data.csv", Body=csv_content)
+
+    bytes_written = obfuscate_pii_parallel(
+        s3,
+        "input-bucket",
+        "data.csv",
+        ["name", "email"],
+        "processed-bucket",
+        "processed/data.csv",
+        workers=workers,
+        range_size=500,
+        use_processes=False,
+        min_part_size=0,
+        block_size=64,
+    )
+
+    body = s3.get_object(Bucket="processed-bucket", Key="processed/data.csv")[
+        "Body"
+    ].read()
+    assert body == mask_csv_bytes(csv_content, ["name", "email"])
+    assert bytes_written == len(body)
+
+
+def test_obfuscate_pii_parallel_empty_file(s3_buckets):
+    s3 = s3_buckets
+    s3.put_object(Bucket="input-bucket", Key="empty.csv", Body=b"")
+
+    result = obfuscate_pii_parallel(
+        s3, "input-bucket", "empty.csv", ["name"], "processed-bucket", "empty.csv"
+    )
+
+    assert result == 0
+    assert s3.get_object(Bucket="processed-bucket", Key="empty.csv")["Body"].read() == b""
+
+
+def test_obfuscate_pii_parallel_quoted_newline_on_boundary_aborts(s3_buckets):
+    s3 = s3_buckets
+    csv_content = b'id,name\n1,"' + b"x\n" * 100 + b'"\n2,Jane\n'
+    s3.put_object(Bucket="input-bucket", Key="quoted.csv", Body=csv_content)
+
+    with pytest.raises(ValueError):
+        obfuscate_pii_parallel(
+            s3,
+            "input-bucket",
+            "quoted.csv",
+            ["name"],
+            "processed-bucket",
+            "quoted.csv",
+            workers=4,
+            range_size=50,
+            use_processes=False,
+            min_part_size=0,
+        )
+
+    assert s3.list_multipart_uploads(Bucket="processed-bucket").get("Uploads", []) == []
+
+
+def test_obfuscate_pii_parallel_small_part_aborts(s3_buckets):
+    s3 = s3_buckets
+    s3.put_object(Bucket="input-bucket", Key="data.csv", Body=CSV_CONTENT)
+
+    with pytest.raises(ValueError, match="minimum part size"):
+        obfuscate_pii_parallel(
+            s3,
+            "input-bucket",
+            "data.csv",
+            ["name"],
+            "processed-bucket",
+            "data.csv",
+            workers=2,
+            range_size=100,
+            use_processes=False,
+        )
+
+
+def test_obfuscate_pii_parallel_failed_abort_keeps_original_error(s3_buckets):
+    s3 = s3_buckets
+    s3.put_object(Bucket="input-bucket", Key="data.csv", Body=CSV_CONTENT)
+
+    with patch.object(
+        s3, "abort_multipart_upload", side_effect=Exception("AccessDenied")
+    ), patch("src.utils.parallel.logger") as logger:
+        with pytest.raises(ValueError, match="minimum part size"):
+            obfuscate_pii_parallel(
+                s3,
+                "input-bucket",
+                "data.csv",
+                ["name"],
+                "processed-bucket",
+                "data.csv",
+                workers=2,
+                range_size=100,
+                use_processes=False,
+            )
+
+    logger.error.assert_called_once_with(
+        "Failed to abort multipart upload: AccessDenied"
+    )
+
+
+def test_create_executor_falls_back_to_threads():
+    with patch(
+        "src.utils.parallel.ProcessPoolExecutor",
+        side_effect=OSError(38, "Function not implemented"),
+    ):
+        executor, in_processes = _create_executor(2, use_processes=True)
+
+    assert isinstance(executor, ThreadPoolExecutor)
+    assert in_processes is False
+    executor.shutdown()
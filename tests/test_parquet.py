@@ -0,0 +1,110 @@
+import io
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from moto import mock_aws
+
+from src.utils.parquet import is_parquet, mask_parquet
+from src.utils.s3_range_reader import S3RangeReader
+
+
+def make_parquet(compression="zstd", row_group_size=2):
+    table = pa.table(
+        {
+            "User ID": pa.array([1001, 1002, 1003], pa.int64()),
+            "Name": ["Alice Johnson", None, "Carol Davis"],
+            "DOB": pa.array([10000, 10001, 10002], pa.date32()),
+            "Score": [1.5, 2.25, 3.0],
+        }
+    ).replace_schema_metadata({"source": "unit-test"})
+    buffer = io.BytesIO()
+    pq.write_table(
+        table, buffer, compression=compression, row_group_size=row_group_size
+    )
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "path, head, expected",
+    [
+        ("data.parquet", None, True),
+        ("DATA.PQ", None, True),
+        ("data.csv", None, False),
+        ("export", b"PAR1\x15\x04", True),
+        ("export", b"User ID,Name", False),
+    ],
+    ids=["extension", "upper_case_extension", "csv", "magic_bytes", "csv_bytes"],
+)
+def test_is_parquet(path, head, expected):
+    assert is_parquet(path, head) is expected
+
+
+@pytest.mark.parametrize("compression", ["zstd", "snappy", "gzip", "none"])
+def test_mask_parquet_replaces_only_pii_columns(compression):
+    output = io.BytesIO()
+
+    rows = mask_parquet(
+        io.BytesIO(make_parquet(compression)), output, ["Name", "DOB", "Missing"]
+    )
+
+    result = pq.ParquetFile(io.BytesIO(output.getvalue()))
+    table = result.read()
+    assert rows == 3
+    assert table.column_names == ["User ID", "Name", "DOB", "Score"]
+    assert table.column("Name").to_pylist() == ["***", "***", "***"]
+    assert table.column("DOB").to_pylist() == ["***", "***", "***"]
+    assert table.column("User ID").to_pylist() == [1001, 1002, 1003]
+    assert table.column("Score").to_pylist() == [1.5, 2.25, 3.0]
+    assert table.schema.field("User ID").type == pa.int64()
+    assert table.schema.metadata[b"source"] == b"unit-test"
+    assert result.num_row_groups == 2
+    expected_codec = "UNCOMPRESSED" if compression == "none" else compression.upper()
+    assert result.metadata.row_group(0).column(0).compression == expected_codec
+
+
+def test_mask_parquet_without_pii_fields_round_trips():
+    source = make_parquet()
+    output = io.BytesIO()
+
+    mask_parquet(io.BytesIO(source), output, [])
+
+    assert pq.read_table(io.BytesIO(output.getvalue())).equals(
+        pq.read_table(io.BytesIO(source))
+    )
+
+
+@pytest.fixture
+def s3_parquet():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="input-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        s3.put_object(Bucket="input-bucket", Key="data.parquet", Body=make_parquet())
+        yield s3
+
+
+def test_s3_range_reader_reads_ranges(s3_parquet):
+    reader = S3RangeReader(s3_parquet, "input-bucket", "data.parquet")
+    expected = make_parquet()
+
+    assert reader.size == len(expected)
+    assert reader.read(4) == b"PAR1"
+    reader.seek(-4, io.SEEK_END)
+    assert reader.read() == b"PAR1"
+    reader.seek(10)
+    assert reader.read(20) == expected[10:30]
+    assert reader.read(0) == b""
+
+
+def test_mask_parquet_from_s3_range_reader(s3_parquet):
+    reader = S3RangeReader(s3_parquet, "input-bucket", "data.parquet")
+    output = io.BytesIO()
+
+    mask_parquet(reader, output, ["Name"])
+
+    table = pq.read_table(io.BytesIO(output.getvalue()))
+    assert table.column("Name").to_pylist() == ["***", "***", "***"]
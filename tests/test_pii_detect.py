@@ -0,0 +1,161 @@
+import csv
+import gzip
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from src.data.create_data import parse_schema, write_csv
+from src.utils.pii_detect import (
+    detect_pii_columns,
+    detect_pii_fields,
+    merge_pii_fields,
+    read_file_sample,
+    read_sample,
+)
+
+SCHEMA = parse_schema(
+    "User ID:id,Name:name,Graduation Date:date,Email Address:email,Course:course,"
+    "Town:town,Sex:sex,DOB:dob,Phone:phone,NI Number:national_id,Score:integer,"
+    "First Name:first_name"
+)
+
+
+@pytest.fixture(scope="module")
+def generated_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "people.csv"
+    write_csv(str(path), rows=20_000, schema=SCHEMA, seed=5)
+    return path.read_bytes()
+
+
+@pytest.fixture
+def mock_bucket():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="input-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3
+
+
+def test_detect_pii_columns(generated_csv):
+    sample = generated_csv[: generated_csv.index(b"\n", 32 * 1024) + 1]
+
+    assert detect_pii_columns(sample) == {
+        "Name": "name",
+        "Email Address": "email",
+        "DOB": "date_of_birth",
+        "Phone": "phone",
+        "NI Number": "national_id",
+        "First Name": "name",
+    }
+
+
+@pytest.mark.parametrize(
+    "csv_text, expected",
+    [
+        ("id,contact\n1,+44 20 7946 0958\n2,(555) 123-4567\n", {"contact": "phone"}),
+        ("id,ssn\n1,123-45-6789\n2,987-65-4321\n", {"ssn": "national_id"}),
+        ("date_of_birth\n12/05/1990\n01/01/1985\n", {"date_of_birth": "date_of_birth"}),
+        ("created\n2024-01-02\n2024-03-04\n", {}),
+        ("file_name\nReport Final\nSummary Draft\n", {}),
+        ('"Full Name",note\n"Jane Doe",a\n"John Smith",b\n', {"Full Name": "name"}),
+        ("email\njohn@example.com\nnot an email\n\n", {}),
+        ("", {}),
+    ],
+    ids=[
+        "phone",
+        "ssn",
+        "dob_header",
+        "date_without_dob_header",
+        "name_header_excluded",
+        "quoted_header",
+        "below_threshold",
+        "empty",
+    ],
+)
+def test_detect_pii_columns_cases(csv_text, expected):
+    assert detect_pii_columns(csv_text.encode()) == expected
+
+
+def test_detect_pii_columns_threshold():
+    sample = b"email\njohn@example.com\njane@example.com\nnone\n"
+
+    assert detect_pii_columns(sample) == {}
+    assert detect_pii_columns(sample, threshold=0.5) == {"email": "email"}
+
+
+@pytest.mark.parametrize(
+    "sample",
+    [
+        b'id,note,email\n1,"line one\nline two",john@example.com\n'
+        b'2,plain,jane@example.com\n',
+        b'id,note,email\n1,a,john@example.com\n2,b,jane@example.com\n3,"open\n',
+        # Samples the Arrow reader rejects are parsed with the csv module.
+        b"id,note,email\n1,a,john@example.com,extra\n2,b,jane@example.com\n",
+        b'id,note,email\n1,\xff,john@example.com\n2,b,jane@example.com\n',
+    ],
+    ids=["newline_in_quotes", "cut_inside_quotes", "ragged_rows", "invalid_utf8"],
+)
+def test_detect_pii_columns_of_awkward_samples(sample):
+    assert detect_pii_columns(sample, threshold=0.6) == {"email": "email"}
+
+
+def test_detect_pii_columns_unparseable_sample():
+    limit = csv.field_size_limit()
+    csv.field_size_limit(10)
+    try:
+        with pytest.raises(ValueError, match="Could not parse the sample"):
+            detect_pii_columns(b"id,note\n1,2,3\n4," + b"x" * 20 + b"\n")
+    finally:
+        csv.field_size_limit(limit)
+
+
+def test_read_sample_ends_at_a_complete_line(mock_bucket, generated_csv):
+    mock_bucket.put_object(Bucket="input-bucket", Key="people.csv", Body=generated_csv)
+
+    sample = read_sample(mock_bucket, "input-bucket", "people.csv", 4096)
+
+    assert len(sample) <= 4096
+    assert sample.endswith(b"\n")
+    assert generated_csv.startswith(sample)
+
+
+def test_read_sample_of_small_and_empty_files(mock_bucket):
+    mock_bucket.put_object(Bucket="input-bucket", Key="small.csv", Body=b"a,b\n1,2")
+    mock_bucket.put_object(Bucket="input-bucket", Key="empty.csv", Body=b"")
+
+    assert read_sample(mock_bucket, "input-bucket", "small.csv", 4096) == b"a,b\n1,2"
+    assert read_sample(mock_bucket, "input-bucket", "empty.csv", 4096) == b""
+
+
+@pytest.mark.parametrize("compress", [False, True], ids=["plain", "gzip"])
+def test_read_file_sample(tmp_path, generated_csv, compress):
+    path = tmp_path / ("people.csv.gz" if compress else "people.csv")
+    path.write_bytes(gzip.compress(generated_csv) if compress else generated_csv)
+
+    sample = read_file_sample(str(path), 4096)
+
+    assert sample.endswith(b"\n")
+    assert generated_csv.startswith(sample)
+    assert read_file_sample(str(path), 10**9) == generated_csv
+
+
+def test_detect_pii_fields_of_compressed_file(mock_bucket, generated_csv):
+    mock_bucket.put_object(
+        Bucket="input-bucket", Key="people.csv.gz", Body=gzip.compress(generated_csv)
+    )
+
+    detected = detect_pii_fields(mock_bucket, "input-bucket", "people.csv.gz", 16)
+
+    assert detected["Email Address"] == "email"
+    assert detected["Phone"] == "phone"
+
+
+def test_merge_pii_fields():
+    assert merge_pii_fields(["Email", "Sex"], {"Phone": "phone", "Email": "email"}) == [
+        "Email",
+        "Sex",
+        "Phone",
+    ]
@@ -0,0 +1,102 @@
+import io
+import threading
+import time
+
+import pytest
+
+from src.utils import metrics
+from src.utils.metrics import TimedStream
+from src.utils.pipeline import PrefetchReader, pipelined_source
+
+DATA = bytes(range(256)) * 1000
+
+
+class CountingStream(io.BytesIO):
+    """A stream that records how many blocks have been read from it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+class FailingStream:
+    def __init__(self, good_blocks):
+        self.good_blocks = good_blocks
+
+    def read(self, size=-1):
+        if self.good_blocks == 0:
+            raise ConnectionError("connection reset")
+        self.good_blocks -= 1
+        return b"x" * size
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 100, 4096, 1_000_000])
+def test_prefetch_reader_returns_the_stream(read_size):
+    with PrefetchReader(io.BytesIO(DATA), blocks=2, block_size=1000) as reader:
+        chunks = iter(lambda: reader.read(read_size), b"")
+        assert b"".join(chunks) == DATA
+        assert reader.read(10) == b""
+
+
+def test_prefetch_reader_read_all():
+    with PrefetchReader(io.BytesIO(DATA), block_size=1000) as reader:
+        assert reader.read(10) == DATA[:10]
+        assert reader.read() == DATA[10:]
+
+
+def test_prefetch_reader_is_bounded():
+    stream = CountingStream(DATA)
+
+    with PrefetchReader(stream, blocks=2, block_size=1000) as reader:
+        reader.read(1)
+        time.sleep(0.2)
+
+        # One block taken by the reader, two queued and one waiting to be queued.
+        assert stream.reads <= 4
+
+
+def test_prefetch_reader_counts_bytes_in():
+    collector = metrics.start_invocation()
+
+    with PrefetchReader(io.BytesIO(DATA), block_size=1000) as reader:
+        reader.read()
+
+    assert collector.counters["BytesIn"] == len(DATA)
+
+
+def test_prefetch_reader_raises_stream_errors():
+    with PrefetchReader(FailingStream(good_blocks=2), block_size=10) as reader:
+        assert reader.read(100) == b"x" * 20
+        with pytest.raises(ConnectionError, match="connection reset"):
+            reader.read(100)
+
+
+def test_close_stops_the_background_thread():
+    stream = CountingStream(DATA * 100)
+    reader = PrefetchReader(stream, blocks=1, block_size=10)
+    reader.read(1)
+
+    reader.close()
+
+    assert not any(thread.name == "prefetch" for thread in threading.enumerate())
+    assert stream.reads < 10
+    with pytest.raises(ValueError):
+        reader.read(1)
+
+
+def test_pipelined_source_without_prefetch():
+    with pipelined_source(io.BytesIO(DATA), prefetch_blocks=0) as source:
+        assert isinstance(source, TimedStream)
+        assert source.read() == DATA
+
+
+def test_pipelined_source_closes_reader_on_error():
+    with pytest.raises(RuntimeError):
+        with pipelined_source(io.BytesIO(DATA), prefetch_blocks=2) as source:
+            raise RuntimeError("transform failed")
+
+    assert source.closed
@@ -1,7 +1,13 @@
 import pytest
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import boto3
 import json
+import bz2
+import gzip
+import hashlib
+import time
 
 from unittest import mock
 from unittest.mock import patch
@@ -10,10 +16,20 @@ from moto import mock_aws
 from src.utils.processing2 import (
     get_bucket_names_from_tf_state,
     obfuscate_pii,
+    obfuscate_pii_stream,
+    obfuscate_pii_parquet,
+    obfuscate_pii_json,
     get_keys_from_bucket,
     empty_bucket,
+    empty_buckets,
     handler,
+    get_invocation_records,
+    get_record_etags,
+    resolve_engine,
 )
+from src.utils.masking import build_masking_plan
+from src.utils.pipeline import DEFAULT_PREFETCH_BLOCKS, DEFAULT_UPLOAD_CONCURRENCY
+from src.utils.pseudonymise import pseudonymise_value
 from botocore.exceptions import ClientError
 import logging
 
@@ -254,15 +270,23 @@ def test_empty_bucket_happy_path(
     with patch("src.utils.processing2.s3") as mock_s3:
         mock_s3.list_objects_v2.return_value = list_objects_response
 
+        mock_s3.delete_objects.return_value = {}
+
         with caplog.at_level(logging.INFO):
-            empty_bucket(bucket_name)
+            result = empty_bucket(bucket_name)
 
         if "Contents" in list_objects_response:
-            assert mock_s3.delete_object.call_count == len(
-                list_objects_response["Contents"]
+            mock_s3.delete_objects.assert_called_once_with(
+                Bucket=bucket_name,
+                Delete={
+                    "Objects": list_objects_response["Contents"],
+                    "Quiet": True,
+                },
             )
+            assert result == {"deleted": 2, "failed": []}
         else:
-            assert mock_s3.delete_object.call_count == 0
+            mock_s3.delete_objects.assert_not_called()
+            assert result == {"deleted": 0, "failed": []}
         assert expected_log in caplog.text
 
 
@@ -292,10 +316,21 @@ def test_empty_bucket_error_cases(bucket_name, exception, expected_log, caplog):
         assert expected_log in caplog.text
 
 
+def fake_head_object(Bucket, Key):
+    """
+    Stands in for head_object in handler tests: input files exist, and nothing
+    has been recorded in the idempotency index yet.
+    """
+    if Key.startswith("index/"):
+        raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+    return {"ETag": '"0123456789abcdef"', "ContentLength": 1024}
+
+
 @mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
 @mock.patch("src.utils.processing2.get_keys_from_bucket")
 @mock.patch("src.utils.processing2.s3.get_object")
 @mock.patch("src.utils.processing2.s3.put_object")
+@mock.patch("src.utils.processing2.s3.head_object", new=fake_head_object)
 @mock.patch("src.utils.processing2.obfuscate_pii")
 @mock.patch("src.utils.processing2.empty_bucket")
 def test_handler_success(
@@ -337,9 +372,13 @@ def test_handler_success(
 
     assert response["statusCode"] == 200
     assert json.loads(response["body"]) == "Processing completed successfully."
-    mock_put_object.assert_called_once_with(
+    assert response["engine"] == "splice"
+    assert mock_put_object.call_args_list[0] == mock.call(
         Bucket="processed-bucket", Key="processed/data.csv", Body=b"obfuscated_data"
     )
+    index_entry = mock_put_object.call_args_list[1].kwargs
+    assert index_entry["Key"].startswith("index/")
+    assert index_entry["Metadata"] == {"output-key": "processed/data.csv"}
     mock_empty_bucket.assert_any_call("input-bucket")
     mock_empty_bucket.assert_any_call("invocation-bucket")
 
@@ -433,3 +472,1423 @@ def test_handler_500_error_processing_json_content(
 
     assert response["statusCode"] == 500
     assert json.loads(response["body"]) == "Error processing JSON content."
+
+
+@pytest.fixture
+def mock_stream_buckets():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        for bucket in ["stream-input-bucket", "stream-processed-bucket"]:
+            s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+            )
+        yield s3
+
+
+@pytest.mark.parametrize(
+    "chunk_rows",
+    [1, 2, 50000],
+    ids=["one_row_chunks", "two_row_chunks", "single_chunk"],
+)
+def test_obfuscate_pii_stream_matches_in_memory_output(mock_stream_buckets, chunk_rows):
+    s3 = mock_stream_buckets
+    csv_content = (
+        "name,email,phone\n"
+        "John,john@example.com,123\n"
+        "Jane,jane@example.com,456\n"
+        "Jim,jim@example.com,789\n"
+    )
+    s3.put_object(Bucket="stream-input-bucket", Key="test.csv", Body=csv_content)
+
+    bytes_written = obfuscate_pii_stream(
+        "stream-input-bucket",
+        "test.csv",
+        ["email", "missing"],
+        "stream-processed-bucket",
+        "processed/test.csv",
+        chunk_rows=chunk_rows,
+    )
+
+    body = s3.get_object(Bucket="stream-processed-bucket", Key="processed/test.csv")[
+        "Body"
+    ].read()
+    assert body == obfuscate_pii("stream-input-bucket", "test.csv", ["email"])
+    assert bytes_written == len(body)
+
+
+def test_obfuscate_pii_stream_error_returns_none(mock_stream_buckets):
+    result = obfuscate_pii_stream(
+        "stream-input-bucket",
+        "missing.csv",
+        ["email"],
+        "stream-processed-bucket",
+        "processed/missing.csv",
+    )
+
+    assert result is None
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.get_keys_from_bucket")
+@mock.patch("src.utils.processing2.s3.get_object")
+@mock.patch("src.utils.processing2.s3.head_object", new=fake_head_object)
+@mock.patch("src.utils.processing2.s3.put_object", new=mock.Mock())
+@mock.patch("src.utils.processing2.obfuscate_pii_stream")
+@mock.patch("src.utils.processing2.obfuscate_pii")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_stream_mode(
+    mock_empty_bucket,
+    mock_obfuscate_pii,
+    mock_obfuscate_pii_stream,
+    mock_s3_get_object,
+    mock_get_keys,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_get_keys.return_value = "data.json"
+    mock_s3_get_object.return_value = {
+        "Body": mock.Mock(
+            read=mock.Mock(
+                return_value=json.dumps(
+                    {
+                        "bucket_name": "input-bucket",
+                        "s3_file_path": "data.csv",
+                        "pii_fields": ["name"],
+                        "mode": "stream",
+                        "chunk_rows": 100,
+                        "prefetch_blocks": 2,
+                        "upload_concurrency": 8,
+                    }
+                ).encode("utf-8")
+            )
+        )
+    }
+    mock_obfuscate_pii_stream.return_value = 1024
+
+    response = handler({}, {})
+
+    assert response["statusCode"] == 200
+    assert response["engine"] == "pandas"
+    mock_obfuscate_pii.assert_not_called()
+    mock_obfuscate_pii_stream.assert_called_once_with(
+        "input-bucket",
+        "data.csv",
+        ["name"],
+        "processed-bucket",
+        "processed/data.csv",
+        chunk_rows=100,
+        engine="pandas",
+        strategy="redact",
+        strategies=None,
+        output_compression=None,
+        engines=[],
+        prefetch_blocks=2,
+        upload_concurrency=8,
+    )
+    mock_empty_bucket.assert_any_call("input-bucket")
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.get_keys_from_bucket")
+@mock.patch("src.utils.processing2.s3.get_object")
+@mock.patch("src.utils.processing2.obfuscate_pii_stream")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_stream_mode_failure_keeps_input(
+    mock_empty_bucket,
+    mock_obfuscate_pii_stream,
+    mock_s3_get_object,
+    mock_get_keys,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_get_keys.return_value = "data.json"
+    mock_s3_get_object.return_value = {
+        "Body": mock.Mock(
+            read=mock.Mock(
+                return_value=json.dumps(
+                    {
+                        "bucket_name": "input-bucket",
+                        "s3_file_path": "data.csv",
+                        "pii_fields": ["name"],
+                        "mode": "stream",
+                    }
+                ).encode("utf-8")
+            )
+        )
+    }
+    mock_obfuscate_pii_stream.return_value = None
+
+    response = handler({}, {})
+
+    assert response["statusCode"] == 500
+    mock_empty_bucket.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "csv_content, expected_output",
+    [
+        (
+            "id,name,score\n007,John,1.50\n",
+            "id,name,score\n007,***,1.50\n",
+        ),
+        (
+            "name,email\nJohn,john@example.com",
+            "name,email\n***,john@example.com",
+        ),
+    ],
+    ids=["non_pii_values_unchanged", "no_trailing_newline"],
+)
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_splice_engine(mock_s3, csv_content, expected_output):
+    mock_s3.get_object.return_value = {"Body": BytesIO(csv_content.encode("utf-8"))}
+
+    result = obfuscate_pii("test-bucket", "test.csv", ["name"], engine="splice")
+
+    assert result.decode("utf-8") == expected_output
+
+
+@patch("src.utils.processing2.s3")
+@patch("src.utils.processing2.logger")
+def test_obfuscate_pii_unknown_engine(mock_logger, mock_s3):
+    result = obfuscate_pii("test-bucket", "test.csv", ["name"], engine="unknown")
+
+    assert result is None
+    mock_s3.get_object.assert_not_called()
+    mock_logger.error.assert_called_with("Failed to process file: Unknown engine: unknown")
+
+
+@pytest.mark.parametrize("engine", ["pyarrow", "csv"])
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_text_engines(mock_s3, engine):
+    csv_content = b'id,name,score\n007,"Smith, John",1.50\n008,,NA\n'
+    mock_s3.get_object.return_value = {"Body": BytesIO(csv_content)}
+
+    result = obfuscate_pii("test-bucket", "test.csv", ["name"], engine=engine)
+
+    assert result == b"id,name,score\n007,***,1.50\n008,***,NA\n"
+
+
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_pyarrow_engine_hmac(mock_s3):
+    csv_content = b"id,email\n007,a@b.com\n008,a@b.com\n"
+    mock_s3.get_object.return_value = {"Body": BytesIO(csv_content)}
+
+    with patch.dict("os.environ", {"GDPR_HMAC_KEY": "k"}):
+        result = obfuscate_pii(
+            "test-bucket", "test.csv", ["email"], engine="pyarrow", strategy="hmac"
+        )
+
+    rows = result.decode("utf-8").splitlines()
+    assert rows[1].startswith("007,") and rows[2].startswith("008,")
+    assert rows[1].split(",")[1] == rows[2].split(",")[1] != "a@b.com"
+
+
+@pytest.mark.parametrize("engine", ["splice", "pyarrow", "csv", "auto"])
+def test_obfuscate_pii_stream_text_engines(mock_stream_buckets, engine):
+    s3 = mock_stream_buckets
+    csv_content = 'id,name,note\n1,"Smith, John",007\n2,Jane,1.50\n'
+    s3.put_object(Bucket="stream-input-bucket", Key="test.csv", Body=csv_content)
+
+    bytes_written = obfuscate_pii_stream(
+        "stream-input-bucket",
+        "test.csv",
+        ["name"],
+        "stream-processed-bucket",
+        "processed/test.csv",
+        engine=engine,
+    )
+
+    body = s3.get_object(Bucket="stream-processed-bucket", Key="processed/test.csv")[
+        "Body"
+    ].read()
+    assert body == b"id,name,note\n1,***,007\n2,***,1.50\n"
+    assert bytes_written == len(body)
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.get_keys_from_bucket")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.obfuscate_pii_parallel")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_parallel_mode(
+    mock_empty_bucket,
+    mock_obfuscate_pii_parallel,
+    mock_s3,
+    mock_get_keys,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_get_keys.return_value = "data.json"
+    mock_s3.head_object.side_effect = fake_head_object
+    mock_s3.get_object.return_value = {
+        "Body": mock.Mock(
+            read=mock.Mock(
+                return_value=json.dumps(
+                    {
+                        "bucket_name": "input-bucket",
+                        "s3_file_path": "data.csv",
+                        "pii_fields": ["name"],
+                        "mode": "parallel",
+                        "workers": 4,
+                    }
+                ).encode("utf-8")
+            )
+        )
+    }
+    mock_obfuscate_pii_parallel.return_value = 2048
+
+    response = handler({}, {})
+
+    assert response["statusCode"] == 200
+    mock_obfuscate_pii_parallel.assert_called_once_with(
+        mock_s3,
+        "input-bucket",
+        "data.csv",
+        ["name"],
+        "processed-bucket",
+        "processed/data.csv",
+        workers=4,
+    )
+    # Only the idempotency index entry is written; the parts went through
+    # obfuscate_pii_parallel.
+    assert [
+        call.kwargs["Key"].startswith("index/")
+        for call in mock_s3.put_object.call_args_list
+    ] == [True]
+
+
+def make_s3_event(*keys, bucket_name="invocation-bucket"):
+    return {
+        "Records": [
+            {
+                "eventSource": "aws:s3",
+                "s3": {"bucket": {"name": bucket_name}, "object": {"key": key}},
+            }
+            for key in keys
+        ]
+    }
+
+
+@pytest.mark.parametrize(
+    "event, expected",
+    [
+        ({}, []),
+        (None, []),
+        (
+            make_s3_event("a.json", "b.json"),
+            [("invocation-bucket", "a.json"), ("invocation-bucket", "b.json")],
+        ),
+        (
+            make_s3_event("my+job%281%29.json"),
+            [("invocation-bucket", "my job(1).json")],
+        ),
+        (make_s3_event("data.csv"), []),
+        ({"Records": [{"eventSource": "aws:sqs"}]}, []),
+    ],
+    ids=[
+        "empty_event",
+        "none_event",
+        "batched_records",
+        "url_encoded_key",
+        "non_json_key",
+        "non_s3_record",
+    ],
+)
+def test_get_invocation_records(event, expected):
+    assert get_invocation_records(event) == expected
+
+
+def test_get_record_etags():
+    event = make_s3_event("a.json", "b.json")
+    event["Records"][0]["s3"]["object"]["eTag"] = "0123456789abcdef"
+
+    assert get_record_etags(event) == {
+        ("invocation-bucket", "a.json"): "0123456789abcdef"
+    }
+    assert get_record_etags(None) == {}
+
+
+def mock_invocation_json(Bucket, Key):
+    return {
+        "Body": BytesIO(
+            json.dumps(
+                {
+                    "bucket_name": "input-bucket",
+                    "s3_file_path": Key.replace(".json", ".csv"),
+                    "pii_fields": ["name"],
+                }
+            ).encode("utf-8")
+        )
+    }
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.get_keys_from_bucket")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.obfuscate_pii")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_processes_every_event_record(
+    mock_empty_bucket,
+    mock_obfuscate_pii,
+    mock_s3,
+    mock_get_keys,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_s3.head_object.side_effect = fake_head_object
+    mock_s3.get_object.side_effect = mock_invocation_json
+    mock_obfuscate_pii.return_value = b"obfuscated_data"
+
+    response = handler(make_s3_event("first.json", "second.json"), {})
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["processed"] == 2
+    assert body["failed"] == 0
+    assert [result["key"] for result in body["results"]] == [
+        "first.json",
+        "second.json",
+    ]
+    mock_get_keys.assert_not_called()
+    mock_s3.get_object.assert_any_call(Bucket="invocation-bucket", Key="first.json")
+    mock_s3.get_object.assert_any_call(Bucket="invocation-bucket", Key="second.json")
+    mock_s3.put_object.assert_any_call(
+        Bucket="processed-bucket", Key="processed/first.csv", Body=b"obfuscated_data"
+    )
+    mock_s3.put_object.assert_any_call(
+        Bucket="processed-bucket", Key="processed/second.csv", Body=b"obfuscated_data"
+    )
+    mock_empty_bucket.assert_any_call(
+        "input-bucket", keys=["first.csv", "second.csv"]
+    )
+    mock_empty_bucket.assert_any_call(
+        "invocation-bucket", keys=["first.json", "second.json"]
+    )
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.obfuscate_pii")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_reports_failed_event_records(
+    mock_empty_bucket,
+    mock_obfuscate_pii,
+    mock_s3,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+
+    mock_s3.head_object.side_effect = fake_head_object
+    def get_object(Bucket, Key):
+        if Key == "broken.json":
+            raise Exception("Some error occurred")
+        return mock_invocation_json(Bucket, Key)
+
+    mock_s3.get_object.side_effect = get_object
+    mock_obfuscate_pii.return_value = b"obfuscated_data"
+
+    response = handler(make_s3_event("good.json", "broken.json"), {})
+
+    assert response["statusCode"] == 500
+    body = json.loads(response["body"])
+    assert body["processed"] == 1
+    assert body["failed"] == 1
+    assert body["results"][0]["statusCode"] == 200
+    assert body["results"][1] == {
+        "bucket_name": "invocation-bucket",
+        "key": "broken.json",
+        "statusCode": 500,
+        "message": "Error reading JSON file.",
+    }
+    assert mock_empty_bucket.call_count == 2
+    mock_empty_bucket.assert_any_call("input-bucket", keys=["good.csv"])
+    mock_empty_bucket.assert_any_call("invocation-bucket", keys=["good.json"])
+
+
+@pytest.fixture
+def mock_cleanup_bucket():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="cleanup-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        for i in range(2500):
+            s3.put_object(Bucket="cleanup-bucket", Key=f"staged/{i:05d}.csv", Body=b"")
+        yield s3
+
+
+def test_empty_bucket_deletes_every_page(mock_cleanup_bucket):
+    s3 = mock_cleanup_bucket
+
+    result = empty_bucket("cleanup-bucket")
+
+    assert result == {"deleted": 2500, "failed": []}
+    assert "Contents" not in s3.list_objects_v2(Bucket="cleanup-bucket")
+
+
+def test_empty_bucket_only_given_keys(mock_cleanup_bucket):
+    s3 = mock_cleanup_bucket
+    keys = [f"staged/{i:05d}.csv" for i in range(1200)]
+
+    result = empty_bucket("cleanup-bucket", keys=keys)
+
+    assert result == {"deleted": 1200, "failed": []}
+    assert s3.list_objects_v2(Bucket="cleanup-bucket")["KeyCount"] == 1000
+    remaining = s3.list_objects_v2(Bucket="cleanup-bucket", StartAfter="staged/01199.csv")
+    assert remaining["Contents"][0]["Key"] == "staged/01200.csv"
+
+
+def test_empty_buckets_empties_each_bucket(mock_cleanup_bucket):
+    s3 = mock_cleanup_bucket
+    s3.create_bucket(
+        Bucket="second-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    for name in ("a.json", "b.json"):
+        s3.put_object(Bucket="second-bucket", Key=name, Body=b"{}")
+
+    result = empty_buckets({"cleanup-bucket": None, "second-bucket": ["a.json"]})
+
+    assert result == {
+        "cleanup-bucket": {"deleted": 2500, "failed": []},
+        "second-bucket": {"deleted": 1, "failed": []},
+    }
+    assert "Contents" not in s3.list_objects_v2(Bucket="cleanup-bucket")
+    assert [
+        obj["Key"] for obj in s3.list_objects_v2(Bucket="second-bucket")["Contents"]
+    ] == ["b.json"]
+
+
+def test_empty_bucket_reports_failed_keys(caplog):
+    with patch("src.utils.processing2.s3") as mock_s3:
+        mock_s3.delete_objects.return_value = {
+            "Errors": [{"Key": "locked.csv", "Code": "AccessDenied", "Message": "Denied"}]
+        }
+
+        with caplog.at_level(logging.ERROR):
+            result = empty_bucket("test-bucket", keys=["ok.csv", "locked.csv"])
+
+    assert result == {"deleted": 1, "failed": ["locked.csv"]}
+    assert "Failed to delete locked.csv: Denied" in caplog.text
+
+
+def test_empty_bucket_failed_batch_request():
+    with patch("src.utils.processing2.s3") as mock_s3:
+        mock_s3.delete_objects.side_effect = ClientError(
+            {"Error": {"Code": "SlowDown"}}, "DeleteObjects"
+        )
+
+        result = empty_bucket("test-bucket", keys=["a.csv", "b.csv"])
+
+    assert result == {"deleted": 0, "failed": ["a.csv", "b.csv"]}
+
+
+def test_empty_bucket_bounds_batches_in_flight(monkeypatch):
+    monkeypatch.setenv("GDPR_S3_MAX_CONCURRENCY", "1")
+    completed = []
+    ahead = []
+
+    def delete_objects(Bucket, Delete):
+        time.sleep(0.01)
+        completed.append(len(Delete["Objects"]))
+        return {}
+
+    def iter_key_batches(bucket_name):
+        for page in range(10):
+            ahead.append(page - len(completed))
+            yield [f"{page}-{i}.csv" for i in range(3)]
+
+    with patch("src.utils.processing2.s3") as mock_s3, patch(
+        "src.utils.processing2.iter_key_batches", iter_key_batches
+    ):
+        mock_s3.delete_objects.side_effect = delete_objects
+        result = empty_bucket("test-bucket")
+
+    assert result == {"deleted": 30, "failed": []}
+    # No page is listed while more than two batches are still being deleted.
+    assert max(ahead) <= 2
+
+
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_detects_parquet_magic_bytes(mock_s3):
+    source = BytesIO()
+    pq.write_table(pa.table({"name": ["John"], "email": ["john@example.com"]}), source)
+    mock_s3.get_object.return_value = {"Body": BytesIO(source.getvalue())}
+
+    result = obfuscate_pii("test-bucket", "export", ["email"])
+
+    table = pq.read_table(BytesIO(result))
+    assert table.to_pydict() == {"name": ["John"], "email": ["***"]}
+
+
+def test_obfuscate_pii_parquet_streams_to_processed_bucket(mock_stream_buckets):
+    s3 = mock_stream_buckets
+    source = BytesIO()
+    pq.write_table(
+        pa.table({"name": ["John", "Jane"], "id": [1, 2]}), source, row_group_size=1
+    )
+    s3.put_object(
+        Bucket="stream-input-bucket", Key="data.parquet", Body=source.getvalue()
+    )
+
+    bytes_written = obfuscate_pii_parquet(
+        "stream-input-bucket",
+        "data.parquet",
+        ["name"],
+        "stream-processed-bucket",
+        "processed/data.parquet",
+    )
+
+    body = s3.get_object(
+        Bucket="stream-processed-bucket", Key="processed/data.parquet"
+    )["Body"].read()
+    assert bytes_written == len(body)
+    table = pq.read_table(BytesIO(body))
+    assert table.to_pydict() == {"name": ["***", "***"], "id": [1, 2]}
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.obfuscate_pii_parquet")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_routes_parquet_files(
+    mock_empty_bucket,
+    mock_obfuscate_pii_parquet,
+    mock_s3,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_s3.head_object.side_effect = fake_head_object
+    mock_s3.get_object.return_value = {
+        "Body": BytesIO(
+            json.dumps(
+                {
+                    "bucket_name": "input-bucket",
+                    "s3_file_path": "data.parquet",
+                    "pii_fields": ["name"],
+                }
+            ).encode("utf-8")
+        )
+    }
+    mock_obfuscate_pii_parquet.return_value = 512
+
+    response = handler(make_s3_event("data.json"), {})
+
+    assert response["statusCode"] == 200
+    mock_obfuscate_pii_parquet.assert_called_once_with(
+        "input-bucket",
+        "data.parquet",
+        ["name"],
+        "processed-bucket",
+        "processed/data.parquet",
+    )
+
+
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_masks_nested_json_lines(mock_s3):
+    body = (
+        b'{"user": {"contact": {"email": "john@example.com"}}, "id": 1}\n'
+        b'{"id": 2}\n'
+    )
+    mock_s3.get_object.return_value = {"Body": BytesIO(body)}
+
+    result = obfuscate_pii("test-bucket", "export.jsonl", ["user.contact.email"])
+
+    assert result == (
+        b'{"user":{"contact":{"email":"***"}},"id":1}\n'
+        b'{"id": 2}\n'
+    )
+
+
+def test_obfuscate_pii_json_streams_array_to_processed_bucket(mock_stream_buckets):
+    s3 = mock_stream_buckets
+    records = [
+        {"name": f"Person {i}", "orders": [{"card": str(i)}]} for i in range(100)
+    ]
+    s3.put_object(
+        Bucket="stream-input-bucket",
+        Key="data.json",
+        Body=json.dumps(records).encode("utf-8"),
+    )
+
+    bytes_written = obfuscate_pii_json(
+        "stream-input-bucket",
+        "data.json",
+        ["$.name", "orders[*].card"],
+        "stream-processed-bucket",
+        "processed/data.json",
+    )
+
+    body = s3.get_object(Bucket="stream-processed-bucket", Key="processed/data.json")[
+        "Body"
+    ].read()
+    assert bytes_written == len(body)
+    assert json.loads(body) == [
+        {"name": "***", "orders": [{"card": "***"}]} for _ in range(100)
+    ]
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.obfuscate_pii_json")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_routes_json_files(
+    mock_empty_bucket,
+    mock_obfuscate_pii_json,
+    mock_s3,
+    mock_get_bucket_names,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_s3.head_object.side_effect = fake_head_object
+    mock_s3.get_object.return_value = {
+        "Body": BytesIO(
+            json.dumps(
+                {
+                    "bucket_name": "input-bucket",
+                    "s3_file_path": "exports/users.jsonl",
+                    "pii_fields": ["user.contact.email"],
+                }
+            ).encode("utf-8")
+        )
+    }
+    mock_obfuscate_pii_json.return_value = 256
+
+    response = handler(make_s3_event("invocation.json"), {})
+
+    assert response["statusCode"] == 200
+    mock_obfuscate_pii_json.assert_called_once_with(
+        "input-bucket",
+        "exports/users.jsonl",
+        ["user.contact.email"],
+        "processed-bucket",
+        "processed/users.jsonl",
+        output_compression=None,
+        prefetch_blocks=DEFAULT_PREFETCH_BLOCKS,
+        upload_concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+    )
+
+
+@patch.dict("os.environ", {"GDPR_HMAC_KEY": "test-key"})
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_hmac_strategy_is_consistent(mock_s3):
+    csv_content = (
+        b"id,email,phone\n"
+        b"1,a@example.com,007\n"
+        b"2,b@example.com,\n"
+        b"3,a@example.com,007\n"
+    )
+    mock_s3.get_object.return_value = {"Body": BytesIO(csv_content)}
+
+    result = obfuscate_pii(
+        "test-bucket", "test.csv", ["email", "phone"], strategy="hmac"
+    )
+
+    df = pd.read_csv(BytesIO(result), dtype=str)
+    assert df["id"].tolist() == ["1", "2", "3"]
+    assert df["email"][0] == df["email"][2] != df["email"][1]
+    assert df["phone"][0] == pseudonymise_value("007", b"test-key")
+    assert pd.isna(df["phone"][1])
+
+
+@patch.dict("os.environ", {"GDPR_HMAC_KEY": "test-key"})
+def test_obfuscate_pii_stream_hmac_matches_memory(mock_stream_buckets):
+    s3 = mock_stream_buckets
+    csv_content = b"name,email\n" + b"".join(
+        b"Person %d,user%d@example.com\n" % (i, i % 7) for i in range(50)
+    )
+    s3.put_object(Bucket="stream-input-bucket", Key="test.csv", Body=csv_content)
+
+    with patch(
+        "src.utils.pseudonymise.pseudonymise_value", wraps=pseudonymise_value
+    ) as spy:
+        obfuscate_pii_stream(
+            "stream-input-bucket",
+            "test.csv",
+            ["email"],
+            "stream-processed-bucket",
+            "processed/test.csv",
+            chunk_rows=10,
+            strategy="hmac",
+        )
+
+    body = s3.get_object(Bucket="stream-processed-bucket", Key="processed/test.csv")[
+        "Body"
+    ].read()
+    assert body == obfuscate_pii(
+        "stream-input-bucket", "test.csv", ["email"], strategy="hmac"
+    )
+    assert spy.call_count == 7
+
+
+@pytest.mark.parametrize(
+    "engine, env, expected_error",
+    [
+        ("pandas", {}, "No HMAC key configured"),
+        ("splice", {"GDPR_HMAC_KEY": "k"}, "need the pandas or pyarrow engine"),
+    ],
+    ids=["no_key", "splice_engine"],
+)
+@patch("src.utils.processing2.s3")
+@patch("src.utils.processing2.logger")
+def test_obfuscate_pii_hmac_strategy_errors(
+    mock_logger, mock_s3, engine, env, expected_error
+):
+    with patch.dict("os.environ", env):
+        result = obfuscate_pii(
+            "test-bucket", "test.csv", ["name"], engine=engine, strategy="hmac"
+        )
+
+    assert result is None
+    mock_s3.get_object.assert_not_called()
+    assert expected_error in mock_logger.error.call_args[0][0]
+
+
+@patch("src.utils.processing2.s3")
+def test_obfuscate_pii_per_field_strategies(mock_s3):
+    csv_content = (
+        b"name,email,card,dob,id\n"
+        b"John,john@example.net,4111111111111111,1990-05-12,007\n"
+    )
+    mock_s3.get_object.return_value = {"Body": BytesIO(csv_content)}
+
+    result = obfuscate_pii(
+        "test-bucket",
+        "test.csv",
+        ["name", "email", "card", "dob"],
+        strategies={
+            "email": "email_domain",
+            "card": {"name": "keep_last", "n": 4},
+            "dob": "year",
+        },
+    )
+
+    assert result == (
+        b"name,email,card,dob,id\n***,***@example.net,************1111,1990,7\n"
+    )
+
+
+@patch("src.utils.processing2.s3")
+@patch("src.utils.processing2.logger")
+def test_obfuscate_pii_strategies_reject_parquet(mock_logger, mock_s3):
+    source = BytesIO()
+    pq.write_table(pa.table({"email": ["john@example.com"]}), source)
+    mock_s3.get_object.return_value = {"Body": BytesIO(source.getvalue())}
+
+    result = obfuscate_pii(
+        "test-bucket", "export", ["email"], strategies={"email": "email_domain"}
+    )
+
+    assert result is None
+    assert "only support CSV input" in mock_logger.error.call_args[0][0]
+
+
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_emits_one_metrics_line(
+    mock_empty_bucket, mock_s3, mock_get_bucket_names, capsys
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    csv_data = b"name,email\nJohn,john@example.com\n"
+
+    mock_s3.head_object.side_effect = fake_head_object
+    def get_object(Bucket, Key):
+        if Key.endswith(".json"):
+            return mock_invocation_json(Bucket, Key)
+        return {"Body": BytesIO(csv_data)}
+
+    mock_s3.get_object.side_effect = get_object
+
+    response = handler(make_s3_event("data.json"), {})
+
+    assert response["statusCode"] == 200
+    lines = [
+        line for line in capsys.readouterr().out.splitlines() if '"_aws"' in line
+    ]
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record["statusCode"] == 200
+    assert record["Records"] == 1
+    assert record["FailedRecords"] == 0
+    assert record["BytesIn"] == len(csv_data)
+    assert record["BytesOut"] > 0
+    for name in ("StateLookup", "Download", "Mask", "Upload", "Cleanup"):
+        assert record[f"{name}Duration"] >= 0
+
+
+@pytest.mark.parametrize("engine", ["pandas", "splice"])
+def test_obfuscate_pii_stream_gzip_input_and_output(mock_stream_buckets, engine):
+    s3 = mock_stream_buckets
+    csv_content = (
+        "name,email,phone\n"
+        "John,john@example.com,123\n"
+        "Jane,jane@example.com,456\n"
+    )
+    s3.put_object(
+        Bucket="stream-input-bucket", Key="test.csv", Body=csv_content.encode()
+    )
+    s3.put_object(
+        Bucket="stream-input-bucket",
+        Key="test.csv.gz",
+        Body=gzip.compress(csv_content.encode()),
+    )
+
+    bytes_written = obfuscate_pii_stream(
+        "stream-input-bucket",
+        "test.csv.gz",
+        ["email"],
+        "stream-processed-bucket",
+        "processed/test.csv.gz",
+        chunk_rows=1,
+        engine=engine,
+        output_compression="gzip",
+    )
+
+    body = s3.get_object(
+        Bucket="stream-processed-bucket", Key="processed/test.csv.gz"
+    )["Body"].read()
+    assert bytes_written == len(body)
+    assert gzip.decompress(body) == obfuscate_pii(
+        "stream-input-bucket", "test.csv", ["email"], engine=engine
+    )
+
+
+def test_obfuscate_pii_detects_compression_from_magic_bytes(mock_stream_buckets):
+    s3 = mock_stream_buckets
+    csv_content = b"name,email\nJohn,john@example.com\n"
+    s3.put_object(
+        Bucket="stream-input-bucket",
+        Key="export-2024",
+        Body=bz2.compress(csv_content),
+    )
+
+    result = obfuscate_pii(
+        "stream-input-bucket", "export-2024", ["email"], output_compression="gzip"
+    )
+
+    assert gzip.decompress(result) == b"name,email\nJohn,***\n"
+
+
+def test_obfuscate_pii_json_decompresses_json_lines(mock_stream_buckets):
+    s3 = mock_stream_buckets
+    lines = b'{"user": {"email": "a@b.com"}}\n{"user": {"email": "c@d.com"}}\n'
+    s3.put_object(
+        Bucket="stream-input-bucket", Key="users.jsonl.gz", Body=gzip.compress(lines)
+    )
+
+    obfuscate_pii_json(
+        "stream-input-bucket",
+        "users.jsonl.gz",
+        ["user.email"],
+        "stream-processed-bucket",
+        "processed/users.jsonl",
+    )
+
+    body = s3.get_object(Bucket="stream-processed-bucket", Key="processed/users.jsonl")[
+        "Body"
+    ].read()
+    assert body == b'{"user":{"email":"***"}}\n' * 2
+
+
+@pytest.mark.parametrize(
+    "key, settings, expected_mode, expected_key, expected_compression",
+    [
+        ("data.csv.gz", {}, "stream", "processed/data.csv.gz", "gzip"),
+        ("data.csv.zst", {}, "stream", "processed/data.csv.zst", "zstd"),
+        (
+            "data.csv.gz",
+            {"output_compression": "none"},
+            "stream",
+            "processed/data.csv",
+            None,
+        ),
+        (
+            "data.csv.bz2",
+            {"mode": "parallel"},
+            "stream",
+            "processed/data.csv.bz2",
+            "bz2",
+        ),
+        (
+            "data.csv",
+            {"output_compression": "gzip"},
+            "memory",
+            "processed/data.csv.gz",
+            "gzip",
+        ),
+    ],
+)
+@mock.patch("src.utils.processing2.get_bucket_names_from_tf_state")
+@mock.patch("src.utils.processing2.s3")
+@mock.patch("src.utils.processing2.obfuscate_pii_stream")
+@mock.patch("src.utils.processing2.obfuscate_pii")
+@mock.patch("src.utils.processing2.empty_bucket")
+def test_handler_routes_compressed_files(
+    mock_empty_bucket,
+    mock_obfuscate_pii,
+    mock_obfuscate_pii_stream,
+    mock_s3,
+    mock_get_bucket_names,
+    key,
+    settings,
+    expected_mode,
+    expected_key,
+    expected_compression,
+):
+    mock_get_bucket_names.return_value = (
+        "input-bucket",
+        "processed-bucket",
+        "invocation-bucket",
+    )
+    mock_s3.head_object.side_effect = fake_head_object
+    mock_s3.get_object.return_value = {
+        "Body": BytesIO(
+            json.dumps(
+                {
+                    "bucket_name": "input-bucket",
+                    "s3_file_path": key,
+                    "pii_fields": ["name"],
+                    **settings,
+                }
+            ).encode("utf-8")
+        )
+    }
+    mock_obfuscate_pii_stream.return_value = 1024
+    mock_obfuscate_pii.return_value = b"obfuscated_data"
+
+    response = handler(make_s3_event("invocation.json"), {})
+
+    assert response["statusCode"] == 200
+    if expected_mode == "stream":
+        mock_obfuscate_pii.assert_not_called()
+        args, kwargs = mock_obfuscate_pii_stream.call_args
+        assert args[4] == expected_key
+        assert kwargs["output_compression"] == expected_compression
+    else:
+        mock_obfuscate_pii_stream.assert_not_called()
+        assert (
+            mock_obfuscate_pii.call_args.kwargs["output_compression"]
+            == expected_compression
+        )
+        mock_s3.put_object.assert_any_call(
+            Bucket="processed-bucket", Key=expected_key, Body=b"obfuscated_data"
+        )
+
+
+def test_handler_rejects_unknown_output_compression():
+    with mock.patch(
+        "src.utils.processing2.get_bucket_names_from_tf_state",
+        return_value=("input-bucket", "processed-bucket", "invocation-bucket"),
+    ), mock.patch("src.utils.processing2.s3") as mock_s3:
+        mock_s3.get_object.return_value = {
+            "Body": BytesIO(
+                json.dumps(
+                    {
+                        "bucket_name": "input-bucket",
+                        "s3_file_path": "data.csv",
+                        "pii_fields": ["name"],
+                        "output_compression": "lzma",
+                    }
+                ).encode("utf-8")
+            )
+        }
+
+        response = handler(make_s3_event("invocation.json"), {})
+
+    assert response["statusCode"] == 500
+    mock_s3.put_object.assert_not_called()
+
+
+@pytest.fixture
+def mock_job_buckets():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        for bucket in [
+            "job-input-bucket",
+            "job-processed-bucket",
+            "job-invocation-bucket",
+        ]:
+            s3.create_bucket(
+                Bucket=bucket,
+                CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+            )
+        for day in ("01", "02"):
+            for part in ("0000", "0001"):
+                s3.put_object(
+                    Bucket="job-input-bucket",
+                    Key=f"exports/dt=2024-06-{day}/part-{part}.csv",
+                    Body=f"name,email\nJohn,john@{day}.com\n".encode(),
+                )
+        s3.put_object(Bucket="job-input-bucket", Key="exports/dt=2024-06-01/", Body=b"")
+        yield s3
+
+
+def run_job(s3, settings):
+    s3.put_object(
+        Bucket="job-invocation-bucket",
+        Key="job.json",
+        Body=json.dumps(
+            {"bucket_name": "job-input-bucket", "pii_fields": ["email"], **settings}
+        ),
+    )
+    with mock.patch(
+        "src.utils.processing2.get_bucket_names_from_tf_state",
+        return_value=(
+            "job-input-bucket",
+            "job-processed-bucket",
+            "job-invocation-bucket",
+        ),
+    ):
+        response = handler(
+            make_s3_event("job.json", bucket_name="job-invocation-bucket"), {}
+        )
+    report = json.loads(
+        s3.get_object(Bucket="job-processed-bucket", Key="reports/job.json")[
+            "Body"
+        ].read()
+    )
+    return response, report
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"s3_prefix": "exports/"},
+        {
+            "s3_file_paths": [
+                "exports/dt=2024-06-01/part-0000.csv",
+                "exports/dt=2024-06-01/part-0001.csv",
+                "s3://job-input-bucket/exports/dt=2024-06-02/part-0000.csv",
+                "exports/dt=2024-06-02/part-0001.csv",
+            ]
+        },
+        {"manifest": "manifest.txt"},
+        {"manifest": "s3://job-input-bucket/manifest.json", "file_workers": 1},
+    ],
+    ids=["prefix", "list", "text_manifest", "json_manifest"],
+)
+def test_handler_processes_job_of_many_files(mock_job_buckets, settings):
+    s3 = mock_job_buckets
+    keys = [
+        f"exports/dt=2024-06-{day}/part-{part}.csv"
+        for day in ("01", "02")
+        for part in ("0000", "0001")
+    ]
+    s3.put_object(
+        Bucket="job-input-bucket",
+        Key="manifest.txt",
+        Body="\n".join(
+            [
+                keys[0],
+                keys[1],
+                f"job-input-bucket,{keys[2].replace('=', '%3D')}",
+                keys[3],
+            ]
+        ),
+    )
+    s3.put_object(Bucket="job-input-bucket", Key="manifest.json", Body=json.dumps(keys))
+
+    response, report = run_job(s3, settings)
+
+    assert response["statusCode"] == 200
+    assert report["processed"] == 4
+    assert report["failed"] == 0
+    assert [result["s3_file_path"] for result in report["files"]] == keys
+    for key, result in zip(keys, report["files"]):
+        assert result["status"] == "succeeded"
+        assert result["output_key"] == f"processed/{key}"
+        assert result["bytes_in"] == len(b"name,email\nJohn,john@01.com\n")
+        assert result["bytes_out"] == len(b"name,email\nJohn,***\n")
+        assert result["duration_ms"] >= 0
+        body = s3.get_object(Bucket="job-processed-bucket", Key=f"processed/{key}")
+        assert body["Body"].read() == b"name,email\nJohn,***\n"
+    assert report["bytes_in"] == sum(result["bytes_in"] for result in report["files"])
+    remaining = [
+        obj["Key"]
+        for obj in s3.list_objects_v2(Bucket="job-input-bucket").get("Contents", [])
+    ]
+    assert not any(key in remaining for key in keys)
+    assert "Contents" not in s3.list_objects_v2(Bucket="job-invocation-bucket")
+
+
+@pytest.mark.parametrize(
+    "mode, settings, expected",
+    [
+        ("memory", {}, {"splice": 4}),
+        ("stream", {}, {"pandas": 4}),
+        ("memory", {"engine": "auto"}, {"splice": 4}),
+        ("stream", {"engine": "auto", "strategy": "email_domain"}, {"pyarrow": 4}),
+    ],
+)
+def test_handler_job_reports_engines(
+    mock_job_buckets, mode, settings, expected, capsys
+):
+    response, report = run_job(
+        mock_job_buckets, {"s3_prefix": "exports/", "mode": mode, **settings}
+    )
+
+    assert report["engines"] == expected
+    assert {result["engine"] for result in report["files"]} == set(expected)
+    message = json.loads(response["body"])["results"][0]["message"]
+    assert message["engines"] == expected
+    line = next(
+        line for line in capsys.readouterr().out.splitlines() if '"_aws"' in line
+    )
+    record = json.loads(line)
+    assert sorted(file["File"] for file in record["Files"]) == sorted(
+        result["s3_file_path"] for result in report["files"]
+    )
+    for file in record["Files"]:
+        assert file["mode"] == mode
+        assert file["engine"] == next(iter(expected))
+    assert record["engine"] == next(iter(expected))
+
+
+def test_handler_job_keeps_files_outside_the_input_bucket(mock_job_buckets):
+    s3 = mock_job_buckets
+    s3.create_bucket(
+        Bucket="other-bucket",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    s3.put_object(Bucket="other-bucket", Key="data.csv", Body=b"name,email\nJo,j@x\n")
+    s3.put_object(
+        Bucket="job-input-bucket",
+        Key="manifest.txt",
+        Body="other-bucket,data.csv\nexports/dt=2024-06-01/part-0000.csv\n",
+    )
+
+    response, report = run_job(s3, {"manifest": "manifest.txt"})
+
+    assert response["statusCode"] == 200
+    assert report["processed"] == 2
+    assert s3.get_object(Bucket="other-bucket", Key="data.csv")["Body"].read() == (
+        b"name,email\nJo,j@x\n"
+    )
+    remaining = [
+        obj["Key"]
+        for obj in s3.list_objects_v2(Bucket="job-input-bucket").get("Contents", [])
+    ]
+    assert "exports/dt=2024-06-01/part-0000.csv" not in remaining
+
+
+@pytest.mark.parametrize(
+    "mode, expected",
+    [("memory", {"splice": 1}), ("stream", {"pyarrow+splice": 1})],
+)
+def test_handler_job_reports_fallback_engine(mock_job_buckets, mode, expected):
+    s3 = mock_job_buckets
+    rows = b"".join(b"Ann,ann%d@example.com\n" % row for row in range(10))
+    s3.put_object(
+        Bucket="job-input-bucket",
+        Key="ragged/data.csv",
+        Body=b"name,email\n" + rows + b"Bo,bo@example.com,extra\n",
+    )
+
+    # Small blocks leave the well-formed rows to Arrow and the ragged one to splice.
+    with patch("src.utils.obfuscator.DEFAULT_CHUNK_BYTES", 64):
+        response, report = run_job(
+            s3, {"s3_prefix": "ragged/", "mode": mode, "engine": "pyarrow"}
+        )
+
+    assert report["engines"] == expected
+    assert [result["engine"] for result in report["files"]] == list(expected)
+
+
+@pytest.mark.parametrize(
+    "engine, mode, size, header, expected",
+    [
+        (None, "memory", 100, None, "splice"),
+        (None, "memory", 10 * 1024 * 1024, None, "pandas"),
+        (None, "stream", 100, None, "pandas"),
+        ("csv", "stream", 100, None, "csv"),
+        (None, "parallel", 100, None, "splice"),
+        ("auto", "json", 100, None, None),
+        ("auto", "memory", 100, None, "splice"),
+        ("auto", "memory", 10 * 1024 * 1024, None, "splice"),
+        ("auto", "stream", 200 * 1024 * 1024, b"id,name\n1,J\n", "pyarrow"),
+        ("auto", "memory", None, b"id,name\n1,J\n", "pyarrow"),
+        ("auto", "memory", 200 * 1024 * 1024, b",".join([b"c"] * 40) + b"\n", "splice"),
+    ],
+)
+@patch("src.utils.processing2.read_sample")
+def test_resolve_engine(mock_read_sample, engine, mode, size, header, expected):
+    mock_read_sample.return_value = header
+    plan = build_masking_plan(["name"])
+
+    assert resolve_engine(engine, mode, plan, "bucket", "data.csv", size) == expected
+    assert mock_read_sample.called == (header is not None)
+
+
+def test_handler_job_with_missing_file_keeps_inputs(mock_job_buckets):
+    s3 = mock_job_buckets
+    keys = ["exports/dt=2024-06-01/part-0000.csv", "exports/missing.csv"]
+
+    response, report = run_job(s3, {"s3_file_paths": keys})
+
+    assert response["statusCode"] == 500
+    assert report["processed"] == 1
+    assert report["failed"] == 1
+    missing = report["files"][1]
+    assert missing["status"] == "failed"
+    assert missing["error"] == "Object not found."
+    assert missing["bytes_in"] is None
+    message = json.loads(response["body"])["results"][0]["message"]
+    assert message == {
+        "processed": 1,
+        "failed": 1,
+        "skipped": 0,
+        "engines": {"splice": 1},
+        "report_key": "reports/job.json",
+    }
+    s3.head_object(Bucket="job-input-bucket", Key=keys[0])
+    s3.head_object(Bucket="job-invocation-bucket", Key="job.json")
+
+
+def test_handler_job_retry_skips_processed_files(mock_job_buckets):
+    s3 = mock_job_buckets
+    keys = ["exports/dt=2024-06-01/part-0000.csv", "exports/missing.csv"]
+    run_job(s3, {"s3_file_paths": keys})
+    s3.put_object(
+        Bucket="job-input-bucket", Key=keys[1], Body=b"name,email\nJane,jane@x.com\n"
+    )
+
+    response, report = run_job(s3, {"s3_file_paths": keys})
+
+    assert response["statusCode"] == 200
+    assert [result["status"] for result in report["files"]] == [
+        "skipped",
+        "succeeded",
+    ]
+    assert report["processed"] == 2
+    assert report["skipped"] == 1
+    assert report["files"][0]["output_key"] == f"processed/{keys[0]}"
+    assert report["files"][0]["bytes_out"] == len(b"name,email\nJohn,***\n")
+    assert "Contents" not in s3.list_objects_v2(Bucket="job-invocation-bucket")
+
+
+@pytest.mark.parametrize(
+    "settings, expected",
+    [
+        ({"force": True}, "succeeded"),
+        ({"pii_fields": ["name", "email"]}, "succeeded"),
+        ({"mode": "stream"}, "succeeded"),
+        ({}, "skipped"),
+    ],
+    ids=["forced", "settings_changed", "mode_changed", "unchanged"],
+)
+def test_handler_job_reprocesses_when_forced_or_changed(
+    mock_job_buckets, settings, expected
+):
+    s3 = mock_job_buckets
+    keys = ["exports/dt=2024-06-01/part-0000.csv", "exports/missing.csv"]
+    run_job(s3, {"s3_file_paths": keys})
+
+    response, report = run_job(s3, {"s3_file_paths": keys[:1], **settings})
+
+    assert response["statusCode"] == 200
+    assert report["files"][0]["status"] == expected
+
+
+def test_handler_replayed_event_is_not_processed_again(mock_job_buckets):
+    s3 = mock_job_buckets
+    keys = ["exports/dt=2024-06-01/part-0000.csv"]
+    response, _ = run_job(s3, {"s3_file_paths": keys})
+    assert response["statusCode"] == 200
+    body = {"bucket_name": "job-input-bucket", "pii_fields": ["email"]}
+    body["s3_file_paths"] = keys
+    etag = hashlib.md5(json.dumps(body).encode()).hexdigest()
+    event = make_s3_event("job.json", bucket_name="job-invocation-bucket")
+    event["Records"][0]["s3"]["object"]["eTag"] = etag
+
+    with mock.patch(
+        "src.utils.processing2.get_bucket_names_from_tf_state",
+        return_value=(
+            "job-input-bucket",
+            "job-processed-bucket",
+            "job-invocation-bucket",
+        ),
+    ), mock.patch("src.utils.processing2.process_files") as mock_process_files:
+        replayed = handler(event, {})
+
+    assert replayed["statusCode"] == 200
+    result = json.loads(replayed["body"])["results"][0]
+    assert result["message"] == "Invocation already processed."
+    mock_process_files.assert_not_called()
+
+
+@pytest.mark.parametrize("mode", ["memory", "stream"])
+def test_handler_auto_detects_pii_columns(mock_job_buckets, mode):
+    s3 = mock_job_buckets
+    s3.put_object(
+        Bucket="job-input-bucket",
+        Key="people.csv",
+        Body=b"id,email,Phone,town\n"
+        b"1,john@01.com,07700 900123,Leeds\n"
+        b"2,jane@02.com,+44 20 7946 0958,York\n",
+    )
+
+    response, report = run_job(
+        s3,
+        {
+            "s3_file_paths": ["people.csv"],
+            "pii_fields": ["email"],
+            "auto_detect": True,
+            "mode": mode,
+        },
+    )
+
+    assert response["statusCode"] == 200
+    body = s3.get_object(Bucket="job-processed-bucket", Key="processed/people.csv")
+    assert body["Body"].read() == (
+        b"id,email,Phone,town\n1,***,***,Leeds\n2,***,***,York\n"
+    )
+
+
+def test_handler_rejects_auto_detect_for_json_files(mock_job_buckets):
+    s3 = mock_job_buckets
+    s3.put_object(
+        Bucket="job-input-bucket", Key="people.jsonl", Body=b'{"email": "a@b.com"}\n'
+    )
+
+    response, report = run_job(
+        s3, {"s3_file_paths": ["people.jsonl"], "auto_detect": True}
+    )
+
+    assert response["statusCode"] == 500
+    assert report["files"][0]["error"] == (
+        "Automatic PII detection is only supported for CSV files."
+    )
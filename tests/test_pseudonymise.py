@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from src.utils.pseudonymise import (
+    load_hmac_key,
+    pseudonymise_column,
+    pseudonymise_value,
+)
+
+
+def test_pseudonymise_value_is_deterministic_and_keyed():
+    token = pseudonymise_value("john@example.com", b"key")
+
+    assert token == pseudonymise_value("john@example.com", b"key")
+    assert token != pseudonymise_value("john@example.com", b"other-key")
+    assert len(token) == 64
+
+
+def test_pseudonymise_column_hashes_each_unique_value_once():
+    values = pd.Series(["M", "F", "M", None, "F", "M"])
+
+    with patch(
+        "src.utils.pseudonymise.pseudonymise_value", wraps=pseudonymise_value
+    ) as spy:
+        tokens = pseudonymise_column(values, b"key")
+
+    assert spy.call_count == 2
+    assert tokens[0] == tokens[2] == tokens[5] == pseudonymise_value("M", b"key")
+    assert tokens[1] == tokens[4] == pseudonymise_value("F", b"key")
+    assert np.isnan(tokens[3])
+
+
+def test_pseudonymise_column_reuses_cache_between_chunks():
+    cache = {}
+    pseudonymise_column(pd.Series(["a", "b"]), b"key", cache)
+
+    with patch("src.utils.pseudonymise.pseudonymise_value") as spy:
+        tokens = pseudonymise_column(pd.Series(["b", "a", "b"]), b"key", cache)
+
+    spy.assert_not_called()
+    assert list(tokens) == [cache["b"], cache["a"], cache["b"]]
+
+
+@patch.dict("os.environ", {"GDPR_HMAC_KEY": "env-key"})
+def test_load_hmac_key_from_environment():
+    assert load_hmac_key() == b"env-key"
+
+
+def test_load_hmac_key_from_file(tmp_path):
+    key_file = tmp_path / "hmac.key"
+    key_file.write_bytes(b"file-key\n")
+
+    with patch.dict("os.environ", {"GDPR_HMAC_KEY_FILE": str(key_file)}, clear=True):
+        assert load_hmac_key() == b"file-key"
+
+
+@pytest.mark.parametrize("content", [b"", b"\n"], ids=["empty", "newline_only"])
+def test_load_hmac_key_empty_file(tmp_path, content):
+    key_file = tmp_path / "hmac.key"
+    key_file.write_bytes(content)
+
+    with patch.dict("os.environ", {}, clear=True):
+        with pytest.raises(ValueError, match="empty"):
+            load_hmac_key(str(key_file))
+
+
+def test_load_hmac_key_not_configured():
+    with patch.dict("os.environ", {}, clear=True):
+        with pytest.raises(ValueError, match="No HMAC key configured"):
+            load_hmac_key()
@@ -0,0 +1,81 @@
+from unittest.mock import ANY, patch, sentinel
+
+import pytest
+
+from src.utils.s3_client import LazyClient, client_settings, create_client
+
+
+def test_lazy_client_creates_client_on_first_use():
+    with patch("boto3.client") as mock_client:
+        client = LazyClient("s3")
+        mock_client.assert_not_called()
+
+        client.get_object(Bucket="bucket", Key="key")
+        client.put_object(Bucket="bucket", Key="key", Body=b"")
+
+    mock_client.assert_called_once_with("s3", config=ANY)
+    mock_client.return_value.get_object.assert_called_once_with(
+        Bucket="bucket", Key="key"
+    )
+
+
+def test_lazy_client_attributes_can_be_patched():
+    client = LazyClient("s3")
+    with patch("boto3.client"):
+        with patch.object(client, "get_object", return_value=sentinel.response):
+            assert client.get_object() is sentinel.response
+
+
+def test_create_client_defaults(monkeypatch):
+    monkeypatch.delenv("GDPR_S3_MAX_CONCURRENCY", raising=False)
+    monkeypatch.delenv("GDPR_S3_ENDPOINT_URL", raising=False)
+
+    client = create_client("s3", region_name="eu-west-2")
+
+    config = client.meta.config
+    assert config.max_pool_connections == 64
+    assert config.retries == {"mode": "adaptive", "total_max_attempts": 5}
+    assert config.tcp_keepalive is True
+    assert config.connect_timeout == 5
+    assert config.read_timeout == 60
+    assert "amazonaws.com" in client.meta.endpoint_url
+
+
+def test_create_client_reads_environment(monkeypatch):
+    monkeypatch.setenv("GDPR_S3_MAX_POOL_CONNECTIONS", "200")
+    monkeypatch.setenv("GDPR_S3_RETRY_MODE", "standard")
+    monkeypatch.setenv("GDPR_S3_MAX_ATTEMPTS", "3")
+    monkeypatch.setenv("GDPR_S3_READ_TIMEOUT", "2.5")
+    monkeypatch.setenv("GDPR_S3_ENDPOINT_URL", "http://localhost:9000")
+    monkeypatch.setenv("GDPR_S3_ADDRESSING_STYLE", "path")
+
+    client = create_client("s3", region_name="eu-west-2")
+
+    config = client.meta.config
+    assert config.max_pool_connections == 200
+    assert config.retries == {"mode": "standard", "total_max_attempts": 3}
+    assert config.read_timeout == 2.5
+    assert config.s3 == {"addressing_style": "path"}
+    assert client.meta.endpoint_url == "http://localhost:9000"
+
+
+def test_pool_is_at_least_the_shared_thread_pool(monkeypatch):
+    monkeypatch.delenv("GDPR_S3_MAX_POOL_CONNECTIONS", raising=False)
+    monkeypatch.setenv("GDPR_S3_MAX_CONCURRENCY", "128")
+
+    assert client_settings()["max_pool_connections"] == 128
+
+
+def test_create_client_overrides(monkeypatch):
+    monkeypatch.setenv("GDPR_S3_MAX_POOL_CONNECTIONS", "200")
+
+    client = create_client("s3", region_name="eu-west-2", max_pool_connections=7)
+
+    assert client.meta.config.max_pool_connections == 7
+
+
+def test_invalid_setting(monkeypatch):
+    monkeypatch.setenv("GDPR_S3_MAX_ATTEMPTS", "many")
+
+    with pytest.raises(ValueError):
+        client_settings()
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import MagicMock
+
+from src.utils.s3_io import S3IO, get_executor
+
+
+@pytest.fixture
+def s3_bucket():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="io-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3, "io-bucket"
+
+
+def test_head_objects_returns_none_for_missing_objects(s3_bucket):
+    s3, bucket_name = s3_bucket
+    s3.put_object(Bucket=bucket_name, Key="present.csv", Body=b"data")
+
+    heads = S3IO(s3).head_objects(bucket_name, ["present.csv", "missing.csv"])
+
+    assert heads[0]["ContentLength"] == 4
+    assert heads[1] is None
+
+
+def test_requests_overlap():
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def head_object(**request):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return {"Key": request["Key"]}
+
+    client = MagicMock()
+    client.head_object.side_effect = head_object
+    keys = [f"key-{index}" for index in range(10)]
+
+    started = time.perf_counter()
+    heads = S3IO(client).head_objects("bucket", keys)
+    elapsed = time.perf_counter() - started
+
+    assert [head["Key"] for head in heads] == keys
+    assert peak > 1
+    assert elapsed < 0.05 * len(keys) / 2
+
+
+def test_executor_is_shared():
+    assert S3IO(MagicMock()).executor is get_executor()
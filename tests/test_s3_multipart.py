@@ -0,0 +1,104 @@
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import MagicMock
+
+from src.utils.s3_multipart import S3MultipartWriter, MIN_PART_SIZE
+
+
+@pytest.fixture
+def s3_bucket():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="output-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        yield s3, "output-bucket"
+
+
+def test_small_output_is_written_with_single_put(s3_bucket):
+    s3, bucket_name = s3_bucket
+
+    with S3MultipartWriter(s3, bucket_name, "small.csv") as writer:
+        writer.write(b"name,email\n")
+        writer.write(b"John,***\n")
+
+    assert writer.upload_id is None
+    assert writer.bytes_written == 20
+    body = s3.get_object(Bucket=bucket_name, Key="small.csv")["Body"].read()
+    assert body == b"name,email\nJohn,***\n"
+
+
+def test_large_output_is_uploaded_in_parts(s3_bucket):
+    s3, bucket_name = s3_bucket
+    line = b"1001,***,2022-05-15,***\n"
+    data = line * (2 * MIN_PART_SIZE // len(line) + 10)
+
+    with S3MultipartWriter(s3, bucket_name, "large.csv", part_size=MIN_PART_SIZE) as writer:
+        for start in range(0, len(data), 1024 * 1024):
+            writer.write(data[start : start + 1024 * 1024])
+
+    assert writer.upload_id is not None
+    assert [part["PartNumber"] for part in writer.parts] == [1, 2, 3]
+    body = s3.get_object(Bucket=bucket_name, Key="large.csv")["Body"].read()
+    assert body == data
+
+
+def test_exception_aborts_upload(s3_bucket):
+    s3, bucket_name = s3_bucket
+
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(
+            s3, bucket_name, "failed.csv", part_size=MIN_PART_SIZE
+        ) as writer:
+            writer.write(b"x" * MIN_PART_SIZE)
+            raise RuntimeError("transform failed")
+
+    assert s3.list_multipart_uploads(Bucket=bucket_name).get("Uploads", []) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=bucket_name)
+
+
+def test_write_after_close_raises():
+    writer = S3MultipartWriter(MagicMock(), "bucket", "key")
+    writer.close()
+
+    with pytest.raises(ValueError):
+        writer.write(b"data")
+
+
+def test_part_size_below_minimum_raises():
+    with pytest.raises(ValueError):
+        S3MultipartWriter(MagicMock(), "bucket", "key", part_size=1024)
+
+
+def test_parts_are_uploaded_concurrently(s3_bucket):
+    s3, bucket_name = s3_bucket
+    data = b"".join(bytes([65 + i]) * MIN_PART_SIZE for i in range(4)) + b"tail"
+
+    with S3MultipartWriter(
+        s3, bucket_name, "concurrent.csv", part_size=MIN_PART_SIZE, max_in_flight=3
+    ) as writer:
+        for start in range(0, len(data), 1024 * 1024):
+            writer.write(data[start : start + 1024 * 1024])
+
+    assert [part["PartNumber"] for part in writer.parts] == [1, 2, 3, 4, 5]
+    body = s3.get_object(Bucket=bucket_name, Key="concurrent.csv")["Body"].read()
+    assert body == data
+
+
+def test_failed_concurrent_part_aborts_upload():
+    s3 = MagicMock()
+    s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    s3.upload_part.side_effect = [{"ETag": "a"}, ConnectionError("reset")]
+
+    with pytest.raises(ConnectionError):
+        with S3MultipartWriter(
+            s3, "bucket", "key", part_size=MIN_PART_SIZE, max_in_flight=2
+        ) as writer:
+            writer.write(b"x" * (2 * MIN_PART_SIZE))
+
+    s3.complete_multipart_upload.assert_not_called()
+    s3.abort_multipart_upload.assert_called_once_with(
+        Bucket="bucket", Key="key", UploadId="upload-1"
+    )
@@ -0,0 +1,234 @@
+import boto3
+import json
+import pytest
+from moto import mock_aws
+from unittest.mock import patch, MagicMock
+
+from src.utils.tf_state import get_bucket_names_from_tf_state
+
+STATE_CONTENT = {
+    "outputs": {
+        "gdpr_input_bucket": {"value": "input-bucket-name"},
+        "gdpr_processed_bucket": {"value": "processed-bucket-name"},
+        "gdpr_invocation_bucket": {"value": "invocation-bucket-name"},
+    }
+}
+
+
+@pytest.fixture
+def s3_state():
+    """
+    Sets up a mock S3 bucket holding a Terraform state file.
+    """
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="tf-state-gdpr-obfuscator",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+        s3.put_object(
+            Bucket="tf-state-gdpr-obfuscator",
+            Key="tf-state",
+            Body=json.dumps(STATE_CONTENT),
+        )
+        yield s3
+
+
+def test_get_bucket_names_from_tf_state_reads_state(s3_state):
+    result = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_state
+    )
+
+    assert result == ("input-bucket-name", "processed-bucket-name", "invocation-bucket-name")
+
+
+def test_get_bucket_names_from_tf_state_no_such_key(s3_state):
+    result = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "non-existent-key", s3_client=s3_state
+    )
+
+    assert result == (None, None, None)
+
+
+def test_get_bucket_names_from_tf_state_is_cached(s3_state):
+    s3_client = MagicMock(wraps=s3_state)
+
+    first = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_client
+    )
+    second = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_client
+    )
+
+    assert first == second
+    assert s3_client.get_object.call_count == 1
+
+
+def test_get_bucket_names_from_tf_state_revalidates_with_etag(s3_state, monkeypatch):
+    monkeypatch.setenv("GDPR_STATE_CACHE_TTL", "0")
+    s3_client = MagicMock(wraps=s3_state)
+
+    get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_client
+    )
+    etag = s3_state.head_object(Bucket="tf-state-gdpr-obfuscator", Key="tf-state")[
+        "ETag"
+    ]
+    unchanged = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_client
+    )
+
+    assert s3_client.get_object.call_args.kwargs["IfNoneMatch"] == etag
+    assert unchanged[0] == "input-bucket-name"
+
+    changed_state = json.loads(json.dumps(STATE_CONTENT))
+    changed_state["outputs"]["gdpr_input_bucket"]["value"] = "new-input-bucket"
+    s3_state.put_object(
+        Bucket="tf-state-gdpr-obfuscator",
+        Key="tf-state",
+        Body=json.dumps(changed_state),
+    )
+    changed = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_client
+    )
+
+    assert changed[0] == "new-input-bucket"
+
+
+def test_get_bucket_names_from_tf_state_uses_stale_cache_on_error(s3_state, monkeypatch):
+    monkeypatch.setenv("GDPR_STATE_CACHE_TTL", "0")
+    get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_state
+    )
+    failing_client = MagicMock()
+    failing_client.get_object.side_effect = Exception("S3 error")
+
+    result = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=failing_client
+    )
+
+    assert result == ("input-bucket-name", "processed-bucket-name", "invocation-bucket-name")
+
+
+def test_get_bucket_names_from_tf_state_env_overrides(monkeypatch):
+    monkeypatch.setenv("GDPR_INPUT_BUCKET", "env-input")
+    monkeypatch.setenv("GDPR_PROCESSED_BUCKET", "env-processed")
+    monkeypatch.setenv("GDPR_INVOCATION_BUCKET", "env-invocation")
+    s3_client = MagicMock()
+
+    result = get_bucket_names_from_tf_state("any-bucket", "any-key", s3_client=s3_client)
+
+    assert result == ("env-input", "env-processed", "env-invocation")
+    s3_client.get_object.assert_not_called()
+
+
+def test_get_bucket_names_from_tf_state_partial_env_override(s3_state, monkeypatch):
+    monkeypatch.setenv("GDPR_PROCESSED_BUCKET", "env-processed")
+
+    result = get_bucket_names_from_tf_state(
+        "tf-state-gdpr-obfuscator", "tf-state", s3_client=s3_state
+    )
+
+    assert result == ("input-bucket-name", "env-processed", "invocation-bucket-name")
+
+
+@pytest.mark.parametrize(
+    "bucket_name, object_key, mock_response, expected, test_id",
+    [
+        (
+            "test-bucket",
+            "test-key",
+            {
+                "Body": MagicMock(
+                    read=MagicMock(
+                        return_value=json.dumps(
+                            {
+                                "outputs": {
+                                    "gdpr_input_bucket": {"value": "input-bucket"},
+                                    "gdpr_processed_bucket": {
+                                        "value": "processed-bucket"
+                                    },
+                                    "gdpr_invocation_bucket": {
+                                        "value": "invocation-bucket"
+                                    },
+                                }
+                            }
+                        ).encode("utf-8")
+                    )
+                )
+            },
+            ("input-bucket", "processed-bucket", "invocation-bucket"),
+            "happy_path",
+        ),
+        (
+            "test-bucket",
+            "test-key",
+            {
+                "Body": MagicMock(
+                    read=MagicMock(
+                        return_value=json.dumps(
+                            {
+                                "outputs": {
+                                    "gdpr_input_bucket": {"value": ""},
+                                    "gdpr_processed_bucket": {"value": ""},
+                                    "gdpr_invocation_bucket": {"value": ""},
+                                }
+                            }
+                        ).encode("utf-8")
+                    )
+                )
+            },
+            ("", "", ""),
+            "empty_bucket_names",
+        ),
+        (
+            "test-bucket",
+            "test-key",
+            {
+                "Body": MagicMock(
+                    read=MagicMock(
+                        return_value=json.dumps({"outputs": {}}).encode("utf-8")
+                    )
+                )
+            },
+            (None, None, None),
+            "missing_keys",
+        ),
+        (
+            "test-bucket",
+            "test-key",
+            {"Body": MagicMock(read=MagicMock(return_value=b"invalid json"))},
+            (None, None, None),
+            "invalid_json",
+        ),
+        (
+            "test-bucket",
+            "test-key",
+            Exception("S3 error"),
+            (None, None, None),
+            "s3_exception",
+        ),
+    ],
+    ids=[
+        test_id
+        for _, _, _, _, test_id in [
+            ("test-bucket", "test-key", None, None, "happy_path"),
+            ("test-bucket", "test-key", None, None, "empty_bucket_names"),
+            ("test-bucket", "test-key", None, None, "missing_keys"),
+            ("test-bucket", "test-key", None, None, "invalid_json"),
+            ("test-bucket", "test-key", None, None, "s3_exception"),
+        ]
+    ],
+)
+@patch("src.utils.tf_state.s3.get_object")
+def test_get_bucket_names_from_tf_state(
+    mock_get_object, bucket_name, object_key, mock_response, expected, test_id
+):
+    if isinstance(mock_response, Exception):
+        mock_get_object.side_effect = mock_response
+    else:
+        mock_get_object.return_value = mock_response
+
+    result = get_bucket_names_from_tf_state(bucket_name, object_key)
+
+    assert result == expected
@@ -1,17 +1,23 @@
 import boto3
 import json
 import pytest
+import re
 from moto import mock_aws
 from unittest.mock import patch, MagicMock
 
 from datetime import datetime
 
 from src.utils.upload import (
+    find_local_files,
     generate_s3_file_path,
+    main,
+    make_transfer_config,
     upload_file_to_s3,
-    get_bucket_names_from_tf_state,
+    upload_paths,
 )
 
+KEY_PATTERN = r"\d{8}T\d{12}Z_[0-9a-f]{8}_"
+
 
 @pytest.fixture
 def s3_upload_setup():
@@ -44,27 +50,31 @@ def s3_upload_setup():
         yield bucket_name, object_key
 
 
-def test_get_bucket_names_from_tf_state_no_such_key():
-    bucket_name = "tf-state-gdpr-obfuscator"
-    object_key = "non-existent-key"
-
-    result = get_bucket_names_from_tf_state(bucket_name, object_key)
-    assert result == (None, None, None)
-
-
 def test_generate_s3_file_path():
     """
     Tests the generation of a unique timestamped S3 file path.
     """
     local_file_path = "src/data/dummy_data_20_entries.csv"
     with patch("src.utils.upload.datetime") as mock_datetime:
-        fixed_timestamp = datetime(2024, 9, 12, 15, 30, 45)
+        fixed_timestamp = datetime(2024, 9, 12, 15, 30, 45, 123456)
         mock_datetime.now.return_value = fixed_timestamp
 
-        expected_timestamp = fixed_timestamp.strftime("%Y_%d_%m_%H:%M:%S")
-        expected_s3_file_path = f"{expected_timestamp}_dummy_data_20_entries.csv"
         result = generate_s3_file_path(local_file_path)
-        assert result == expected_s3_file_path
+        assert re.fullmatch(
+            r"20240912T153045123456Z_[0-9a-f]{8}_dummy_data_20_entries\.csv", result
+        )
+
+
+def test_generate_s3_file_path_is_unique_and_sortable():
+    with patch("src.utils.upload.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2024, 9, 12, 15, 30, 45)
+        same_time = {generate_s3_file_path("data.csv") for _ in range(1000)}
+        mock_datetime.now.return_value = datetime(2024, 12, 1, 9, 0, 0)
+        later = generate_s3_file_path("data.csv")
+
+    assert len(same_time) == 1000
+    assert all(key < later for key in same_time)
+    assert generate_s3_file_path("data.csv", "day/data.csv").endswith("_day/data.csv")
 
 
 def test_upload_file_to_s3_valid_input(s3_upload_setup):
@@ -82,7 +92,7 @@ def test_upload_file_to_s3_valid_input(s3_upload_setup):
 
         mock_s3_upload.assert_called_once()
 
-        assert result.startswith(datetime.now().strftime("%Y_%d_%m_%H:%M:%S"))
+        assert re.match(KEY_PATTERN + "dummy_data_20_entries.csv$", result)
 
 
 def test_upload_file_to_s3_file_not_found():
@@ -110,111 +120,101 @@ def test_upload_file_to_s3_generates_unique_timestamped_filename():
         fixed_timestamp = datetime(2024, 9, 12, 15, 30, 45)
         mock_datetime.now.return_value = fixed_timestamp
 
-        result = upload_file_to_s3(local_file_path, bucket_name)
+        first = upload_file_to_s3(local_file_path, bucket_name)
+        second = upload_file_to_s3(local_file_path, bucket_name)
 
-        expected_timestamp = fixed_timestamp.strftime("%Y_%d_%m_%H:%M:%S")
-        expected_s3_file_path = f"{expected_timestamp}_dummy_data_20_entries.csv"
-
-        assert result == expected_s3_file_path
-
-
-@pytest.mark.parametrize(
-    "bucket_name, object_key, mock_response, expected, test_id",
-    [
-        (
-            "test-bucket",
-            "test-key",
-            {
-                "Body": MagicMock(
-                    read=MagicMock(
-                        return_value=json.dumps(
-                            {
-                                "outputs": {
-                                    "gdpr_input_bucket": {"value": "input-bucket"},
-                                    "gdpr_processed_bucket": {
-                                        "value": "processed-bucket"
-                                    },
-                                    "gdpr_invocation_bucket": {
-                                        "value": "invocation-bucket"
-                                    },
-                                }
-                            }
-                        ).encode("utf-8")
-                    )
-                )
-            },
-            ("input-bucket", "processed-bucket", "invocation-bucket"),
-            "happy_path",
-        ),
-        (
-            "test-bucket",
-            "test-key",
-            {
-                "Body": MagicMock(
-                    read=MagicMock(
-                        return_value=json.dumps(
-                            {
-                                "outputs": {
-                                    "gdpr_input_bucket": {"value": ""},
-                                    "gdpr_processed_bucket": {"value": ""},
-                                    "gdpr_invocation_bucket": {"value": ""},
-                                }
-                            }
-                        ).encode("utf-8")
-                    )
-                )
-            },
-            ("", "", ""),
-            "empty_bucket_names",
-        ),
-        (
-            "test-bucket",
-            "test-key",
-            {
-                "Body": MagicMock(
-                    read=MagicMock(
-                        return_value=json.dumps({"outputs": {}}).encode("utf-8")
-                    )
-                )
-            },
-            (None, None, None),
-            "missing_keys",
-        ),
-        (
-            "test-bucket",
-            "test-key",
-            {"Body": MagicMock(read=MagicMock(return_value=b"invalid json"))},
-            (None, None, None),
-            "invalid_json",
-        ),
-        (
-            "test-bucket",
-            "test-key",
-            Exception("S3 error"),
-            (None, None, None),
-            "s3_exception",
-        ),
-    ],
-    ids=[
-        test_id
-        for _, _, _, _, test_id in [
-            ("test-bucket", "test-key", None, None, "happy_path"),
-            ("test-bucket", "test-key", None, None, "empty_bucket_names"),
-            ("test-bucket", "test-key", None, None, "missing_keys"),
-            ("test-bucket", "test-key", None, None, "invalid_json"),
-            ("test-bucket", "test-key", None, None, "s3_exception"),
+        assert first.startswith("20240912T153045000000Z_")
+        assert first != second
+
+
+@pytest.fixture
+def local_tree(tmp_path):
+    for path in ("a.csv", "b.json", "nested/day=1/a.csv", "nested/day=2/a.csv"):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(f"name\n{path}\n")
+    return tmp_path
+
+
+def test_find_local_files(local_tree):
+    found = find_local_files(
+        [
+            str(local_tree / "*.csv"),
+            str(local_tree / "nested"),
+            str(local_tree / "a.csv"),
+            str(local_tree / "missing.csv"),
         ]
-    ],
-)
-@patch("src.utils.upload.s3.get_object")
-def test_get_bucket_names_from_tf_state(
-    mock_get_object, bucket_name, object_key, mock_response, expected, test_id
-):
-    if isinstance(mock_response, Exception):
-        mock_get_object.side_effect = mock_response
-    else:
-        mock_get_object.return_value = mock_response
-
-    result = get_bucket_names_from_tf_state(bucket_name, object_key)
-
-    assert result == expected
+    )
+
+    assert found == [
+        (str(local_tree / "a.csv"), "a.csv"),
+        (str(local_tree / "nested/day=1/a.csv"), "day=1/a.csv"),
+        (str(local_tree / "nested/day=2/a.csv"), "day=2/a.csv"),
+    ]
+
+
+def test_make_transfer_config():
+    config = make_transfer_config(
+        part_size_mb=32, part_concurrency=4, multipart_threshold_mb=64
+    )
+
+    assert config.multipart_chunksize == 32 * 1024 * 1024
+    assert config.multipart_threshold == 64 * 1024 * 1024
+    assert config.max_concurrency == 4
+    assert config.use_threads
+
+
+def test_upload_paths_reports_each_file(local_tree):
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-2")
+        s3.create_bucket(
+            Bucket="test-bucket",
+            CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+        )
+
+        report = upload_paths([str(local_tree)], "test-bucket", prefix="raw/")
+
+        assert report["failed"] == 0
+        assert len(report["files"]) == 4
+        assert report["bytes"] == sum(result["bytes"] for result in report["files"])
+        assert report["throughput_mb_s"] > 0
+        keys = [result["s3_file_path"] for result in report["files"]]
+        assert len(set(keys)) == 4
+        assert all(re.match("raw/" + KEY_PATTERN, key) for key in keys)
+        for result in report["files"]:
+            assert result["status"] == "succeeded"
+            assert result["seconds"] >= 0
+            body = s3.get_object(Bucket="test-bucket", Key=result["s3_file_path"])
+            assert body["Body"].read() == open(result["local_file_path"], "rb").read()
+
+
+def test_upload_paths_reports_failed_uploads(local_tree):
+    with patch(
+        "src.utils.upload.s3.upload_file", side_effect=Exception("Access Denied")
+    ):
+        report = upload_paths([str(local_tree / "a.csv")], "test-bucket")
+
+    assert report["failed"] == 1
+    assert report["bytes"] == 0
+    assert report["files"][0]["error"] == "Access Denied"
+
+
+def test_main_uploads_to_the_input_bucket(local_tree, capsys):
+    with patch(
+        "src.utils.upload.get_bucket_names_from_tf_state",
+        return_value=("input-bucket", "processed-bucket", "invocation-bucket"),
+    ), patch("src.utils.upload.s3.upload_file") as mock_upload:
+        main([str(local_tree / "*.csv"), "--part-size-mb", "8"])
+
+    mock_upload.assert_called_once()
+    args, kwargs = mock_upload.call_args
+    assert args[:2] == (str(local_tree / "a.csv"), "input-bucket")
+    assert kwargs["Config"].multipart_chunksize == 8 * 1024 * 1024
+    output = capsys.readouterr().out
+    assert "Uploaded 1 of 1 files" in output
+
+
+def test_main_exits_with_error_when_nothing_is_uploaded(tmp_path):
+    with pytest.raises(SystemExit) as exit_info, patch("builtins.print"):
+        main([str(tmp_path / "missing.csv"), "--bucket", "test-bucket"])
+
+    assert exit_info.value.code == 1